@@ -0,0 +1,136 @@
+# -*- encoding: utf-8 -*-
+
+# Fills the pak cache in the background after MO2's UI is up, so onAboutToRun only has
+# to scan whatever the warm-up hasn't reached yet. The mod list is read on the UI thread
+# when the job is created, the worker thread itself only touches the file system. Mods
+# installed or removed meanwhile are left to their hooks, see CacheWarmup.modChanged.
+
+import threading
+
+from PyQt6.QtCore import qDebug
+
+from .ModSettingsHelper import merge_scanned, plan_pak_scans, prune_removed_mods, scan_paks
+from .PakCache import ModsCache
+from .Tracing import span
+
+
+class SnapshotMod:
+    def __init__(self, name: str, path: str):
+        self._name = name
+        self._path = path
+
+    def name(self) -> str:
+        return self._name
+
+    def absolutePath(self) -> str:
+        return self._path
+
+
+class ModListSnapshot:
+    """Names, paths and states of the mod list at one point in time, usable off the UI thread."""
+
+    def __init__(self, modList):
+        self._sequence = list(modList.allModsByProfilePriority())
+        self._mods = {mod: SnapshotMod(mod, modList.getMod(mod).absolutePath()) for mod in self._sequence}
+        self._states = {mod: modList.state(mod) for mod in self._sequence}
+
+    def allModsByProfilePriority(self):
+        return list(self._sequence)
+
+    def getMod(self, name: str):
+        return self._mods.get(name)
+
+    def state(self, name: str) -> int:
+        return self._states.get(name, 0)
+
+
+class CacheWarmup:
+    # Paks scanned between two cache saves, progress survives MO2 being closed mid warm-up
+    BATCH_SIZE = 32
+
+    def __init__(self, modList, profilePath: str, workers: int = 0, in_memory: bool = True):
+        self._mods = ModListSnapshot(modList)
+        self._profilePath = profilePath
+        self._workers = workers
+        self._in_memory = in_memory
+
+        self.total = 0
+        self.done = 0
+        self.error = None
+
+        self._changedMods = set()  # Mods whose hook updated the cache since the snapshot
+        self._changedLock = threading.Lock()
+        self._cancelled = threading.Event()
+        self._finished = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="BG3 pak cache warm-up", daemon=True)
+
+    @classmethod
+    def start(cls, modList, profilePath: str, workers: int = 0, in_memory: bool = True) -> "CacheWarmup":
+        warmup = cls(modList, profilePath, workers, in_memory)
+        warmup._thread.start()
+        return warmup
+
+    @property
+    def finished(self) -> bool:
+        return self._finished.is_set()
+
+    @property
+    def profilePath(self) -> str:
+        return self._profilePath
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def modChanged(self, mod: str):
+        # Called from onModInstalled/onModRemoved before the hook touches the cache. The
+        # warm-up stops scanning the mod and never writes its rows, so a removed mod doesn't
+        # come back and an installed one keeps what its hook scanned. Waits for a save in progress.
+        with self._changedLock:
+            self._changedMods.add(mod)
+
+    def wait(self, timeout=None) -> bool:
+        return self._finished.wait(timeout)
+
+    def status(self) -> str:
+        if self.error:
+            return f"BG3: pak cache warm-up failed ({self.error})"
+        if self.finished:
+            return f"BG3: pak cache ready ({self.done} paks scanned)"
+        if not self.total:
+            return "BG3: checking pak cache..."
+        return f"BG3: scanning paks {self.done}/{self.total}"
+
+    def _save(self, modsCache: ModsCache, scanned):
+        # Checked again under the lock, a hook may have run while the batch was scanned
+        with self._changedLock:
+            for mod in self._changedMods:
+                modsCache.discard_changes(mod)
+            merge_scanned(modsCache, {key: info for key, info in scanned.items() if info["Mod"] not in self._changedMods})
+            modsCache.save()
+
+    def _run(self):
+        try:
+            modSequence = self._mods.allModsByProfilePriority()
+            with span("warm-up", "background", mods=len(modSequence)):
+                modsCache = ModsCache(self._profilePath)
+                prune_removed_mods(modsCache, self._mods, set(modSequence))
+                jobs = plan_pak_scans(modsCache, self._mods, modSequence)
+                self.total = len(jobs)
+
+                for start in range(0, len(jobs), self.BATCH_SIZE):
+                    if self._cancelled.is_set():
+                        break
+                    batch = jobs[start:start + self.BATCH_SIZE]
+                    with self._changedLock:
+                        changed = set(self._changedMods)
+                    scanned = scan_paks([job for job in batch if job[1] not in changed], self._workers, self._in_memory, modsCache)
+                    self._save(modsCache, scanned)
+                    self.done += len(batch)
+
+                self._save(modsCache, {})
+            qDebug(f"BG3 pak cache warm-up: {self.done}/{self.total} paks scanned")
+        except Exception as e:
+            self.error = e
+            qDebug(f"BG3 pak cache warm-up failed: {e}")
+        finally:
+            self._finished.set()
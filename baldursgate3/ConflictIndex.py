@@ -0,0 +1,92 @@
+# -*- encoding: utf-8 -*-
+
+# Which mods ship the same files inside their paks. Built on the pak_files table of the
+# pak cache, which is updated whenever a pak is scanned and cleaned up with its cache
+# entry, so installing or removing a mod only touches that mod's rows.
+
+import os
+from typing import Dict, List, Optional
+
+from .PakCache import connect
+
+CONFLICT_REPORT_FILE_NAME = "bg3_conflicts.txt"
+
+PROVIDERS_QUERY = (
+    "SELECT pak_files.path, mods.name, pak_owners.pak_file FROM pak_files "
+    "JOIN pak_owners ON pak_owners.pak_id = pak_files.pak_id "
+    "JOIN mods ON mods.id = pak_owners.mod_id "
+)
+
+
+def escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def providers(profile_path: str, path: str) -> Dict[str, List[tuple]]:
+    """{internal path: [(mod, pak file)]} for a file, or for every file below it when the
+    path ends with a slash (Public/Game/GUI/). Paths compare case insensitively."""
+    db = connect(profile_path)
+    try:
+        if path.endswith("/"):
+            rows = db.execute(PROVIDERS_QUERY + "WHERE pak_files.path LIKE ? ESCAPE '\\'", (escape_like(path) + "%",))
+        else:
+            rows = db.execute(PROVIDERS_QUERY + "WHERE pak_files.path = ?", (path,))
+        result = {}
+        for file_path, mod_name, pak_file in rows:
+            result.setdefault(file_path, []).append((mod_name, pak_file))
+        return result
+    finally:
+        db.close()
+
+
+def conflicts(profile_path: str, mods: Optional[List[str]] = None) -> Dict[str, List[tuple]]:
+    """{internal path: [(mod, pak file)]} for every path shipped by more than one pak.
+    With mods (priority order) only those mods count, and providers are listed in that order,
+    the last one is the pak the game ends up using."""
+    db = connect(profile_path)
+    try:
+        rows = db.execute(
+            PROVIDERS_QUERY +
+            "WHERE pak_files.path IN ("
+            "SELECT path FROM pak_files JOIN pak_owners ON pak_owners.pak_id = pak_files.pak_id "
+            "GROUP BY path HAVING COUNT(*) > 1) "
+            "ORDER BY pak_files.path"
+        )
+        grouped = {}
+        for file_path, mod_name, pak_file in rows:
+            grouped.setdefault(file_path, []).append((mod_name, pak_file))
+    finally:
+        db.close()
+
+    if mods is None:
+        return {path: sorted(owners) for path, owners in grouped.items()}
+
+    priority = {mod: index for index, mod in enumerate(mods)}
+    result = {}
+    for path, owners in grouped.items():
+        owners = sorted((owner for owner in owners if owner[0] in priority), key=lambda owner: (priority[owner[0]], owner[1]))
+        if len(owners) > 1:
+            result[path] = owners
+    return result
+
+
+def conflict_report(profile_path: str, mods: Optional[List[str]] = None) -> List[str]:
+    # One block per group of mods that overlap, with the paths they share
+    by_owners = {}
+    for path, owners in conflicts(profile_path, mods).items():
+        by_owners.setdefault(tuple(owners), []).append(path)
+
+    lines = []
+    for owners, paths in sorted(by_owners.items(), key=lambda item: (-len(item[1]), item[0])):
+        names = ", ".join(f"{mod} ({pak_file})" for mod, pak_file in owners)
+        winner = f", {owners[-1][0]} wins" if mods is not None else ""
+        lines.append(f"{len(paths)} files provided by {names}{winner}")
+        lines.extend(f"    {path}" for path in paths)
+    return lines
+
+
+def write_conflict_report(profile_path: str, mods: Optional[List[str]] = None) -> int:
+    lines = conflict_report(profile_path, mods)
+    with open(os.path.join(profile_path, CONFLICT_REPORT_FILE_NAME), 'w', encoding='utf-8') as file:
+        file.write("\n".join(lines) + "\n" if lines else "No conflicting pak files\n")
+    return sum(1 for line in lines if not line.startswith(" "))
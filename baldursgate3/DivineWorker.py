@@ -0,0 +1,203 @@
+# -*- encoding: utf-8 -*-
+
+# Long-lived Divine processes, so LSLib and the .NET runtime are loaded once per session
+# instead of once per Divine.exe call. A worker reads one JSON request per line on stdin
+# and answers with one JSON line on stdout:
+#
+#   <- {"ready": true, "protocol": 1}                                   once, at startup
+#   -> {"id": 1, "action": "list-package", "source": "<pak>"}
+#   <- {"id": 1, "ok": true, "files": ["Mods/X/meta.lsx", ...]}
+#   -> {"id": 2, "action": "extract-package", "source": "<pak>", "destination": "<dir>", "expression": "*/meta.lsx"}
+#   <- {"id": 2, "ok": true}
+#   <- {"id": n, "ok": false, "kind": "pak", "error": "..."}            the pak couldn't be read
+#   <- {"id": n, "ok": false, "kind": "worker", "error": "..."}         anything else (LSLib API...)
+#
+# Only a "pak" failure says something about the pak, for any other one the caller runs
+# Divine.exe instead.
+#
+# tools/DivineWorker.ps1 hosts LSLib.dll in PowerShell 7, benchmarks/fake_divine.py -a serve
+# is a stand-in built on PakReader. A worker that dies or stops answering is restarted
+# and the request sent again once.
+
+import json
+import os
+import queue
+import shutil
+import subprocess
+import threading
+from contextlib import contextmanager
+from typing import List, Optional
+
+from .Tracing import count, span
+
+PROTOCOL_VERSION = 1
+
+# Seconds to wait for the ready line (runtime start + LSLib load) and for one answer
+START_TIMEOUT = 30.0
+REQUEST_TIMEOUT = 120.0
+
+
+class WorkerError(Exception):
+    pass
+
+
+class WorkerStartError(WorkerError):
+    # No worker can run here (no PowerShell 7, LSLib didn't load...), not worth retrying
+    pass
+
+
+class DivineWorker:
+    """One worker process. Requests are sent one at a time, WorkerPool hands workers to threads."""
+
+    def __init__(self, command: List[str]):
+        self.command = command
+        self.restarts = 0
+        self._process = None
+        self._lines = None
+        self._next_id = 0
+        self._launched = False
+
+    @property
+    def running(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def start(self):
+        try:
+            self._process = subprocess.Popen(
+                self.command,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True,
+                encoding='utf-8',
+                bufsize=1,
+                creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0),
+            )
+        except OSError as e:
+            raise WorkerStartError(f"Can't start {self.command[0]}: {e}")
+        # Pipes have no read timeout, a thread forwards stdout so a hung worker can be detected
+        self._lines = queue.Queue()
+        threading.Thread(target=self._read_lines, args=(self._process.stdout, self._lines), daemon=True).start()
+
+        try:
+            ready = self._receive(START_TIMEOUT)
+        except WorkerError as e:
+            ready = {'error': str(e)}
+        if not ready.get('ready') or ready.get('protocol') != PROTOCOL_VERSION:
+            self._kill(self._process)
+            self._process = None
+            raise WorkerStartError(f"Unexpected worker handshake: {ready}")
+
+    @staticmethod
+    def _read_lines(stream, lines):
+        try:
+            for line in stream:
+                lines.put(line)
+        except (OSError, ValueError):
+            pass
+        lines.put(None)
+
+    def _receive(self, timeout: float) -> dict:
+        try:
+            line = self._lines.get(timeout=timeout)
+        except queue.Empty:
+            raise WorkerError(f"Worker didn't answer within {timeout:.0f} s")
+        if line is None:
+            raise WorkerError("Worker exited")
+        try:
+            return json.loads(line)
+        except ValueError:
+            raise WorkerError(f"Unreadable worker answer: {line.strip()[:200]}")
+
+    def stop(self):
+        process, self._process = self._process, None
+        if process is None:
+            return
+        try:
+            process.stdin.close()  # Workers exit at the end of their input
+            process.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            self._kill(process)
+
+    @staticmethod
+    def _kill(process):
+        process.kill()
+        process.wait()
+
+    def request(self, action: str, **args) -> dict:
+        for attempt in range(2):
+            if not self.running:
+                if self._launched:
+                    self.restarts += 1
+                    count("divine_worker_restarts")
+                self.stop()
+                self._launched = True
+                with span("Divine worker start", "divine"):
+                    self.start()
+            try:
+                self._next_id += 1
+                message = dict(args, id=self._next_id, action=action)
+                self._process.stdin.write(json.dumps(message) + "\n")
+                self._process.stdin.flush()
+                response = self._receive(REQUEST_TIMEOUT)
+                if response.get('id') != message['id']:
+                    raise WorkerError(f"Answer to request {response.get('id')} instead of {message['id']}")
+                count("divine_worker_requests")
+                return response
+            except (OSError, ValueError, WorkerError) as e:
+                # Crashed, hung or out of sync: start over with a fresh process
+                process, self._process = self._process, None
+                if process is not None:
+                    self._kill(process)
+                if attempt:
+                    raise WorkerError(f"{action} failed twice: {e}")
+        raise WorkerError(f"{action} failed")
+
+
+class WorkerPool:
+    """Up to size workers shared by the scan threads, started on first use and kept until close()."""
+
+    def __init__(self, command: List[str], size: int = 2):
+        self.command = command
+        self.size = max(1, size)
+        self._idle = []
+        self._started = 0
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def worker(self):
+        with self._condition:
+            while not self._idle and self._started >= self.size:
+                self._condition.wait()
+            if self._idle:
+                worker = self._idle.pop()
+            else:
+                worker = DivineWorker(self.command)
+                self._started += 1
+        try:
+            yield worker
+        finally:
+            with self._condition:
+                self._idle.append(worker)
+                self._condition.notify()
+
+    @property
+    def restarts(self) -> int:
+        with self._condition:
+            return sum(worker.restarts for worker in self._idle)
+
+    def close(self):
+        with self._condition:
+            workers, self._idle = self._idle, []
+            self._started -= len(workers)
+        for worker in workers:
+            worker.stop()
+
+
+def powershell_command(tools_dir: str) -> Optional[List[str]]:
+    # LSLib targets .NET 8, which PowerShell 7 (pwsh) runs on, Windows PowerShell 5.1 can't load it
+    pwsh = shutil.which("pwsh")
+    script = os.path.join(tools_dir, "DivineWorker.ps1")
+    if not pwsh or not os.path.exists(script):
+        return None
+    return [pwsh, "-NoLogo", "-NoProfile", "-NonInteractive", "-ExecutionPolicy", "Bypass", "-File", script, tools_dir]
@@ -0,0 +1,167 @@
+# -*- encoding: utf-8 -*-
+
+# Pak cache prebuild and modsettings.lsx generation without Mod Organizer 2, for a mod
+# library on a build machine or for profiling the scan on its own. The mods folder and
+# a modlist.txt (MO2's profile format, highest priority first) stand in for MO2's mod
+# list, everything else is the same code the plugin runs on launch. From the folder that
+# holds game_baldursgate3.py and baldursgate3:
+#
+#   python -m baldursgate3.Headless --mods <instance>/mods --modlist <profile>/modlist.txt --output modsettings.lsx
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import List, Optional
+
+from . import ModSettingsHelper, PakCache
+from .Tracing import tracer
+
+# mobase.ModState flags
+MOD_STATE_EXISTS = 0x1
+MOD_STATE_ACTIVE = 0x2
+
+
+class FolderMod:
+    def __init__(self, name: str, path: str):
+        self._name = name
+        self._path = path
+
+    def name(self) -> str:
+        return self._name
+
+    def absolutePath(self) -> str:
+        return self._path
+
+
+class FolderModList:
+    """The parts of mobase.IModList ModSettingsHelper uses, read from a mods folder and a
+    modlist.txt. Mods missing from the list are disabled and get the highest priorities,
+    where MO2 puts newly installed mods."""
+
+    def __init__(self, mods_path: str, modlist_path: str):
+        self.mods_path = mods_path
+        listed = []  # Highest priority first, like the file
+        self.enabled = set()
+        with open(modlist_path, "r", encoding="utf-8-sig") as f:
+            for line in f:
+                line = line.rstrip("\r\n")
+                if not line or line[0] not in "+-":
+                    continue  # Comments and unmanaged (*) entries such as DLCs
+                name = line[1:]
+                if os.path.isdir(os.path.join(mods_path, name)):
+                    listed.append(name)
+                    if line[0] == "+":
+                        self.enabled.add(name)
+
+        known = set(listed)
+        unlisted = sorted(name for name in os.listdir(mods_path) if name not in known and os.path.isdir(os.path.join(mods_path, name)))
+        self.names = list(reversed(listed)) + unlisted
+
+    def getMod(self, name: str) -> Optional[FolderMod]:
+        path = os.path.join(self.mods_path, name)
+        return FolderMod(name, path) if os.path.isdir(path) else None
+
+    def allMods(self) -> List[str]:
+        return sorted(self.names)
+
+    def allModsByProfilePriority(self) -> List[str]:
+        return list(self.names)
+
+    def state(self, name: str) -> int:
+        if name not in self.names:
+            return 0
+        return MOD_STATE_EXISTS | (MOD_STATE_ACTIVE if name in self.enabled else 0)
+
+
+class FolderProfile:
+    def __init__(self, path: str):
+        self._path = path
+
+    def absolutePath(self) -> str:
+        return self._path
+
+
+def run(mods_path: str, modlist_path: str, output_path: str, profile_path: Optional[str] = None, cache_path: Optional[str] = None,
+        workers: int = 0, in_memory: bool = True, sort_dependencies: bool = False) -> dict:
+    """Scan what the cache is missing, write modsettings.lsx to output_path and return the stats.
+    The cache goes to cache_path, by default the MO2 instance of the profile (see PakCache)."""
+    profile_path = profile_path or os.path.dirname(os.path.abspath(modlist_path))
+    if cache_path:
+        os.makedirs(cache_path, exist_ok=True)
+        PakCache.set_instance_path(cache_path)
+
+    output_folder = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(output_folder, exist_ok=True)
+
+    modList = FolderModList(mods_path, modlist_path)
+    profile = FolderProfile(profile_path)
+
+    start = time.perf_counter()
+    with tracer.collect() as collected:
+        ModSettingsHelper.generateSettings(modList, profile, workers, in_memory, sort_dependencies, output_path)
+    elapsed = time.perf_counter() - start
+
+    counters = collected.get("counters", {})
+    scan_ms = collected.get("pakScanMs", {})
+    scanned = len(scan_ms)
+    modsCache = PakCache.ModsCache(profile_path)
+    scanned_bytes = sum(modsCache.entries[key]["Fingerprint"]["Size"] for key in scan_ms if key in modsCache.entries)
+    return {
+        "mods": len(modList.names),
+        "enabled": len(modList.enabled),
+        "paks": counters.get("pak_cache_hit", 0) + counters.get("pak_cache_miss", 0),
+        "cached": counters.get("pak_cache_hit", 0),
+        "scanned": scanned,
+        "deduplicated": counters.get("pak_content_dedup", 0),
+        "divine_runs": counters.get("divine_runs", 0),
+        "scanned_bytes": scanned_bytes,
+        "scan_ms": round(sum(scan_ms.values()), 3),
+        "wall_ms": round(elapsed * 1000, 3),
+        "paks_per_second": round(scanned / elapsed, 1) if elapsed and scanned else 0.0,
+        "mb_per_second": round(scanned_bytes / elapsed / 1e6, 1) if elapsed and scanned else 0.0,
+        "written": counters.get("modsettings_unchanged", 0) == 0,
+        "dependency_problems": counters.get("dependency_problems", 0),
+        "output": os.path.abspath(output_path),
+        "cache": PakCache.store_path(profile_path),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Build the BG3 pak cache and modsettings.lsx outside of Mod Organizer 2")
+    parser.add_argument("--mods", required=True, help="MO2 mods folder, one folder per mod with its paks in PAK_FILES")
+    parser.add_argument("--modlist", required=True, help="modlist.txt with the priorities, highest first (+enabled, -disabled)")
+    parser.add_argument("--output", required=True, help="where to write modsettings.lsx")
+    parser.add_argument("--profile", help="folder for the dependency report, defaults to the modlist.txt folder")
+    parser.add_argument("--cache", help="folder holding the pak cache, defaults to the MO2 instance of the profile")
+    parser.add_argument("--workers", type=int, default=0, help="paks scanned in parallel (0 = one per CPU core)")
+    parser.add_argument("--divine", action="store_true", help="scan through Divine.exe instead of reading paks in memory")
+    parser.add_argument("--sort-dependencies", action="store_true", help="move mods after the mods they depend on")
+    parser.add_argument("--json", help="also write the stats to this file")
+    args = parser.parse_args(argv)
+
+    stats = run(args.mods, args.modlist, args.output, args.profile, args.cache, args.workers, not args.divine, args.sort_dependencies)
+    ModSettingsHelper.close_divine_workers()
+
+    print(
+        f"{stats['mods']} mods ({stats['enabled']} enabled), {stats['paks']} paks: "
+        f"{stats['cached']} cached, {stats['scanned']} scanned, {stats['deduplicated']} duplicates"
+    )
+    if stats["scanned"]:
+        print(
+            f"scanned {stats['scanned_bytes'] / 1e6:.1f} MB in {stats['wall_ms'] / 1000:.2f} s: "
+            f"{stats['paks_per_second']:.1f} paks/s, {stats['mb_per_second']:.1f} MB/s"
+        )
+    print(f"{'wrote' if stats['written'] else 'unchanged'} {stats['output']} in {stats['wall_ms']:.1f} ms")
+    if stats["dependency_problems"]:
+        print(f"{stats['dependency_problems']} dependency problems, see the report in the profile folder")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(stats, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
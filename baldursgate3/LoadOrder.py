@@ -0,0 +1,171 @@
+# -*- encoding: utf-8 -*-
+
+# Dependency checks and sorting for the load order written to modsettings.lsx. Every
+# cache entry keeps the Dependencies node of its meta.lsx, so the graph survives between
+# runs and installing a mod only adds the edges of the paks that were scanned. Sorting
+# moves a module after the modules it depends on and otherwise keeps MO2's priority order.
+
+import heapq
+import os
+from typing import Dict, List, Optional, Tuple
+
+DEPENDENCY_REPORT_FILE_NAME = "bg3_dependencies.txt"
+
+# Modules of the game itself, mods may list them as dependencies but they are never in MO2's list
+BASE_GAME_FOLDERS = frozenset({
+    "Gustav", "GustavDev", "GustavX", "Shared", "SharedDev", "Honour", "HonourX", "MainUI", "ModBrowser",
+})
+
+
+def attribute_value(mod_info: dict, attr_id: str) -> Optional[str]:
+    attribute = mod_info.get(attr_id)
+    return attribute.get('value') if attribute else None
+
+
+def module_label(mod: str, mod_info: dict) -> str:
+    return f"{attribute_value(mod_info, 'Name') or attribute_value(mod_info, 'Folder')} ({mod})"
+
+
+def dependency_edges(modules: List[Tuple[str, dict]]):
+    """For each module (mod, mod info), in load order, the indices of the modules it depends
+    on, plus the (index, dependency) pairs no module in the list provides."""
+    providers = {}
+    for index, (_, mod_info) in enumerate(modules):
+        providers.setdefault(attribute_value(mod_info, 'UUID'), []).append(index)
+
+    requires = []
+    missing = []
+    for index, (_, mod_info) in enumerate(modules):
+        required = set()
+        for dependency in mod_info.get('Dependencies') or []:
+            found = providers.get(dependency.get('UUID'))
+            if found:
+                required.update(provider for provider in found if provider != index)
+            elif dependency.get('Folder') not in BASE_GAME_FOLDERS:
+                missing.append((index, dependency))
+        requires.append(required)
+    return requires, missing
+
+
+def dependency_cycles(requires: List[set], nodes) -> List[List[int]]:
+    # Strongly connected components with more than one module (Tarjan, without recursion)
+    nodes = set(nodes)
+    index_of = {}
+    lowlink = {}
+    stack = []
+    on_stack = set()
+    cycles = []
+    counter = 0
+
+    for root in sorted(nodes):
+        if root in index_of:
+            continue
+        work = [(root, iter(sorted(requires[root] & nodes)))]
+        index_of[root] = lowlink[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, edges = work[-1]
+            for target in edges:
+                if target not in index_of:
+                    index_of[target] = lowlink[target] = counter
+                    counter += 1
+                    stack.append(target)
+                    on_stack.add(target)
+                    work.append((target, iter(sorted(requires[target] & nodes))))
+                    break
+                if target in on_stack:
+                    lowlink[node] = min(lowlink[node], index_of[target])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index_of[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    if len(component) > 1:
+                        cycles.append(sorted(component))
+    return sorted(cycles)
+
+
+def sort_order(requires: List[set]) -> Tuple[List[int], List[List[int]]]:
+    """Topological order that always takes the highest priority module whose dependencies
+    are placed, so modules only move when a dependency forces them to. When only modules
+    of cycles (or modules waiting on them) are left, the highest priority module of a cycle
+    that waits on nothing outside itself is placed as if its dependencies were. Every
+    dependency that isn't part of a cycle is kept. Returns the order and the cycles."""
+    dependents = [[] for _ in requires]
+    waiting = [len(required) for required in requires]
+    for index, required in enumerate(requires):
+        for provider in required:
+            dependents[provider].append(index)
+
+    ready = [index for index, count in enumerate(waiting) if not count]
+    heapq.heapify(ready)
+    order = []
+    cycles = None
+    while True:
+        while ready:
+            index = heapq.heappop(ready)
+            order.append(index)
+            for dependent in dependents[index]:
+                waiting[dependent] -= 1
+                if not waiting[dependent]:
+                    heapq.heappush(ready, dependent)
+
+        if len(order) == len(requires):
+            return order, cycles or []
+        left = [index for index, count in enumerate(waiting) if count > 0]
+        if cycles is None:
+            cycles = dependency_cycles(requires, left)
+        # Cycles among what is left, a cycle waiting on another one is only broken after it
+        left = set(left)
+        forced = min(
+            index
+            for cycle in dependency_cycles(requires, left)
+            if all(provider not in left or provider in cycle for member in cycle for provider in requires[member])
+            for index in cycle
+        )
+        waiting[forced] = 0
+        heapq.heappush(ready, forced)
+
+
+def check_modules(modules: List[Tuple[str, dict]], sort: bool = False, installed: Optional[Dict[str, str]] = None):
+    """(modules, problems): the modules in load order, sorted by dependencies when asked,
+    and a line for every missing dependency and dependency cycle. installed maps the UUIDs
+    of modules in disabled mods to their mod, to tell disabled from missing dependencies."""
+    requires, missing = dependency_edges(modules)
+    installed = installed or {}
+
+    problems = []
+    for index, dependency in missing:
+        mod, mod_info = modules[index]
+        uuid = dependency.get('UUID')
+        name = dependency.get('Name') or dependency.get('Folder') or uuid
+        where = f"in disabled mod {installed[uuid]}" if uuid in installed else "not installed"
+        problems.append(f"Missing dependency: {module_label(mod, mod_info)} needs {name} ({uuid}), {where}")
+
+    order, cycles = sort_order(requires)
+    for cycle in cycles:
+        problems.append("Dependency cycle: " + ", ".join(module_label(*modules[index]) for index in cycle))
+
+    if not sort:
+        return modules, problems
+    return [modules[index] for index in order], problems
+
+
+def write_dependency_report(profile_path: str, problems: List[str]):
+    # Only kept around while there is something to report
+    path = os.path.join(profile_path, DEPENDENCY_REPORT_FILE_NAME)
+    if problems:
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write("\n".join(problems) + "\n")
+    elif os.path.exists(path):
+        os.remove(path)
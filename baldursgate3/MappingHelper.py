@@ -0,0 +1,139 @@
+# -*- encoding: utf-8 -*-
+
+# Helpers for BaldursGate3Game.mappings(). Everything here returns plain
+# (source, destination, is_directory) tuples, the game plugin turns them into mobase.Mapping.
+
+import os
+
+from .Tracing import count
+
+# MO2 hides a file or directory (conflicts tab, "Hide") by renaming it with this suffix
+HIDDEN_SUFFIX = ".mohidden"
+
+
+def stamp(path):
+    try:
+        return (path, os.stat(path).st_mtime_ns)
+    except OSError:
+        return (path, None)
+
+
+def stamps_unchanged(stamps) -> bool:
+    # A directory's mtime moves whenever an entry is added, removed or renamed in it
+    return all(stamp(path) == (path, mtime_ns) for path, mtime_ns in stamps)
+
+
+def walk_pak_folders(pak_folders):
+    # pak_folders are ordered lowest priority first, a later folder wins a path like it does in the VFS.
+    # Returns the directory stamps, {lower case relative path: (folder index, relative path)} and
+    # the lower case relative directories holding hidden entries, which the VFS leaves out
+    stamps = []
+    files = {}
+    hidden = set()
+    for index, pak_folder in enumerate(pak_folders):
+        if not os.path.isdir(pak_folder):
+            # Watch the mod folder so a PAK_FILES folder created later is picked up
+            stamps.append(stamp(os.path.dirname(pak_folder)))
+            continue
+
+        # scandir gives the entry types with the listing, relative paths are built on the way down
+        pending = [(pak_folder, "")]
+        while pending:
+            root, relative_root = pending.pop()
+            try:
+                stamps.append((root, os.stat(root).st_mtime_ns))
+                entries = list(os.scandir(root))
+            except OSError:
+                stamps.append((root, None))
+                continue
+            prefix = relative_root + os.sep if relative_root else ""
+            for entry in entries:
+                name = entry.name
+                if name.endswith(HIDDEN_SUFFIX):
+                    hidden.add(relative_root.lower() or ".")
+                elif entry.is_dir():
+                    pending.append((entry.path, prefix + name))
+                else:
+                    relative_path = prefix + name
+                    files[relative_path.lower()] = (index, relative_path)
+
+    return stamps, files, hidden
+
+
+def compact_mappings(folders, files, destination, hidden=()):
+    """Mappings for the winning files of walk_pak_folders. A directory whose files all come
+    from the same folder is mapped once as a directory, the topmost such directory wins.
+    Files directly in the destination, in directories shared by several folders and in
+    directories holding hidden entries (a directory mapping would show them) are mapped one
+    by one. The destination itself is never mapped, it holds files of its own."""
+    owners = {}
+    for key, (index, _) in files.items():
+        parts = key.split(os.sep)
+        for depth in range(1, len(parts)):
+            owners.setdefault(os.sep.join(parts[:depth]), set()).add(index)
+    for key in hidden:
+        parts = [] if key == "." else key.split(os.sep)
+        for depth in range(1, len(parts) + 1):
+            owners.setdefault(os.sep.join(parts[:depth]), set()).add(None)
+
+    mappings = []
+    mapped_directories = set()
+    for key, (index, relative_path) in files.items():
+        parts = key.split(os.sep)
+        for depth in range(1, len(parts)):
+            directory = os.sep.join(parts[:depth])
+            if len(owners[directory]) == 1:
+                if directory not in mapped_directories:
+                    mapped_directories.add(directory)
+                    relative_directory = os.sep.join(relative_path.split(os.sep)[:depth])
+                    mappings.append((os.path.join(folders[index], relative_directory), os.path.join(destination, relative_directory), True))
+                break
+        else:
+            mappings.append((os.path.join(folders[index], relative_path), os.path.join(destination, relative_path), False))
+    return mappings
+
+
+class FolderMappingCache:
+    """Mappings of the same folder of every enabled mod from one walk over them, compacted
+    to directory mappings where one mod owns a subtree. Reused until the folder list changes
+    (mod enabled, disabled or moved) or a directory in one of the trees changes.
+
+    The walk reads the mod folders on disk, not MO2's in-memory VFS: the first call after
+    MO2 starts pays for the directory listings, which on their own take longer than the
+    old listDirectories/findFiles queries, but it makes no call per directory or per file
+    and returns about a quarter of the mappings, each one several calls into MO2 (see
+    benchmarks/bench_mappings.py). Later calls only stat the directories. Hidden entries
+    are skipped like the VFS skips them."""
+
+    counter = "folder_mappings"
+
+    def __init__(self):
+        self._key = None
+        self._stamps = []
+        self._mappings = []
+        self.file_count = 0  # Winning files before compact_mappings, for the log
+
+    def mappings(self, folders, destination):
+        key = (tuple(folders), destination)
+        if key == self._key and stamps_unchanged(self._stamps):
+            count(f"{self.counter}_cache_hit")
+            return self._mappings
+
+        count(f"{self.counter}_cache_miss")
+        self._stamps, files, hidden = walk_pak_folders(folders)
+        self._mappings = compact_mappings(folders, files, destination, hidden)
+        self.file_count = len(files)
+        self._key = key
+        return self._mappings
+
+    def clear(self):
+        self._key = None
+        self._stamps = []
+        self._mappings = []
+        self.file_count = 0
+
+
+class PakFileMappingCache(FolderMappingCache):
+    """PAK_FILES of the enabled mods and overwrite, mapped into the game's Mods folder."""
+
+    counter = "pak_mappings"
@@ -1,103 +1,255 @@
 # -*- encoding: utf-8 -*-
 
-import mobase # type: ignore
+from __future__ import annotations  # mobase annotations stay unevaluated for headless runs
+
 import os
-import platform
-import json
-import subprocess
+import sys
 from pathlib import Path
-import shutil
-from xml.dom import minidom
-import xml.etree.ElementTree as ET
-from PyQt6.QtCore import QDir, QFileInfo, QDirIterator, QFile, QFileInfo, qDebug
+import hashlib
+import json
+import threading
 
-script_dir = os.path.abspath(__file__)
+try:
+    import mobase # type: ignore
+    from PyQt6.QtCore import qDebug
+except ImportError: # Headless.py, outside of MO2 the mod list and profile are plain objects
+    mobase = None
 
-root_folder = Path(__file__).parents[4]
+    def qDebug(message):
+        print(message, file=sys.stderr)
+
+from .PakCache import ENTRY_COLUMNS, PAK_FOLDER, ModsCache, cache_key, confirm_content, content_key, hash_covers_file, list_mod_paks, pak_fingerprint
+from .LoadOrder import check_modules, write_dependency_report
+from .PakReader import PakError, open_pak
+from .Tracing import count, span, tracer
+
+script_dir = os.path.abspath(__file__)
 
 divine_path = os.path.join(Path(script_dir).parent, 'tools', 'Divine.exe')
 
+class DivineUnavailableError(Exception): # Divine.exe couldn't run, which says nothing about the pak: don't cache a result
+    pass
+
 def find_meta_lsx(name, path): # Find meta.lsx in directory
     for root, dirs, files in os.walk(path):
         if name in files:
             return os.path.join(root, name)
 
-def extract_meta_lsx(pak_path, output_dir): # Extract meta.lsx from .pak file
-
-    command = [
-        str(divine_path),
-        "-a", "extract-package",
-        "-g", "bg3",
-        "-s", str(pak_path),
-        "-d", str(output_dir),
-        "-x", "*/meta.lsx",
-        "-l", "off"
-    ]
-
-    result = subprocess.run(
-        command,
-        creationflags=subprocess.CREATE_NO_WINDOW,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True
-    )
-
-    is_override = False
-    modinfo = {
+def default_modinfo():
+    return {
                 "Name": "Override_Mod",
                 "UUID": "Override_Mod",
                 "Folder": "Override_Mod",
                 "Version": "Override_Mod",
                 "Version64": "Override_Mod",
                 "MD5": "Override_Mod",
-                "PublishHandle": "Override_Mod"
+                "PublishHandle": "Override_Mod",
+                "Dependencies": []
             }
 
-    if result.returncode == 0:
+# Top-level directories whose presence, without a Public/<mod folder>, marks a pak as an override
+OVERRIDE_PREFIXES = ("Public/Game", "Public/GUI", "Mods/MainUI")
+
+def pak_prefixes(file_names): # "<root>/<folder>" directory prefixes of the files in a pak
+    prefixes = set()
+    for name in file_names:
+        parts = name.replace("\\", "/").split("/", 2)
+        if len(parts) > 2:
+            prefixes.add(f"{parts[0]}/{parts[1]}")
+    return prefixes
+
+def list_output_files(list_output): # File names from Divine's list-package output, one file per line
+    if not list_output:
+        return []
+    files = (line.split("\t", 1)[0].strip().replace("\\", "/") for line in list_output.splitlines())
+    return [name for name in files if name]
+
+def detect_override(mod_folder_name, prefixes): # Pak replaces game data instead of adding a module
+    if f"Public/{mod_folder_name}" in prefixes:
+        return False
+    return any(prefix in prefixes for prefix in OVERRIDE_PREFIXES)
+
+def is_override(mod_info): # Recomputed from the stored prefixes, entries from older caches only have the flag
+    prefixes = mod_info.get('Prefixes')
+    folder = mod_info.get('Folder')
+    if prefixes is None or not isinstance(folder, dict):  # No meta.lsx, Folder is the default_modinfo placeholder
+        return bool(mod_info.get('IsOverride'))
+    return detect_override(folder.get('value'), set(prefixes))
+
+def extract_meta_lsx(pak_path, output_dir=None, in_memory: bool = True): # Extract meta.lsx from .pak file
+    if in_memory:
+        try:
+            return extract_meta_lsx_native(pak_path)
+        except PakError as e:
+            qDebug(f"Native pak reader failed for {pak_path}, falling back to Divine: {e}")
+
+    if output_dir:
+        return extract_meta_lsx_divine(pak_path, output_dir)
+
+    # Divine only extracts to disk, use a throwaway folder outside the (possibly read-only) plugin folder
+    import tempfile
+    with tempfile.TemporaryDirectory(prefix="bg3_meta_") as temp_dir:
+        return extract_meta_lsx_divine(pak_path, temp_dir)
+
+def extract_meta_lsx_native(pak_path): # Read meta.lsx straight out of the mapped .pak file
+    import xml.etree.ElementTree as ET
+    is_override = False
+    modinfo = default_modinfo()
+
+    with open_pak(pak_path) as pak:
+        files = pak.list_files()
+        prefixes = pak_prefixes(files)
+        meta_entry = pak.find_meta_lsx()
+
+        if meta_entry:
+            try:
+                modinfo = parse_meta_lsx_data(pak.read(meta_entry), f"{pak_path}/{meta_entry.name}")
+            except ET.ParseError as e:
+                raise PakError(f"Unreadable meta.lsx in {pak_path}: {e}")
+
+            mod_folder = modinfo['Folder']
+
+            if mod_folder:
+                is_override = detect_override(mod_folder.get('value'), prefixes)
+
+    modinfo["IsOverride"] = is_override
+    modinfo["Prefixes"] = sorted(prefixes)
+    modinfo["Files"] = files
+
+    return modinfo
+
+# Command of the long-lived Divine worker, None picks tools/DivineWorker.ps1 when PowerShell 7 is installed
+divine_worker_command = None
+DIVINE_WORKERS = 2
+
+_divine_workers = None  # WorkerPool once a Divine call needed it, False when no worker can run
+_divine_workers_lock = threading.Lock()
+
+def divine_workers():
+    global _divine_workers
+    with _divine_workers_lock:
+        if _divine_workers is None:
+            from .DivineWorker import WorkerPool, powershell_command
+            command = divine_worker_command or powershell_command(os.path.dirname(divine_path))
+            _divine_workers = WorkerPool(command, DIVINE_WORKERS) if command else False
+            if _divine_workers:
+                import atexit
+                atexit.register(_divine_workers.close)
+        return _divine_workers or None
+
+def close_divine_workers(disable: bool = False):
+    global _divine_workers
+    with _divine_workers_lock:
+        pool, _divine_workers = _divine_workers, (False if disable else None)
+    if pool:
+        pool.close()
+
+def divine_worker_call(action, pak_path, **args): # Answer of a worker, None to run Divine.exe instead
+    pool = divine_workers()
+    if not pool:
+        return None
+    from .DivineWorker import WorkerError, WorkerStartError
+    try:
+        with span(f"Divine worker {action}", "divine", pak=str(pak_path)), pool.worker() as worker:
+            response = worker.request(action, source=str(pak_path), **args)
+    except WorkerStartError as e:
+        qDebug(f"Divine worker unavailable, running Divine.exe per pak: {e}")
+        close_divine_workers(disable=True)
+        return None
+    except WorkerError as e:
+        qDebug(f"Divine worker failed on {pak_path}, running Divine.exe for it: {e}")
+        return None
+    # Only a failure the worker puts on the pak stands, LSLib API or script errors go to Divine.exe
+    if not response.get('ok') and response.get('kind') != 'pak':
+        qDebug(f"Divine worker couldn't {action} {pak_path}, running Divine.exe for it: {response.get('error')}")
+        count("divine_worker_errors")
+        return None
+    return response
+
+def extract_meta_lsx_divine(pak_path, output_dir): # Extract meta.lsx with Divine.exe
+    os.makedirs(output_dir, exist_ok=True)
+
+    is_override = False
+    files = []
+    modinfo = default_modinfo()
+
+    if extract_package_divine(pak_path, output_dir, "*/meta.lsx"):
+        # The file list also feeds the conflict index, so it is needed with or without meta.lsx
+        files = list_package_divine(pak_path)
+        prefixes = pak_prefixes(files)
         meta_lsx_path = find_meta_lsx('meta.lsx', output_dir)
 
         if meta_lsx_path:
+            # One parse gives the folder for the override check and the rest of ModuleInfo
+            modinfo = parse_meta_lsx(meta_lsx_path)
             
-            tree = ET.parse(str(meta_lsx_path))
-            root = tree.getroot()
-            module_info = root.find(".//node[@id='ModuleInfo']")
-            
-            mod_folder = get_attribute_value(module_info, 'Folder')     
+            mod_folder = modinfo['Folder']
             
             if mod_folder:
-                command = [
-                    str(divine_path),
-                    "-a", "list-package",
-                    "-g", "bg3",
-                    "-s", str(pak_path)
-                ]
-                result = subprocess.run(
-                    command,
-                    creationflags=subprocess.CREATE_NO_WINDOW,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True
-                )
-                
-                
-                mod_folder_name = mod_folder.get('value')
-                list_output = result.stdout if result.returncode == 0 else None
-                
-                mod_folder_exists = f"Public/{mod_folder_name}" in list_output
-                
-                if not mod_folder_exists and any(f"Public/{folder}" in list_output for folder in ["Game", "GUI"]):
-                    is_override = True
-                    
-                if not mod_folder_exists and any(f"Mods/{folder}" in list_output for folder in ["MainUI"]):
-                    is_override = True
-            
-            modinfo = parse_meta_lsx(meta_lsx_path)
+                is_override = detect_override(mod_folder.get('value'), prefixes)
             
     modinfo["IsOverride"] = is_override
+    modinfo["Prefixes"] = sorted(pak_prefixes(files))
+    modinfo["Files"] = files
           
     return modinfo
 
-   
+def extract_package_divine(pak_path, output_dir, expression): # True when Divine extracted the matching files
+    response = divine_worker_call("extract-package", pak_path, destination=str(output_dir), expression=expression)
+    if response is not None:
+        return bool(response.get('ok'))
+
+    import subprocess
+    command = [
+        str(divine_path),
+        "-a", "extract-package",
+        "-g", "bg3",
+        "-s", str(pak_path),
+        "-d", str(output_dir),
+        "-x", expression,
+        "-l", "off"
+    ]
+
+    count("divine_runs")
+    with span("Divine extract-package", "divine", pak=str(pak_path)):
+        try:
+            result = subprocess.run(
+                command,
+                creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True
+            )
+        except OSError as e:
+            raise DivineUnavailableError(f"Divine.exe could not be started for {pak_path}: {e}")
+    return result.returncode == 0
+
+def list_package_divine(pak_path): # File names in the pak according to Divine.exe, [] if it can't be listed
+    response = divine_worker_call("list-package", pak_path)
+    if response is not None:
+        files = (name.replace("\\", "/") for name in response.get('files') or [])
+        return [name for name in files if name] if response.get('ok') else []
+
+    import subprocess
+    command = [
+        str(divine_path),
+        "-a", "list-package",
+        "-g", "bg3",
+        "-s", str(pak_path)
+    ]
+    count("divine_runs")
+    with span("Divine list-package", "divine", pak=str(pak_path)):
+        try:
+            result = subprocess.run(
+                command,
+                creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True
+            )
+        except OSError as e:
+            raise DivineUnavailableError(f"Divine.exe could not be started for {pak_path}: {e}")
+    return list_output_files(result.stdout) if result.returncode == 0 else []
 
 def get_attribute_value(node, attr_id): # Extract attribute value
     attribute = node.find(f".//attribute[@id='{attr_id}']")
@@ -114,10 +266,58 @@ def create_attribute():
     return None
 
 def long_path_support(path):
-    if platform.system() == 'Windows' and len(path) > 255:
+    if os.name == 'nt' and len(path) > 255:
         return f"\\\\?\\{os.path.abspath(path)}"
     return path
 
+# ModuleInfo attributes kept in the cache, and the ones kept for each of its dependencies
+MODULE_INFO_FIELDS = ('Folder', 'Name', 'PublishHandle', 'UUID', 'MD5', 'Version', 'Version64')
+DEPENDENCY_FIELDS = ('UUID', 'Folder', 'Name', 'Version64')
+
+def child_nodes(node): # Nodes directly below node, looking through the <children> wrappers
+    for child in node:
+        if child.tag == 'node':
+            yield child
+        elif child.tag != 'attribute':
+            yield from child_nodes(child)
+
+def first_values(node): # Like the old .//attribute lookups, the first attribute below the node with an id wins
+    values = {}
+    for attribute in node.iter('attribute'):
+        values.setdefault(attribute.get('id'), attribute)
+    return values
+
+def read_module_info(root, source): # ModuleInfo and Dependencies of a parsed meta.lsx
+    module_info = root.find(".//node[@id='ModuleInfo']")
+    if module_info is None:
+        raise ValueError(f"'ModuleInfo' node not found in {source}. Check the XML structure.")
+
+    module_nodes = set(module_info.iter('node'))
+    dependencies = []
+    for node in root.iterfind(".//node[@id='Dependencies']"):
+        if node in module_nodes:
+            continue
+        for desc in child_nodes(node):
+            if desc.get('id') != 'ModuleShortDesc':
+                continue
+            attributes = first_values(desc)
+            dependency = {field: attributes[field].get('value') for field in DEPENDENCY_FIELDS if field in attributes}
+            if dependency.get('UUID'):
+                dependencies.append(dependency)
+        break
+
+    attributes = first_values(module_info)
+    mod_info = {
+        field: {'value': attributes[field].get('value'), 'type': attributes[field].get('type')} if field in attributes else None
+        for field in MODULE_INFO_FIELDS
+    }
+    mod_info['Dependencies'] = dependencies
+    return mod_info
+
+def parse_meta_lsx_data(data: bytes, source): # meta.lsx read out of a pak
+    import xml.etree.ElementTree as ET
+    return read_module_info(ET.fromstring(data), source)
+
 def parse_meta_lsx(meta_lsx_path):  # Extract information from meta.lsx
     if meta_lsx_path:  
         meta_lsx_path = long_path_support(meta_lsx_path)
@@ -125,374 +325,367 @@ def parse_meta_lsx(meta_lsx_path):  # Extract information from meta.lsx
         if not os.path.exists(meta_lsx_path):
             raise FileNotFoundError(f"The file {meta_lsx_path} does not exist.")
 
-        tree = ET.parse(str(meta_lsx_path))
-        root = tree.getroot()
-        module_info = root.find(".//node[@id='ModuleInfo']")
+        # One C level parse of the whole file beats streaming it, the files are rarely more than a few KiB
+        import xml.etree.ElementTree as ET
+        with open(str(meta_lsx_path), 'rb') as file:
+            return read_module_info(ET.parse(file).getroot(), meta_lsx_path)
+    
+
+def mod_pak_paths(modList: mobase.IModList, mod): # (pak file, full path) of every pak the mod ships
+    modPath = modList.getMod(mod).absolutePath()
+    return [(pak_file, os.path.join(modPath, PAK_FOLDER, pak_file)) for pak_file in list_mod_paks(modPath)]
 
-        if module_info is None:
-            raise ValueError(f"'ModuleInfo' node not found in {meta_lsx_path}. Check the XML structure.")
+def plan_pak_scans(modsCache: ModsCache, modList: mobase.IModList, mods, mod_paks=None): # Paks that are new or whose fingerprint changed
+    jobs = []
+    for mod in mods:
+        pak_paths = mod_paks[mod] if mod_paks is not None else mod_pak_paths(modList, mod)
         
-        mod_info = {
-                'Folder': get_attribute_value(module_info, 'Folder'),
-                'Name': get_attribute_value(module_info, 'Name'),
-                'PublishHandle': get_attribute_value(module_info, 'PublishHandle'),
-                'UUID': get_attribute_value(module_info, 'UUID'),
-                'MD5': get_attribute_value(module_info, 'MD5'),
-                'Version': get_attribute_value(module_info, 'Version'),
-                'Version64': get_attribute_value(module_info, 'Version64'),
-            }
+        # Forget paks that are no longer part of the mod
+        current_paks = {pak_file for pak_file, _ in pak_paths}
+        for pak_file in [pak_file for pak_file in modsCache.mod_paks(mod) if pak_file not in current_paks]:
+            modsCache.remove(mod, pak_file)
+        
+        for pak_file, pak_path in pak_paths:
+            # Entries cached before the prefixes and file index were stored get listed once more
+            entry = modsCache.get(mod, pak_file)
+            if not entry or any(key not in entry for key in INDEXED_KEYS) or not modsCache.is_fresh(mod, pak_file, pak_path):
+                jobs.append((cache_key(mod, pak_file), mod, pak_file, pak_path))
+                count("pak_cache_miss")
+            else:
+                count("pak_cache_hit")
+    return jobs
+
+# Cache entry keys filled in by scans since the plugin started indexing pak contents
+INDEXED_KEYS = ('Prefixes', 'FileCount', 'Dependencies')
+
+def scan_workers(workers: int, jobs: int) -> int:
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return max(1, min(workers, jobs))
+
+def scan_pak(job, in_memory: bool = True): # Mod info of the pak, None when it couldn't be scanned this time
+    key, mod, pak_file, pak_path = job
+    try:
+        with span("scan pak", "pak", key=key) as scan:
+            mod_info = extract_meta_lsx(pak_path, in_memory=in_memory)
+    except DivineUnavailableError as e:
+        qDebug(f"{e}, the pak is left out of the cache and scanned again next time")
+        count("pak_scan_failed")
+        return None
+    tracer.pak_scanned(key, scan.duration)
+    mod_info["FileCount"] = len(mod_info.get("Files") or [])
+    return mod_info
+
+def pak_fingerprint_or_none(pak_path):
+    try:
+        return pak_fingerprint(pak_path)
+    except OSError:
+        return None
 
-        return mod_info
-    
+def confirm_content_or_skip(pak_path, fingerprint):
+    try:
+        confirm_content(fingerprint, pak_path)
+    except OSError:
+        pass  # Left unconfirmed, the pak is scanned on its own
 
-def getModInfoFromCache(modName:str, profile: mobase.IProfile, modList: mobase.IModList):
-    profilePath = profile.absolutePath()
-    cacheJsonPath = os.path.join(profilePath, "modsCache.json")
-    
-    if not os.path.exists(cacheJsonPath):
-        return None # No modsCache.json
+def content_identity(key, fingerprint): # Paks with the same identity are the same pak
+    if hash_covers_file(fingerprint["Size"]) or "FullHash" in fingerprint:
+        return (fingerprint["Size"], fingerprint["Hash"], fingerprint.get("FullHash"))
+    return (fingerprint["Size"], fingerprint["Hash"], None, key)  # Unconfirmed, never shared
+
+def scan_paks(jobs, workers: int = 0, in_memory: bool = True, modsCache: ModsCache = None): # Scan all paks on a bounded thread pool, returns {cache key: mod info}
+    if not jobs:
+        return {}
     
-    def load_mods_cache():
-        if os.path.exists(cacheJsonPath):
-            with open(cacheJsonPath, 'r') as file:
-                return json.load(file)
-        return None  # No modsCache.json
+    from collections import Counter
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=scan_workers(workers, len(jobs))) as pool:
+        fingerprints = list(pool.map(lambda job: pak_fingerprint_or_none(job[3]), jobs))
+        
+        # Paks deleted since the scan was planned (mod removed or updated meanwhile) are skipped
+        found = [(job, fingerprint) for job, fingerprint in zip(jobs, fingerprints) if fingerprint is not None]
+        count("pak_missing", len(jobs) - len(found))
+        jobs = [job for job, _ in found]
+        fingerprints = [fingerprint for _, fingerprint in found]
+        
+        # Size and partial hash only preselect, paks matching another one get their whole file hashed
+        candidates = Counter(content_key(fingerprint) for fingerprint in fingerprints)
+        unconfirmed = [
+            (job[3], fingerprint) for job, fingerprint in zip(jobs, fingerprints)
+            if candidates[content_key(fingerprint)] > 1 or (modsCache and modsCache.content_candidates(fingerprint))
+        ]
+        list(pool.map(lambda item: confirm_content_or_skip(*item), unconfirmed))
+        
+        # Identical paks, cached under another mod or shipped twice in this batch, are only extracted once
+        known = {}
+        unique_jobs = {}
+        for job, fingerprint in zip(jobs, fingerprints):
+            content = content_identity(job[0], fingerprint)
+            if content in known or content in unique_jobs:
+                continue
+            cached = modsCache.find_content(fingerprint) if modsCache else None
+            if cached and all(key in cached for key in INDEXED_KEYS):
+                known[content] = cached
+            else:
+                unique_jobs[content] = job
+        count("pak_content_dedup", len(jobs) - len(unique_jobs))
+        
+        extracted = dict(zip(unique_jobs, pool.map(lambda job: scan_pak(job, in_memory), unique_jobs.values())))
     
-    modsCache = load_mods_cache()
+    scanned = {}
+    for (key, mod, pak_file, _), fingerprint in zip(jobs, fingerprints):
+        content = content_identity(key, fingerprint)
+        source = extracted[content] if content in extracted else known[content]
+        if source is None:
+            continue  # Not cached, so the next run scans it again
+        mod_info = {name: value for name, value in source.items() if name not in ENTRY_COLUMNS}
+        if content in extracted and unique_jobs[content][0] == key:
+            mod_info["Files"] = source.get("Files")  # Stored once per content
+        mod_info["Mod"] = mod
+        mod_info["Pak"] = pak_file
+        mod_info["Fingerprint"] = fingerprint
+        scanned[key] = mod_info
+    return scanned
+
+def merge_scanned(modsCache: ModsCache, scanned): # Merge in key order so the cache file is the same whatever order workers finished in
+    for key in sorted(scanned):
+        modsCache.put(scanned[key])
+
+def cached_mod_paks(modsCache: ModsCache, mod): # [{pak file: mod info}] for the mod's current paks
+    return [{pak_file: mod_info} for pak_file, mod_info in modsCache.mod_paks(mod).items()]
+
+def modsInstalled(modList: mobase.IModList, profile: mobase.IProfile, mods, workers: int = 0, in_memory: bool = True):
+    with span("load cache"):
+        modsCache = ModsCache(profile.absolutePath())
     
-    # Return all .pak files related to the modName
-    modPakFiles = []
+    # Only re-extract paks whose fingerprint changed
+    with span("plan scans"):
+        jobs = plan_pak_scans(modsCache, modList, mods)
+    with span("scan paks", paks=len(jobs)):
+        merge_scanned(modsCache, scan_paks(jobs, workers, in_memory, modsCache))
+
+    # Save updated cache, one transaction for the whole batch
+    with span("save cache"):
+        modsCache.save()
     
-    modFolderPath = modList.getMod(modName).absolutePath() + "\\PAK_FILES"
-    if os.path.exists(modFolderPath) and os.path.isdir(modFolderPath):
-        pakFilesInFolder = [f for f in os.listdir(modFolderPath) if f.lower().endswith('.pak')]
-        for pak_file in pakFilesInFolder:
-            if not modsCache.get(pak_file):
-                modInstalled(modList, profile, modName)
-        modsCache = load_mods_cache()
+    return modsCache
+
+def modInstalled(modList: mobase.IModList, profile: mobase.IProfile, mod, workers: int = 0, in_memory: bool = True):
+    modsCache = modsInstalled(modList, profile, [mod], workers, in_memory)
     
-    for pak_file, mod_info in modsCache.items():
-        if "ModName" in mod_info and modName in mod_info["ModName"]:
-            modPakFiles.append({pak_file: mod_info})
+    modPakFiles = cached_mod_paks(modsCache, mod)
+    return modPakFiles if modPakFiles else None
+
     
-    if modPakFiles:
-        return modPakFiles
+def prune_removed_mods(modsCache: ModsCache, modList: mobase.IModList, modNames=None): # Drop entries of mods that no longer exist
+    for mod in modsCache.mods():
+        exists = mod in modNames if modNames is not None else modList.getMod(mod)
+        if not exists:
+            modsCache.remove_mod(mod)
+
+def modRemoved(modList: mobase.IModList, profile: mobase.IProfile, modName: str) -> bool:
+    modsCache = ModsCache(profile.absolutePath())
+        
+    if modsCache.remove_mod(modName):
+        print("Removed cached paks of", modName)
+        modsCache.save()
     else:
-        return None
-    
-def getModCachesFromName(modName: str, profile: mobase.IProfile):
-    profilePath = profile.absolutePath()
-    cacheJsonPath = os.path.join(profilePath, "modsCache.json")
+        print("No mods found using", modName)
+        
+# ModuleShortDesc attributes (id, value, type) of the base game module, always loaded first
+GUSTAV_MODULE = [
+    ('Folder', 'GustavDev', 'LSString'),
+    ('MD5', '5e66b6872b07a6b2283a4e4a9cccb325', 'LSString'),
+    ('Name', 'GustavDev', 'LSString'),
+    ('PublishHandle', '0', 'uint64'),
+    ('UUID', '28ac9ce2-2aba-8cda-b3b5-6e922f71b6b8', 'FixedString'),
+    ('Version64', '145100779997082619', 'int64'),
+]
+
+SETTINGS_DIGEST_FILE_NAME = "modsettings.digest"
+
+def module_attributes(mod_info): # ModuleShortDesc attributes for a cached pak, None if it doesn't go in the load order
+    name = mod_info.get('Name')
+    folder = mod_info.get('Folder')
+    publish_handle = mod_info.get('PublishHandle')
+    uuid = mod_info.get('UUID')
+    version = mod_info.get('Version')
+    version64 = mod_info.get('Version64')
     
-    if not os.path.exists(cacheJsonPath):
-        print("modsCache.json not found.")
+    if is_override(mod_info) or name == "Override_Mod":
         return None
     
-    with open(cacheJsonPath, 'r') as file:
-        modsCache = json.load(file)
-        
-    matchingMods = []
-    for pak_file, mod_info in modsCache.items():
-        if "ModName" in mod_info and modName in mod_info["ModName"]:
-            matchingMods.append({pak_file: mod_info})
-            # matchingMods[pak_file] = mod_info
-        
-    if matchingMods:
-        return matchingMods
-    else:
-        print(f"Mod '{modName}' not found in modsCache.json.")
-        return {}
-    
-def modInstalled(modList: mobase.IModList, profile: mobase.IProfile, mod) -> bool:
-    modsCache = {}
-    pakFileFolder = modList.getMod(mod).absolutePath() + "\\PAK_FILES"
+    if not publish_handle:
+        publish_handle = {'value': '0', 'type': 'uint64'}
     
-    temp_dir = os.path.join(Path(__file__).resolve().parent, 'temp_extracted')
-    temp_dir = Path(temp_dir)
-    temp_dir.mkdir(parents=True, exist_ok=True)
+    attributes = [
+        ('Folder', folder.get('value'), folder.get('type')),
+        ('MD5', '', 'LSString'),
+        ('Name', name.get('value'), name.get('type')),
+        ('PublishHandle', publish_handle.get('value'), publish_handle.get('type')),
+        ('UUID', uuid.get('value'), uuid.get('type')),
+    ]
+    if version:
+        attributes.append(('Version', version.get('value'), version.get('type')))
+    if version64:
+        attributes.append(('Version64', version64.get('value'), version64.get('type')))
     
-    if os.path.isdir(pakFileFolder):
-        files = os.listdir(pakFileFolder)
-        files = [f for f in files if f.lower().endswith(".pak")]
-        for file in files:
-            if file.endswith(".pak"):
-                mod_temp_dir = os.path.join(temp_dir, file)
-                if not os.path.exists(mod_temp_dir):
-                    os.makedirs(mod_temp_dir)
-
-                mod_info = extract_meta_lsx(os.path.join(pakFileFolder, file), mod_temp_dir)
-                if mod_info:
-                    modsCache[file] = mod_info
-                    if "ModName" not in modsCache[file]:
-                        modsCache[file]["ModName"] = []
-                    if mod not in modsCache[file]["ModName"]:
-                        modsCache[file]["ModName"].append(mod)
-
-    if modsCache:
-        profilePath = profile.absolutePath()
-        cacheJsonPath = os.path.join(profilePath, "modsCache.json")
-        
-        with open(cacheJsonPath, 'r') as file:
-            cacheJson = json.load(file)
-            
-        for pak_file, mod_info in modsCache.items():
-            if pak_file not in cacheJson:
-                cacheJson[pak_file] = mod_info
+    return attributes
+
+def load_order_modules(modsCache: ModsCache, modSequence, modStates, sort_dependencies: bool = False): # Attributes of every module in load order, and the dependency problems
+    active = []
+    installed = {}  # UUID -> disabled mod providing it
+    for mod in modSequence:
+        isActive = int(modStates[mod] / 2) % 2 != 0  # Check if mod is active
+        for mod_info in modsCache.mod_paks(mod).values():
+            if module_attributes(mod_info) is None:
+                continue
+            if isActive:
+                active.append((mod, mod_info))
             else:
-                # Update ModName list if mod isn't listed already
-                if mod not in cacheJson[pak_file]["ModName"]:
-                    cacheJson[pak_file]["ModName"].append(mod)
-
-                # Update Version and Version64 fields if they have changed
-                if mod_info["Version"] != cacheJson[pak_file]["Version"]:
-                    cacheJson[pak_file]["Version"] = mod_info["Version"]
-                if mod_info["Version64"] != cacheJson[pak_file]["Version64"]:
-                    cacheJson[pak_file]["Version64"] = mod_info["Version64"]
-
-        # Save updated cache
-        with open(cacheJsonPath, 'w') as file:
-            json.dump(cacheJson, file, indent=4)
+                installed.setdefault(mod_info['UUID'].get('value'), mod)
     
-    # Clean up temporary extraction directory
-    shutil.rmtree(temp_dir, ignore_errors=True)
-    
-    return modsCache if modsCache else None
+    active, problems = check_modules(active, sort_dependencies, installed)
+    modules = [GUSTAV_MODULE] + [module_attributes(mod_info) for _, mod_info in active]
+    return modules, problems
+
+def settings_digest(modules):
+    return hashlib.sha256(json.dumps(modules).encode('utf-8')).hexdigest()
+
+def quoteattr(value): # Always double quoted with " as &quot;, like minidom wrote the attributes
+    value = value.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;")
+    value = value.replace("\n", "&#10;").replace("\r", "&#13;").replace("\t", "&#9;")
+    return f'"{value}"'
+
+def xml_attribute(attr_id, value, attr_type):
+    return f'<attribute id={quoteattr(attr_id)} value={quoteattr(value or "")} type={quoteattr(attr_type or "")}/>'
+
+def write_modsettings(outputPath, modules): # Stream modsettings.lsx and swap it in atomically
+    tempPath = outputPath + ".tmp"
+    with open(tempPath, "w", encoding='utf-8') as f:
+        f.write('<?xml version="1.0" ?>\n')
+        f.write('<save>\n')
+        f.write('  <version major="4" minor="7" revision="1" build="3"/>\n')
+        f.write('  <region id="ModuleSettings">\n')
+        f.write('    <node id="root">\n')
+        f.write('      <children>\n')
+        
+        f.write('        <node id="ModOrder">\n')
+        f.write('          <children>\n')
+        for attributes in modules:
+            for attribute in attributes:
+                if attribute[0] == 'UUID':
+                    f.write('            <node id="Module">\n')
+                    f.write(f'              {xml_attribute(*attribute)}\n')
+                    f.write('            </node>\n')
+        f.write('          </children>\n')
+        f.write('        </node>\n')
+        
+        f.write('        <node id="Mods">\n')
+        f.write('          <children>\n')
+        for attributes in modules:
+            f.write('            <node id="ModuleShortDesc">\n')
+            for attribute in attributes:
+                f.write(f'              {xml_attribute(*attribute)}\n')
+            f.write('            </node>\n')
+        f.write('          </children>\n')
+        f.write('        </node>\n')
+        
+        f.write('      </children>\n')
+        f.write('    </node>\n')
+        f.write('  </region>\n')
+        f.write('</save>\n')
+    os.replace(tempPath, outputPath)
+
+def settings_inputs(modSequence, modStates, mod_paks, sort_dependencies): # Digest of what the load order is built from, paks by size and mtime
+    inputs = hashlib.sha256(json.dumps([sort_dependencies, [(mod, modStates[mod]) for mod in modSequence]]).encode('utf-8'))
+    for mod in modSequence:
+        for pak_file, pak_path in mod_paks[mod]:
+            try:
+                stat = os.stat(pak_path)
+            except OSError:
+                return None
+            inputs.update(f"{mod}\0{pak_file}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode('utf-8'))
+    return inputs.hexdigest()
+
+def written_mtime(outputPath):
+    try:
+        return str(os.stat(outputPath).st_mtime_ns)
+    except OSError:
+        return None
 
+def settings_stamp(outputPath, digest, inputs=None): # Inputs and modules digests plus the written file's mtime, so external edits also trigger a rewrite
+    mtime = written_mtime(outputPath)
+    return f"{inputs or '-'} {digest} {mtime}" if mtime else None
+
+def read_settings_stamp(digestPath):
+    try:
+        with open(digestPath, 'r') as file:
+            return file.read().strip()
+    except OSError:
+        return None
+
+def split_stamp(stamp): # (inputs, modules digest, mtime) of a stamp, None for anything else
+    fields = stamp.split() if stamp else []
+    return tuple(fields) if len(fields) == 3 else None
+
+def generateSettings(modList: mobase.IModList, profile: mobase.IProfile, workers: int = 0, in_memory: bool = True, sort_dependencies: bool = False, outputPath: str = None) -> bool:
+    modSequence = modList.allModsByProfilePriority()
+    # Every state() call goes through MO2, read them all once
+    modStates = {mod: modList.state(mod) for mod in modSequence}
     
-def fixModsCache(modList: mobase.IModList, profile: mobase.IProfile):
-    profilePath = profile.absolutePath()
-    cacheJsonPath = os.path.join(profilePath, "modsCache.json")
-    
-    with open(cacheJsonPath, 'r') as file:
-        modsCache = json.load(file)
-        
-    if modsCache:
-        for pak_file, mod_info in modsCache.items():
-            for modName in mod_info["ModName"]:
-                mod = modList.getMod(modName)
-                if not mod:
-                    modsCache[pak_file]["ModName"].remove(modName)
-                    
-        with open(cacheJsonPath, 'w') as file:
-            json.dump(modsCache, file, indent=4)
-       
-def modRemoved(modList: mobase.IModList, profile: mobase.IProfile, modName: str) -> bool:
     profilePath = profile.absolutePath()
-    cacheJsonPath = os.path.join(profilePath, "modsCache.json")
-  
-    with open(cacheJsonPath, 'r') as file:
-        modsCache = json.load(file)
-        
-    matchingCache = getModCachesFromName(modName, profile)   
-    if matchingCache:
-        print("Mods found using", modName, ":", matchingCache)
-        for match in matchingCache:    
-            for pak_file, mod_info in match.items():
-                if modName in modsCache[pak_file]["ModName"]:
-                    modsCache[pak_file]["ModName"].remove(modName)
-                if not modsCache[pak_file]["ModName"]:
-                    del modsCache[pak_file]
-                            
-        with open(cacheJsonPath, 'w') as file:
-            json.dump(modsCache, file, indent=4)
+    if outputPath is None:
+        outputPath = os.path.join(profilePath, "modsettings.lsx")
+        digestPath = os.path.join(profilePath, SETTINGS_DIGEST_FILE_NAME)
     else:
-        print("No mods found using", modName)
-        
-def generateSettings(modList: mobase.IModList, profile: mobase.IProfile) -> bool:
-    fixModsCache(modList, profile)
+        digestPath = os.path.splitext(outputPath)[0] + ".digest"
     
-    modInfoDict = {}
-    modSequence = modList.allModsByProfilePriority()
+    # Same mods, states and paks as the last written file, and that file untouched: nothing
+    # to scan or write, without loading the cache
+    with span("check inputs"):
+        mod_paks = {mod: mod_pak_paths(modList, mod) for mod in modSequence}
+        inputs = settings_inputs(modSequence, modStates, mod_paks, sort_dependencies)
+        stamp = split_stamp(read_settings_stamp(digestPath))
+        mtime = written_mtime(outputPath)
+    if inputs and stamp and mtime and stamp[0] == inputs and stamp[2] == mtime:
+        count("pak_cache_hit", sum(len(paks) for paks in mod_paks.values()))
+        count("modsettings_unchanged")
+        return True
     
-    temp_dir = os.path.join(Path(__file__).resolve().parent, 'temp_extracted')
-    temp_dir = Path(temp_dir)
-    temp_dir.mkdir(parents=True, exist_ok=True)
+    with span("load cache"):
+        modsCache = ModsCache(profilePath)
+        prune_removed_mods(modsCache, modList, set(modSequence))
     
-    for mod in modSequence:           
-        # Get all .pak files associated with the mod
-        pak_files_info = getModInfoFromCache(mod, profile, modList)
-        if not pak_files_info: # Mod is not in cache
-            pak_files_info = modInstalled(modList, profile, mod)
-            if pak_files_info:
-                # Add to mod cache
-                modInfoDict[mod] = pak_files_info
-            else:
-                continue
-        else:
-            modInfoDict[mod] = pak_files_info
-                            
-    root = minidom.Document()
-    save = root.createElement('save')
-    root.appendChild(save)
-    version = root.createElement('version')
-    version.setAttribute('major', '4')
-    version.setAttribute('minor', '7')
-    version.setAttribute('revision', '1')
-    version.setAttribute('build', '3')
-    save.appendChild(version)
-    region = root.createElement('region')
-    region.setAttribute('id', 'ModuleSettings')
-    save.appendChild(region)
-    nodeRoot = root.createElement('node')
-    nodeRoot.setAttribute('id', 'root')
-    region.appendChild(nodeRoot)
-    nodeRootChildren = root.createElement('children')#the base element ModOrder and Mods nodes get appended to
-    nodeRoot.appendChild(nodeRootChildren)
-
-    nodeModOrder = root.createElement('node')
-    nodeModOrder.setAttribute('id', 'ModOrder')
-    nodeRootChildren.appendChild(nodeModOrder)
-    nodeModOrderChildren = root.createElement('children')#the base element all "ModOrder" "Module" tags get appended to
-    nodeModOrder.appendChild(nodeModOrderChildren)
-    nodeModuleGustav = root.createElement('node')
-    nodeModuleGustav.setAttribute('id', 'Module')
-    nodeModOrderChildren.appendChild(nodeModuleGustav)
-    attributeModOrderUUIDGustav = root.createElement('attribute')
-    attributeModOrderUUIDGustav.setAttribute('id', 'UUID')
-    attributeModOrderUUIDGustav.setAttribute('value', '28ac9ce2-2aba-8cda-b3b5-6e922f71b6b8')
-    attributeModOrderUUIDGustav.setAttribute('type', 'FixedString')
-    nodeModuleGustav.appendChild(attributeModOrderUUIDGustav)
-
-    nodeMods = root.createElement('node')
-    nodeMods.setAttribute('id', 'Mods')
-    nodeRootChildren.appendChild(nodeMods)
-    nodeModsChildren = root.createElement('children')#the base element all "Mods" "ModuleShortDesc" tags get appended to
-    nodeMods.appendChild(nodeModsChildren)
-    nodeModuleShortDescGustav = root.createElement('node')
-    nodeModuleShortDescGustav.setAttribute('id', 'ModuleShortDesc')
-    nodeModsChildren.appendChild(nodeModuleShortDescGustav)
-    attributeFolderGustav = root.createElement('attribute')
-    attributeFolderGustav.setAttribute('id', 'Folder')
-    attributeFolderGustav.setAttribute('value', 'GustavDev')
-    attributeFolderGustav.setAttribute('type', 'LSString')
-    nodeModuleShortDescGustav.appendChild(attributeFolderGustav)
-    attributeMD5Gustav = root.createElement('attribute')
-    attributeMD5Gustav.setAttribute('id', 'MD5')
-    attributeMD5Gustav.setAttribute('value', '5e66b6872b07a6b2283a4e4a9cccb325')
-    attributeMD5Gustav.setAttribute('type', 'LSString')
-    nodeModuleShortDescGustav.appendChild(attributeMD5Gustav)
-    attributeNameGustav = root.createElement('attribute')
-    attributeNameGustav.setAttribute('id', 'Name')
-    attributeNameGustav.setAttribute('value', 'GustavDev')
-    attributeNameGustav.setAttribute('type', 'LSString')
-    nodeModuleShortDescGustav.appendChild(attributeNameGustav)
-    attributeNameGustav = root.createElement('attribute')
-    attributeNameGustav.setAttribute('id', 'PublishHandle')
-    attributeNameGustav.setAttribute('value', '0')
-    attributeNameGustav.setAttribute('type', 'uint64')
-    nodeModuleShortDescGustav.appendChild(attributeNameGustav) 
-    attributeModsUUIDGustav = root.createElement('attribute')
-    attributeModsUUIDGustav.setAttribute('id', 'UUID') 
-    attributeModsUUIDGustav.setAttribute('value', '28ac9ce2-2aba-8cda-b3b5-6e922f71b6b8')
-    attributeModsUUIDGustav.setAttribute('type', 'FixedString')
-    nodeModuleShortDescGustav.appendChild(attributeModsUUIDGustav)
-    attributeVersion64Gustav = root.createElement('attribute')
-    attributeVersion64Gustav.setAttribute('id', 'Version64') 
-    attributeVersion64Gustav.setAttribute('value', '145100779997082619')
-    attributeVersion64Gustav.setAttribute('type', 'int64')
-    nodeModuleShortDescGustav.appendChild(attributeVersion64Gustav)   
+    # Scan every new or changed pak up front instead of one mod at a time
+    with span("plan scans"):
+        jobs = plan_pak_scans(modsCache, modList, modSequence, mod_paks)
+    with span("scan paks", paks=len(jobs)):
+        scanned = scan_paks(jobs, workers, in_memory, modsCache)
+        merge_scanned(modsCache, scanned)
+    with span("save cache"):
+        modsCache.save()
     
-    # Geneate modsettings.lsx LoadOrder
-    for mod in modSequence:  # Use modSequence for iteration
-        if (int(modList.state(mod) / 2) % 2 != 0):  # Check if mod is active
-            pak_files_info_list = modInfoDict.get(mod, [])  # Get pak files info for the active mod
-            if not pak_files_info_list:
-                continue
-            
-            for pak_info_dict in pak_files_info_list:
-                if isinstance(pak_info_dict, dict):
-                    for pak_file, mod_info in pak_info_dict.items():
-                        
-                        name = mod_info.get('Name')
-                        folder = mod_info.get('Folder')
-                        publish_handle = mod_info.get('PublishHandle')
-                        uuid = mod_info.get('UUID')
-                        version = mod_info.get('Version')
-                        version64 = mod_info.get('Version64')
-                        is_override = mod_info.get('IsOverride')
-                        
-                        if is_override:
-                            continue
-
-                        if name != "Override_Mod":
-                            # Add to ModOrder
-                            nodeModule = root.createElement('node')
-                            nodeModule.setAttribute('id', 'Module')
-                            nodeModOrderChildren.appendChild(nodeModule)
-                            attributeModOrderUUID = root.createElement('attribute')
-                            attributeModOrderUUID.setAttribute('id', 'UUID')
-                            attributeModOrderUUID.setAttribute('value', uuid.get('value'))
-                            attributeModOrderUUID.setAttribute('type', uuid.get('type'))
-                            nodeModule.appendChild(attributeModOrderUUID)
-
-                            # Add to Mods
-                            nodeModuleShortDesc = root.createElement('node')
-                            nodeModuleShortDesc.setAttribute('id', 'ModuleShortDesc')
-                            nodeModsChildren.appendChild(nodeModuleShortDesc)
-                            
-                            attributeFolder = root.createElement('attribute')
-                            attributeFolder.setAttribute('id', 'Folder')
-                            attributeFolder.setAttribute('value', folder.get('value'))
-                            attributeFolder.setAttribute('type', folder.get('type'))
-                            nodeModuleShortDesc.appendChild(attributeFolder)
-                            
-                            attributeMD5 = root.createElement('attribute')
-                            attributeMD5.setAttribute('id', 'MD5')
-                            attributeMD5.setAttribute('value', '')
-                            attributeMD5.setAttribute('type', 'LSString')
-                            nodeModuleShortDesc.appendChild(attributeMD5)
-                            
-                            attributeName = root.createElement('attribute')
-                            attributeName.setAttribute('id', 'Name')
-                            attributeName.setAttribute('value', name.get('value'))
-                            attributeName.setAttribute('type', name.get('type'))
-                            nodeModuleShortDesc.appendChild(attributeName)
-                            
-                            if not publish_handle:
-                                publish_handle = {'value': '0', 'type': 'uint64'}
-                            attributePublishHandle = root.createElement('attribute')
-                            attributePublishHandle.setAttribute('id', 'PublishHandle')
-                            attributePublishHandle.setAttribute('value', publish_handle.get('value'))
-                            attributePublishHandle.setAttribute('type', publish_handle.get('type'))
-                            nodeModuleShortDesc.appendChild(attributePublishHandle)
-                            
-                            attributeModsUUID = root.createElement('attribute')
-                            attributeModsUUID.setAttribute('id', 'UUID')
-                            attributeModsUUID.setAttribute('value', uuid.get('value'))
-                            attributeModsUUID.setAttribute('type', uuid.get('type'))
-                            nodeModuleShortDesc.appendChild(attributeModsUUID)
-                            
-                            if version:                        
-                                attributeVersion = root.createElement('attribute')
-                                attributeVersion.setAttribute('id', 'Version')
-                                attributeVersion.setAttribute('value', version.get('value') if version else '')
-                                attributeVersion.setAttribute('type', version.get('type') if version else '')
-                                nodeModuleShortDesc.appendChild(attributeVersion)
-                            
-                            if version64:
-                                attributeVersion64 = root.createElement('attribute')
-                                attributeVersion64.setAttribute('id', 'Version64')
-                                attributeVersion64.setAttribute('value', version64.get('value') if version64 else '')
-                                attributeVersion64.setAttribute('type', version64.get('type') if version64 else '')
-                                nodeModuleShortDesc.appendChild(attributeVersion64)
-
-    # Save the modsettings.lsx file
-    xml_str = root.toprettyxml(indent="  ")
-    outputPath = profile.absolutePath() + "\\modsettings.lsx"
-    with open(outputPath, "w", encoding='utf-8') as f:
-        f.write(xml_str)
-        f.close()
-
-    # Clean up the temp directory
-    temp_dir = Path(temp_dir)
-    if os.path.exists(temp_dir):
-        for item in temp_dir.iterdir():
-            try:
-                if item.is_file() or item.is_symlink():
-                    item.unlink()
-                elif item.is_dir():
-                    shutil.rmtree(item)
-            except Exception as e:
-                print(f"Error deleting {item}: {e}")
+    with span("build load order"):
+        modules, problems = load_order_modules(modsCache, modSequence, modStates, sort_dependencies)
+    for problem in problems:
+        qDebug(f"BG3 load order: {problem}")
+    count("dependency_problems", len(problems))
+    write_dependency_report(profilePath, problems)
+    
+    # A pak that couldn't be scanned this time is scanned again next time, don't let the inputs skip that
+    if len(scanned) < len(jobs):
+        inputs = None
+    
+    # Skip writing when the load order is the same as the last launch
+    digest = settings_digest(modules)
+    if stamp and mtime and stamp[1] == digest and stamp[2] == mtime:
+        count("modsettings_unchanged")
+    else:
+        # Save the modsettings.lsx file
+        with span("write modsettings.lsx", modules=len(modules)):
+            write_modsettings(outputPath, modules)
+    with open(digestPath, 'w') as file:
+        file.write(settings_stamp(outputPath, digest, inputs))
 
     return True
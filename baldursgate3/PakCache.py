@@ -0,0 +1,384 @@
+# -*- encoding: utf-8 -*-
+
+# Pak metadata cache. Entries are keyed by "<mod name>/<pak path relative to PAK_FILES>"
+# and carry a fingerprint of the pak so a changed file is detected on lookup. They are
+# stored in one SQLite database per MO2 instance, shared by all profiles since they
+# share the mods folder. Pak metadata is stored once per content, so the same pak
+# shipped by several mods is only scanned once. Size plus a hash of the pak's head and
+# tail only preselects candidates, paks larger than that are shared once a hash of the
+# whole file confirms them. The file list of every pak is
+# kept in pak_files, which ConflictIndex queries. The modsCache.json of earlier plugin
+# versions has no fingerprints or file lists and is ignored, its paks are scanned again once.
+
+import os
+import json
+import hashlib
+import sqlite3
+
+STORE_FILE_NAME = "bg3PakCache.sqlite"
+PAK_FOLDER = "PAK_FILES"
+
+# Bytes hashed from the start and the end of a pak for the partial content hash
+HASH_CHUNK_SIZE = 64 * 1024
+FULL_HASH_BLOCK_SIZE = 1024 * 1024
+
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS mods (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS paks (
+    id INTEGER PRIMARY KEY,
+    size INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    full_hash TEXT,
+    info TEXT NOT NULL,
+    UNIQUE (size, hash, full_hash)
+);
+CREATE TABLE IF NOT EXISTS pak_owners (
+    mod_id INTEGER NOT NULL REFERENCES mods(id) ON DELETE CASCADE,
+    pak_file TEXT NOT NULL,
+    pak_id INTEGER NOT NULL REFERENCES paks(id) ON DELETE CASCADE,
+    mtime_ns INTEGER NOT NULL,
+    PRIMARY KEY (mod_id, pak_file)
+);
+CREATE INDEX IF NOT EXISTS pak_owners_pak ON pak_owners (pak_id);
+CREATE TABLE IF NOT EXISTS pak_files (
+    pak_id INTEGER NOT NULL REFERENCES paks(id) ON DELETE CASCADE,
+    path TEXT NOT NULL COLLATE NOCASE
+);
+CREATE INDEX IF NOT EXISTS pak_files_path ON pak_files (path);
+CREATE INDEX IF NOT EXISTS pak_files_pak ON pak_files (pak_id);
+"""
+
+# Keys of a cache entry that live in their own columns or tables rather than in paks.info
+ENTRY_COLUMNS = ("Mod", "Pak", "Fingerprint", "Files")
+
+
+def cache_key(mod_name: str, pak_file: str) -> str:
+    return f"{mod_name}/{pak_file}"
+
+
+# Instance folder (IOrganizer.basePath()), set by the plugin when it is initialised
+_instance_path = None
+
+
+def set_instance_path(path):
+    global _instance_path
+    _instance_path = path
+
+
+def instance_path(profile_path: str) -> str:
+    if _instance_path:
+        return _instance_path
+    # Profiles normally live in <instance>/profiles/<name>, otherwise keep the store with the profile
+    parent = os.path.dirname(os.path.normpath(profile_path))
+    if os.path.basename(parent).lower() == "profiles":
+        return os.path.dirname(parent)
+    return profile_path
+
+
+def store_path(profile_path: str) -> str:
+    return os.path.join(instance_path(profile_path), STORE_FILE_NAME)
+
+
+def entry_uuid(entry: dict):
+    attribute = entry.get("UUID")
+    return attribute.get("value") if isinstance(attribute, dict) else None
+
+
+def content_key(fingerprint: dict) -> tuple:
+    # The modification time depends on where the pak was copied to, not on what it holds.
+    # Paks with the same key are only candidates for the same content, see same_content
+    return (fingerprint.get("Size"), fingerprint.get("Hash"))
+
+
+def hash_covers_file(size: int) -> bool:
+    # partial_hash reads every byte of paks up to two chunks long
+    return size <= 2 * HASH_CHUNK_SIZE
+
+
+def same_content(fingerprint: dict, other: dict) -> bool:
+    if content_key(fingerprint) != content_key(other):
+        return False
+    if hash_covers_file(fingerprint.get("Size") or 0):
+        return True
+    return fingerprint.get("FullHash") is not None and fingerprint.get("FullHash") == other.get("FullHash")
+
+
+def partial_hash(pak_path, size: int) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(pak_path, "rb") as f:
+        digest.update(f.read(HASH_CHUNK_SIZE))
+        if size > HASH_CHUNK_SIZE:
+            f.seek(max(HASH_CHUNK_SIZE, size - HASH_CHUNK_SIZE))
+            digest.update(f.read(HASH_CHUNK_SIZE))
+    return digest.hexdigest()
+
+
+def full_hash(pak_path) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(pak_path, "rb") as f:
+        for block in iter(lambda: f.read(FULL_HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def confirm_content(fingerprint: dict, pak_path):
+    # Adds the whole file hash same_content needs, only read for paks whose partial hash matched another
+    if "FullHash" not in fingerprint and not hash_covers_file(fingerprint["Size"]):
+        fingerprint["FullHash"] = full_hash(pak_path)
+
+
+def pak_fingerprint(pak_path, stat=None) -> dict:
+    stat = stat or os.stat(pak_path)
+    return {
+        "Size": stat.st_size,
+        "MtimeNs": stat.st_mtime_ns,
+        "Hash": partial_hash(pak_path, stat.st_size),
+    }
+
+
+def is_fresh(entry: dict, pak_path) -> bool:
+    # Size + mtime is enough in the common case, the hash is only computed when the
+    # timestamp moved (copied or re-extracted files) to confirm the content changed.
+    fingerprint = entry.get("Fingerprint")
+    if not fingerprint:
+        return False
+
+    try:
+        stat = os.stat(pak_path)
+    except OSError:
+        return False
+
+    if stat.st_size != fingerprint.get("Size"):
+        return False
+    if stat.st_mtime_ns == fingerprint.get("MtimeNs"):
+        return True
+
+    if partial_hash(pak_path, stat.st_size) != fingerprint.get("Hash"):
+        return False
+    if fingerprint.get("FullHash") is not None and full_hash(pak_path) != fingerprint["FullHash"]:
+        return False  # The whole file hash may share the entry with other paks, keep it true
+    fingerprint["MtimeNs"] = stat.st_mtime_ns
+    return True
+
+
+def list_mod_paks(mod_path: str) -> list:
+    try:
+        names = os.listdir(os.path.join(mod_path, PAK_FOLDER))
+    except OSError:  # No PAK_FILES folder, or the mod was removed meanwhile
+        return []
+    return sorted(f for f in names if f.lower().endswith(".pak"))
+
+
+def connect(profile_path: str) -> sqlite3.Connection:
+    db = sqlite3.connect(store_path(profile_path))
+    db.execute("PRAGMA journal_mode = WAL")
+    db.execute("PRAGMA foreign_keys = ON")
+    if db.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+        with db:
+            db.executescript(SCHEMA)
+            db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    return db
+
+
+def create_store(profile_path: str):
+    connect(profile_path).close()
+
+
+def read_entries(db: sqlite3.Connection) -> dict:
+    entries = {}
+    query = (
+        "SELECT mods.name, pak_owners.pak_file, paks.size, pak_owners.mtime_ns, paks.hash, paks.full_hash, paks.info "
+        "FROM pak_owners JOIN mods ON mods.id = pak_owners.mod_id JOIN paks ON paks.id = pak_owners.pak_id"
+    )
+    for mod_name, pak_file, size, mtime_ns, digest, whole_digest, info in db.execute(query):
+        entry = json.loads(info)
+        entry["Mod"] = mod_name
+        entry["Pak"] = pak_file
+        entry["Fingerprint"] = {"Size": size, "MtimeNs": mtime_ns, "Hash": digest}
+        if whole_digest is not None:
+            entry["Fingerprint"]["FullHash"] = whole_digest
+        entries[cache_key(mod_name, pak_file)] = entry
+    return entries
+
+
+def write_entry(db: sqlite3.Connection, entry: dict, files=None):
+    info = json.dumps({key: value for key, value in entry.items() if key not in ENTRY_COLUMNS})
+    fingerprint = entry["Fingerprint"]
+
+    # One paks row per content, the mod/pak file location only points at it
+    pak_id = None
+    rows = db.execute("SELECT id, full_hash FROM paks WHERE size = ? AND hash = ?", (fingerprint["Size"], fingerprint["Hash"]))
+    for row_id, row_full_hash in rows.fetchall():
+        if same_content(fingerprint, {"Size": fingerprint["Size"], "Hash": fingerprint["Hash"], "FullHash": row_full_hash}):
+            pak_id = row_id
+            break
+    if pak_id is not None:
+        db.execute("UPDATE paks SET info = ? WHERE id = ?", (info, pak_id))
+    else:
+        pak_id = db.execute(
+            "INSERT INTO paks (size, hash, full_hash, info) VALUES (?, ?, ?, ?)",
+            (fingerprint["Size"], fingerprint["Hash"], fingerprint.get("FullHash"), info),
+        ).lastrowid
+
+    db.execute("INSERT OR IGNORE INTO mods (name) VALUES (?)", (entry["Mod"],))
+    mod_id = db.execute("SELECT id FROM mods WHERE name = ?", (entry["Mod"],)).fetchone()[0]
+    db.execute(
+        "INSERT OR REPLACE INTO pak_owners (mod_id, pak_file, pak_id, mtime_ns) VALUES (?, ?, ?, ?)",
+        (mod_id, entry["Pak"], pak_id, fingerprint["MtimeNs"]),
+    )
+
+    if files is not None:
+        write_pak_files(db, pak_id, files)
+
+
+def write_pak_files(db: sqlite3.Connection, pak_id: int, files):
+    db.execute("DELETE FROM pak_files WHERE pak_id = ?", (pak_id,))
+    db.executemany("INSERT INTO pak_files (pak_id, path) VALUES (?, ?)", ((pak_id, path) for path in files))
+
+
+def delete_entry(db: sqlite3.Connection, mod_name: str, pak_file: str):
+    db.execute(
+        "DELETE FROM pak_owners WHERE pak_file = ? AND mod_id = (SELECT id FROM mods WHERE name = ?)",
+        (pak_file, mod_name),
+    )
+
+
+def delete_orphans(db: sqlite3.Connection):
+    db.execute("DELETE FROM paks WHERE id NOT IN (SELECT pak_id FROM pak_owners)")
+    db.execute("DELETE FROM mods WHERE id NOT IN (SELECT mod_id FROM pak_owners)")
+
+
+class ModsCache:
+    """Pak metadata cache loaded once per hook, with a mod -> {pak file: cache key} index
+    so per-mod lookups don't have to walk every entry. Changes are kept in memory and
+    written in a single transaction by save()."""
+
+    def __init__(self, profile_path: str):
+        self.profile_path = profile_path
+        db = connect(profile_path)
+        try:
+            self.entries = read_entries(db)
+        finally:
+            db.close()
+
+        self._changed = set()
+        self._removed = set()
+        self._files = {}  # (mod, pak file) -> file list of scanned paks, until saved
+        self._by_mod = {}
+        self._by_content = {}  # (size, hash) -> {cache keys of paks that may have that content}
+        self._by_uuid = {}  # module UUID -> {cache keys of the paks declaring it}
+        for key, entry in self.entries.items():
+            self._by_mod.setdefault(entry.get("Mod"), {})[entry.get("Pak")] = key
+            self._by_content.setdefault(content_key(entry["Fingerprint"]), set()).add(key)
+            self._by_uuid.setdefault(entry_uuid(entry), set()).add(key)
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._changed or self._removed)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def mods(self) -> list:
+        return list(self._by_mod)
+
+    def get(self, mod_name: str, pak_file: str):
+        return self.entries.get(cache_key(mod_name, pak_file))
+
+    def mod_paks(self, mod_name: str) -> dict:
+        paks = self._by_mod.get(mod_name, {})
+        return {pak_file: self.entries[paks[pak_file]] for pak_file in sorted(paks)}
+
+    def uuid_mods(self, uuid: str) -> list:
+        # Mods shipping a pak whose meta.lsx declares the module
+        return sorted({self.entries[key]["Mod"] for key in self._by_uuid.get(uuid, ())})
+
+    def content_candidates(self, fingerprint: dict) -> list:
+        # Entries whose size and partial hash match, same_content tells whether they hold the same pak
+        keys = self._by_content.get(content_key(fingerprint), ())
+        entries = (self.entries.get(key) for key in sorted(keys))
+        return [entry for entry in entries if entry and content_key(entry["Fingerprint"]) == content_key(fingerprint)]
+
+    def find_content(self, fingerprint: dict):
+        # Entry of another location holding the same pak, identical paks only need one scan
+        for entry in self.content_candidates(fingerprint):
+            if same_content(fingerprint, entry["Fingerprint"]):
+                return entry
+        return None
+
+    def is_fresh(self, mod_name: str, pak_file: str, pak_path) -> bool:
+        entry = self.get(mod_name, pak_file)
+        if not entry:
+            return False
+        mtime_ns = entry["Fingerprint"].get("MtimeNs")
+        fresh = is_fresh(entry, pak_path)
+        if fresh and entry["Fingerprint"].get("MtimeNs") != mtime_ns:
+            self._changed.add((mod_name, pak_file))  # Same content, new timestamp
+        return fresh
+
+    def put(self, entry: dict):
+        mod_name, pak_file = entry["Mod"], entry["Pak"]
+        files = entry.pop("Files", None)
+        if files is not None:
+            self._files[(mod_name, pak_file)] = files
+        key = cache_key(mod_name, pak_file)
+        previous = self.entries.get(key)
+        if previous is not None:
+            self._by_uuid.get(entry_uuid(previous), set()).discard(key)
+        self.entries[key] = entry
+        self._by_mod.setdefault(mod_name, {})[pak_file] = key
+        self._by_uuid.setdefault(entry_uuid(entry), set()).add(key)
+        self._by_content.setdefault(content_key(entry["Fingerprint"]), set()).add(key)
+        self._changed.add((mod_name, pak_file))
+        self._removed.discard((mod_name, pak_file))
+
+    def remove(self, mod_name: str, pak_file: str):
+        paks = self._by_mod.get(mod_name, {})
+        key = paks.pop(pak_file, None)
+        if key is not None:
+            self._by_uuid.get(entry_uuid(self.entries[key]), set()).discard(key)
+            del self.entries[key]
+            self._removed.add((mod_name, pak_file))
+            self._changed.discard((mod_name, pak_file))
+            self._files.pop((mod_name, pak_file), None)
+        if not paks:
+            self._by_mod.pop(mod_name, None)
+
+    def discard_changes(self, mod_name: str):
+        # Drop the mod's pending writes and removals, save() then leaves its rows to whoever changed them
+        self._changed = {item for item in self._changed if item[0] != mod_name}
+        self._removed = {item for item in self._removed if item[0] != mod_name}
+        for item in [item for item in self._files if item[0] == mod_name]:
+            del self._files[item]
+
+    def remove_mod(self, mod_name: str) -> bool:
+        paks = self._by_mod.get(mod_name)
+        if not paks:
+            return False
+        for pak_file in list(paks):
+            self.remove(mod_name, pak_file)
+        return True
+
+    def save(self):
+        if not self.dirty:
+            return
+
+        db = connect(self.profile_path)
+        try:
+            with db:
+                for mod_name, pak_file in sorted(self._removed):
+                    delete_entry(db, mod_name, pak_file)
+                for mod_name, pak_file in sorted(self._changed):
+                    write_entry(db, self.entries[cache_key(mod_name, pak_file)], self._files.get((mod_name, pak_file)))
+                delete_orphans(db)
+        finally:
+            db.close()
+
+        self._changed.clear()
+        self._removed.clear()
+        self._files.clear()
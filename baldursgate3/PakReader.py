@@ -0,0 +1,322 @@
+# -*- encoding: utf-8 -*-
+
+# Native reader for Larian LSPK packages (.pak / .lsv), based on the LSLib
+# PackageReader layout. Only the BG3 era versions (15, 16, 18) are handled here,
+# anything else raises UnsupportedPakError so callers can fall back to Divine.
+
+import os
+import mmap
+import struct
+import zlib
+from typing import Dict, List, Optional
+
+LSPK_SIGNATURE = b"LSPK"
+
+# Package flags
+FLAG_SOLID = 0x04
+
+# Per-file compression method (lower nibble of the entry flags)
+METHOD_NONE = 0
+METHOD_ZLIB = 1
+METHOD_LZ4 = 2
+METHOD_ZSTD = 3
+
+# Version -> (header struct, file entry struct, file entry size)
+# LSPKHeader15: Version, FileListOffset, FileListSize, Flags, Priority, Md5[16]
+# LSPKHeader16: LSPKHeader15 + NumParts
+# FileEntry15: Name[256], OffsetInFile, SizeOnDisk, UncompressedSize, ArchivePart, Flags, Crc, Unknown2
+# FileEntry18: Name[256], OffsetInFile1, OffsetInFile2, ArchivePart, Flags, SizeOnDisk, UncompressedSize
+_HEADER_15 = struct.Struct("<IQIBB16s")
+_HEADER_16 = struct.Struct("<IQIBB16sH")
+_ENTRY_15 = struct.Struct("<256sQQQIIII")
+_ENTRY_18 = struct.Struct("<256sIHBBII")
+_FILE_LIST = struct.Struct("<II")  # NumFiles, CompressedSize, then the LZ4 compressed entries
+
+SUPPORTED_VERSIONS = {
+    15: _HEADER_15,
+    16: _HEADER_16,
+    18: _HEADER_16,
+}
+
+try:
+    import lz4.block as _lz4_block  # type: ignore
+except ImportError:
+    _lz4_block = None
+
+try:
+    import zstandard as _zstandard  # type: ignore
+except ImportError:
+    _zstandard = None
+
+
+class PakError(Exception):
+    pass
+
+
+class UnsupportedPakError(PakError):
+    pass
+
+
+# Errors a truncated or corrupt package raises on the way, reported as PakError so callers
+# only have one exception to fall back on
+_READ_ERRORS = (struct.error, IndexError, OSError, ValueError, zlib.error)
+
+
+def _unpack(layout: struct.Struct, mm, offset: int, path, what: str):
+    if offset < 0 or offset + layout.size > len(mm):
+        raise PakError(f"{path} is truncated ({what} past the end of the file)")
+    return layout.unpack_from(mm, offset)
+
+
+def lz4_block_decompress(src, uncompressed_size: int) -> bytes:
+    if _lz4_block is not None:
+        try:
+            return _lz4_block.decompress(bytes(src), uncompressed_size=uncompressed_size)
+        except Exception as e:  # lz4.block.LZ4BlockError
+            raise PakError(f"Corrupt LZ4 block ({e})")
+    try:
+        return _lz4_block_decode(src, uncompressed_size)
+    except IndexError:
+        raise PakError("Corrupt LZ4 block (truncated sequence)")
+
+
+def _lz4_block_decode(src, uncompressed_size: int) -> bytes:
+    # Plain LZ4 block decoder, used when the lz4 module isn't shipped with MO2
+    dst = bytearray()
+    src_len = len(src)
+    i = 0
+    while i < src_len:
+        token = src[i]
+        i += 1
+
+        literal_len = token >> 4
+        if literal_len == 15:
+            while True:
+                b = src[i]
+                i += 1
+                literal_len += b
+                if b != 255:
+                    break
+        dst += src[i:i + literal_len]
+        i += literal_len
+        if i >= src_len:
+            break  # Last sequence only carries literals
+
+        offset = src[i] | (src[i + 1] << 8)
+        i += 2
+        if offset == 0:
+            raise PakError("Corrupt LZ4 block (zero offset)")
+
+        match_len = token & 0x0F
+        if match_len == 15:
+            while True:
+                b = src[i]
+                i += 1
+                match_len += b
+                if b != 255:
+                    break
+        match_len += 4
+
+        start = len(dst) - offset
+        if start < 0:
+            raise PakError("Corrupt LZ4 block (offset out of range)")
+        if offset >= match_len:
+            dst += dst[start:start + match_len]
+        else:
+            # Overlapping copy, repeat the pattern
+            pattern = dst[start:]
+            dst += (pattern * (match_len // offset + 1))[:match_len]
+
+    if len(dst) != uncompressed_size:
+        raise PakError(f"LZ4 size mismatch ({len(dst)} != {uncompressed_size})")
+    return bytes(dst)
+
+
+def zstd_decompress(src, uncompressed_size: int) -> bytes:
+    if _zstandard is None:
+        raise UnsupportedPakError("Zstd compressed entry and no zstandard module available")
+    try:
+        return _zstandard.ZstdDecompressor().decompress(bytes(src), max_output_size=uncompressed_size)
+    except _zstandard.ZstdError as e:
+        raise PakError(f"Corrupt Zstd frame ({e})")
+
+
+class PakEntry:
+    __slots__ = ("name", "offset", "size_on_disk", "uncompressed_size", "archive_part", "flags")
+
+    def __init__(self, name, offset, size_on_disk, uncompressed_size, archive_part, flags):
+        self.name = name
+        self.offset = offset
+        self.size_on_disk = size_on_disk
+        self.uncompressed_size = uncompressed_size
+        self.archive_part = archive_part
+        self.flags = flags
+
+    @property
+    def method(self) -> int:
+        return self.flags & 0x0F
+
+    def __repr__(self):
+        return f"PakEntry({self.name!r}, size={self.size_on_disk})"
+
+
+class LSPKReader:
+    """Memory mapped LSPK package. Use as a context manager so the mapping
+    (and the Windows file lock that comes with it) is released promptly."""
+
+    def __init__(self, pak_path):
+        self.path = str(pak_path)
+        try:
+            self._file = open(self.path, "rb")
+        except OSError as e:
+            raise PakError(f"Can't open {self.path}: {e}")
+        try:
+            if os.fstat(self._file.fileno()).st_size < len(LSPK_SIGNATURE) + 4:
+                raise PakError(f"{self.path} is too small to be a package")
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except _READ_ERRORS as e:
+            self._file.close()
+            raise PakError(f"Can't map {self.path}: {e}")
+        except BaseException:
+            self._file.close()
+            raise
+        self._parts: Dict[int, mmap.mmap] = {}
+        self._entries: Optional[List[PakEntry]] = None
+        try:
+            self._read_header()
+        except BaseException:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for part in self._parts.values():
+            part.close()
+        self._parts.clear()
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._file.close()
+
+    def _read_header(self):
+        mm = self._mm
+        if mm[:4] != LSPK_SIGNATURE:
+            # v13 and older keep the header in a footer, not supported natively
+            raise UnsupportedPakError(f"{self.path} has no LSPK header signature")
+
+        version = struct.unpack_from("<I", mm, 4)[0]  # The constructor checked the size up to here
+        header = SUPPORTED_VERSIONS.get(version)
+        if header is None:
+            raise UnsupportedPakError(f"{self.path} uses unsupported LSPK version {version}")
+
+        fields = _unpack(header, mm, 4, self.path, "header")
+        self.version = version
+        self.file_list_offset = fields[1]
+        self.file_list_size = fields[2]
+        self.flags = fields[3]
+        self.priority = fields[4]
+        self.num_parts = fields[6] if len(fields) > 6 else 1
+
+        if self.flags & FLAG_SOLID:
+            raise UnsupportedPakError(f"{self.path} is a solid package")
+
+    def _read_file_list(self) -> List[PakEntry]:
+        mm = self._mm
+        offset = self.file_list_offset
+        num_files, compressed_size = _unpack(_FILE_LIST, mm, offset, self.path, "file list")
+        offset += _FILE_LIST.size
+        if offset + compressed_size > len(mm):
+            raise PakError(f"{self.path} has a truncated file list")
+
+        entry_struct = _ENTRY_18 if self.version >= 18 else _ENTRY_15
+        table = lz4_block_decompress(mm[offset:offset + compressed_size], entry_struct.size * num_files)
+
+        entries = []
+        if self.version >= 18:
+            for name, offset1, offset2, part, flags, size_on_disk, uncompressed in entry_struct.iter_unpack(table):
+                entries.append(PakEntry(
+                    name.split(b"\0", 1)[0].decode("utf-8", "replace"),
+                    offset1 | (offset2 << 32),
+                    size_on_disk,
+                    uncompressed,
+                    part,
+                    flags,
+                ))
+        else:
+            for name, file_offset, size_on_disk, uncompressed, part, flags, _crc, _unk in entry_struct.iter_unpack(table):
+                entries.append(PakEntry(
+                    name.split(b"\0", 1)[0].decode("utf-8", "replace"),
+                    file_offset,
+                    size_on_disk,
+                    uncompressed,
+                    part,
+                    flags,
+                ))
+        return entries
+
+    def entries(self) -> List[PakEntry]:
+        if self._entries is None:
+            try:
+                self._entries = self._read_file_list()
+            except _READ_ERRORS as e:
+                raise PakError(f"Unreadable file list in {self.path}: {e}")
+        return self._entries
+
+    def list_files(self) -> List[str]:
+        return [entry.name for entry in self.entries()]
+
+    def find(self, name: str) -> Optional[PakEntry]:
+        for entry in self.entries():
+            if entry.name == name:
+                return entry
+        return None
+
+    def find_meta_lsx(self) -> Optional[PakEntry]:
+        # Same match as Divine's "*/meta.lsx" filter, preferring Mods/<Folder>/meta.lsx
+        candidates = [entry for entry in self.entries() if entry.name.endswith("/meta.lsx")]
+        for entry in candidates:
+            parts = entry.name.split("/")
+            if len(parts) == 3 and parts[0] == "Mods":
+                return entry
+        return candidates[0] if candidates else None
+
+    def _part_map(self, part: int) -> mmap.mmap:
+        if part == 0:
+            return self._mm
+        if part not in self._parts:
+            base, ext = os.path.splitext(self.path)
+            with open(f"{base}_{part}{ext}", "rb") as f:
+                self._parts[part] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._parts[part]
+
+    def read(self, entry: PakEntry) -> bytes:
+        try:
+            return self._read(entry)
+        except _READ_ERRORS as e:
+            raise PakError(f"Unreadable {entry.name} in {self.path}: {e}")
+
+    def _read(self, entry: PakEntry) -> bytes:
+        mm = self._part_map(entry.archive_part)
+        if entry.offset + entry.size_on_disk > len(mm):
+            raise PakError(f"{entry.name} points past the end of {self.path}")
+        data = mm[entry.offset:entry.offset + entry.size_on_disk]
+
+        method = entry.method
+        if method == METHOD_NONE or entry.uncompressed_size == 0:
+            return data
+        if method == METHOD_ZLIB:
+            return zlib.decompress(data)
+        if method == METHOD_LZ4:
+            return lz4_block_decompress(data, entry.uncompressed_size)
+        if method == METHOD_ZSTD:
+            return zstd_decompress(data, entry.uncompressed_size)
+        raise UnsupportedPakError(f"{entry.name} uses unknown compression method {method}")
+
+
+def open_pak(pak_path) -> LSPKReader:
+    return LSPKReader(pak_path)
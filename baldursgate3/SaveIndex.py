@@ -0,0 +1,181 @@
+# -*- encoding: utf-8 -*-
+
+# Save game details for MO2's saves tab. A BG3 save is an LSPK package (.lsv) holding a
+# SaveInfo.json next to the actual save data, with a .webp screenshot beside it. The
+# fields shown for a save are read out of its SaveInfo.json once and kept in an index
+# keyed by the .lsv's size and mtime, stored with the instance so MO2 restarts reuse it.
+# Screenshots are decoded and scaled down on first display and kept in a small LRU.
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from .PakReader import PakError, open_pak
+from .Tracing import count, span
+
+INDEX_FILE_NAME = "bg3SaveIndex.json"
+INDEX_VERSION = 1
+
+SAVE_INFO_FILE_NAME = "SaveInfo.json"
+THUMBNAIL_SUFFIX = ".webp"
+
+# Width the screenshots are scaled down to and how many scaled ones are kept
+THUMBNAIL_WIDTH = 320
+THUMBNAIL_CACHE_SIZE = 32
+
+# (SaveInfo.json key, label), in display order
+SAVE_INFO_FIELDS = (
+    ("Save Name", "Name"),
+    ("Current Level", "Location"),
+    ("Difficulty", "Difficulty"),
+    ("Game Version", "Game version"),
+)
+
+
+def read_save_info(save_path) -> Optional[dict]: # SaveInfo.json of a save, None if the package has none
+    with open_pak(save_path) as package:
+        entry = package.find(SAVE_INFO_FILE_NAME)
+        if entry is None:
+            return None
+        return json.loads(package.read(entry).decode("utf-8-sig"))
+
+
+def party_summary(party) -> Optional[str]:
+    characters = party.get("Characters") if isinstance(party, dict) else None
+    if not isinstance(characters, list):
+        return None
+    names = []
+    for character in characters:
+        if not isinstance(character, dict):
+            continue
+        name = character.get("Origin") or character.get("Name")
+        if name:
+            level = character.get("Level")
+            names.append(f"{name} ({level})" if level else str(name))
+    return ", ".join(names) or None
+
+
+def save_metadata(save_info: dict) -> Dict[str, str]: # Labelled fields shown under the screenshot
+    metadata = {}
+    for key, label in SAVE_INFO_FIELDS:
+        value = save_info.get(key)
+        if isinstance(value, list):
+            value = ", ".join(str(item) for item in value)
+        if value not in (None, ""):
+            metadata[label] = str(value)
+    party = party_summary(save_info.get("Active Party"))
+    if party:
+        metadata["Party"] = party
+    return metadata
+
+
+def file_stamp(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class SaveIndex:
+    """Metadata of every save looked at so far, {save path: {stamp, metadata}}. Loaded from
+    index_path on first use, written back by save() when something changed."""
+
+    def __init__(self, index_path: Optional[str] = None, thumbnail_width: int = THUMBNAIL_WIDTH, thumbnail_cache_size: int = THUMBNAIL_CACHE_SIZE):
+        self.index_path = index_path
+        self.thumbnail_width = thumbnail_width
+        self.thumbnail_cache_size = thumbnail_cache_size
+        self._entries = None
+        self._dirty = False
+        self._thumbnails = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._entries is not None:
+            return
+        self._entries = {}
+        if not self.index_path:
+            return
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if isinstance(data, dict) and data.get("version") == INDEX_VERSION:
+            self._entries = data.get("saves") or {}
+
+    def metadata(self, save_path) -> Optional[Dict[str, str]]:
+        save_path = os.path.normpath(str(save_path))
+        stamp = file_stamp(save_path)
+        if stamp is None:
+            return None
+        with self._lock:
+            self._load()
+            entry = self._entries.get(save_path)
+            if entry and entry.get("stamp") == stamp:
+                count("save_index_hit")
+                return entry["metadata"]
+
+        count("save_index_miss")
+        with span("read SaveInfo.json", "saves", save=save_path):
+            try:
+                save_info = read_save_info(save_path)
+            except (OSError, ValueError, PakError):
+                save_info = None  # Being written, or not a package this reader can open
+        metadata = save_metadata(save_info) if isinstance(save_info, dict) else {}
+
+        with self._lock:
+            self._entries[save_path] = {"stamp": stamp, "metadata": metadata}
+            self._dirty = True
+        return metadata
+
+    def thumbnail(self, save_path):
+        # Decoded and scaled on first display, the few most recent ones are kept
+        image_path = os.path.splitext(str(save_path))[0] + THUMBNAIL_SUFFIX
+        stamp = file_stamp(image_path)
+        if stamp is None:
+            return None
+        key = (image_path, tuple(stamp))
+        with self._lock:
+            image = self._thumbnails.get(key)
+            if image is not None:
+                self._thumbnails.move_to_end(key)
+                count("save_thumbnail_hit")
+                return image
+
+        count("save_thumbnail_decoded")
+        from PyQt6.QtCore import Qt
+        from PyQt6.QtGui import QImage
+        with span("decode save thumbnail", "saves", image=image_path):
+            image = QImage(image_path)
+            if image.isNull():
+                return None
+            if image.width() > self.thumbnail_width:
+                image = image.scaledToWidth(self.thumbnail_width, Qt.TransformationMode.SmoothTransformation)
+
+        with self._lock:
+            self._thumbnails[key] = image
+            self._thumbnails.move_to_end(key)
+            while len(self._thumbnails) > self.thumbnail_cache_size:
+                self._thumbnails.popitem(last=False)
+        return image
+
+    def save(self):
+        # Entries of deleted saves are dropped on the way out
+        with self._lock:
+            if not self._dirty or not self.index_path or self._entries is None:
+                return
+            entries = {path: entry for path, entry in self._entries.items() if os.path.exists(path)}
+            self._entries = entries
+            self._dirty = False
+
+        temp_path = self.index_path + ".tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": INDEX_VERSION, "saves": entries}, f, separators=(",", ":"))
+            os.replace(temp_path, self.index_path)
+        except OSError:
+            with self._lock:
+                self._dirty = True
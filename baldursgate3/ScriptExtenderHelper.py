@@ -0,0 +1,99 @@
+# -*- encoding: utf-8 -*-
+
+# Script Extender config handling. Mods keep their SE configs in <mod>/SE_CONFIG,
+# which is mapped into %LOCALAPPDATA%/Larian Studios/Baldur's Gate 3/Script Extender.
+
+import os
+import shutil
+import hashlib
+
+from .MappingHelper import FolderMappingCache
+
+SE_CONFIG_FOLDER = "SE_CONFIG"
+
+
+class SEConfigMappingCache(FolderMappingCache):
+    """SE_CONFIG of every enabled mod, mapped into the Script Extender folder."""
+
+    counter = "se_config_mappings"
+
+    def mappings(self, mod_paths, destination):
+        return super().mappings([os.path.join(mod_path, SE_CONFIG_FOLDER) for mod_path in mod_paths], destination)
+
+
+def file_digest(path) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def same_file_contents(source_stat, source_path, destination_path) -> bool:
+    try:
+        destination_stat = os.stat(destination_path)
+    except OSError:
+        return False
+    if source_stat.st_size != destination_stat.st_size:
+        return False
+    if source_stat.st_mtime_ns == destination_stat.st_mtime_ns:
+        return True
+    return file_digest(source_path) == file_digest(destination_path)
+
+
+def tree_size(path):
+    files = 0
+    size = 0
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                sub_files, sub_size = tree_size(entry.path)
+                files += sub_files
+                size += sub_size
+            else:
+                files += 1
+                size += entry.stat(follow_symlinks=False).st_size
+    return files, size
+
+
+def move_path(source, destination):
+    try:
+        os.replace(source, destination)  # Plain rename on the same volume
+    except OSError:
+        shutil.move(source, destination)
+
+
+def sync_se_config(source_dir, destination_dir, stats=None) -> dict:
+    """Move the Script Extender folder's contents into destination_dir, keeping the layout.
+    Directories missing from the destination are renamed over whole, files are only moved
+    when new or changed, unchanged ones are just deleted from the source."""
+    if stats is None:
+        stats = {"files": 0, "bytes": 0, "unchanged": 0}
+
+    os.makedirs(destination_dir, exist_ok=True)
+    with os.scandir(source_dir) as it:
+        entries = list(it)
+
+    for entry in entries:
+        destination = os.path.join(destination_dir, entry.name)
+
+        if entry.is_dir(follow_symlinks=False):
+            if not os.path.exists(destination):
+                files, size = tree_size(entry.path)
+                move_path(entry.path, destination)
+                stats["files"] += files
+                stats["bytes"] += size
+            else:
+                sync_se_config(entry.path, destination, stats)
+                os.rmdir(entry.path)
+        else:
+            entry_stat = entry.stat(follow_symlinks=False)
+            if same_file_contents(entry_stat, entry.path, destination):
+                os.remove(entry.path)
+                stats["unchanged"] += 1
+            else:
+                move_path(entry.path, destination)
+                stats["files"] += 1
+                stats["bytes"] += entry_stat.st_size
+
+    return stats
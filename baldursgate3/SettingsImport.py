@@ -0,0 +1,145 @@
+# -*- encoding: utf-8 -*-
+
+# Import of a modsettings.lsx written by another tool (BG3 Mod Manager...) into the
+# profile's mod priorities. Module UUIDs are resolved to MO2 mods through the pak cache's
+# UUID index, nothing is scanned. Only the mods found in the file move, they swap among
+# the priorities they already hold, so separators and unlisted mods keep their place.
+
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Optional, Tuple
+
+import mobase  # type: ignore
+from PyQt6.QtCore import qDebug
+
+from .LoadOrder import BASE_GAME_FOLDERS
+from .PakCache import ModsCache
+from .Tracing import span
+
+
+def read_modsettings_modules(path) -> List[Tuple[str, str]]:
+    """(UUID, Folder) of every module in load order. Mods/ModuleShortDesc is the order the
+    game uses, ModOrder/Module (UUID only) is read for files of older game versions. Raises
+    ValueError for an XML file with neither list."""
+    mods = []
+    mod_order = []
+    has_module_list = False
+    attributes = {}
+    for event, element in ET.iterparse(path, events=("end",)):
+        if element.tag == "attribute":
+            attributes[element.get("id")] = element.get("value")
+        elif element.tag == "node":
+            node_id = element.get("id")
+            if node_id == "ModuleShortDesc" and attributes.get("UUID"):
+                mods.append((attributes["UUID"], attributes.get("Folder")))
+            elif node_id == "Module" and attributes.get("UUID"):
+                mod_order.append((attributes["UUID"], None))
+            elif node_id in ("Mods", "ModOrder"):
+                has_module_list = True
+            attributes = {}
+            element.clear()
+    if not has_module_list:
+        raise ValueError(f"no Mods or ModOrder node in {path}, not a modsettings.lsx")
+    return mods or mod_order
+
+
+def resolve_modules(modsCache: ModsCache, modules, modSequence, modStates: Dict[str, int]):
+    """(mods in the file's order, [(UUID, Folder) of modules no mod provides]). A mod with
+    several modules takes the place of its first one. When several mods ship the same
+    module, the enabled one with the highest priority is the one the game would load."""
+    position = {mod: index for index, mod in enumerate(modSequence)}
+    ordered = []
+    placed = set()
+    unresolved = []
+    for uuid, folder in modules:
+        candidates = [mod for mod in modsCache.uuid_mods(uuid) if mod in position]
+        if not candidates:
+            if folder not in BASE_GAME_FOLDERS:
+                unresolved.append((uuid, folder))
+            continue
+        mod = max(candidates, key=lambda candidate: (int(modStates[candidate] / 2) % 2 != 0, position[candidate]))
+        if mod not in placed:
+            placed.add(mod)
+            ordered.append(mod)
+    return ordered, unresolved
+
+
+def priority_moves(modSequence, ordered) -> List[Tuple[str, int]]:
+    """(mod, new priority) calls that put the ordered mods in that order within the
+    priorities they hold now. Mods already in order (longest increasing run) stay put,
+    every other one is inserted right after its predecessor in the new order."""
+    position = {mod: index for index, mod in enumerate(modSequence)}
+    slots = sorted(position[mod] for mod in ordered)
+    final = list(modSequence)
+    for slot, mod in zip(slots, ordered):
+        final[slot] = mod
+    rank = {mod: index for index, mod in enumerate(final)}
+
+    # Longest increasing subsequence of the current order by final rank (patience sorting)
+    current = list(modSequence)
+    tails = []
+    tail_index = []
+    previous = [-1] * len(current)
+    for index, mod in enumerate(current):
+        low, high = 0, len(tails)
+        while low < high:
+            middle = (low + high) // 2
+            if tails[middle] < rank[mod]:
+                low = middle + 1
+            else:
+                high = middle
+        if low == len(tails):
+            tails.append(rank[mod])
+            tail_index.append(index)
+        else:
+            tails[low] = rank[mod]
+            tail_index[low] = index
+        previous[index] = tail_index[low - 1] if low else -1
+    fixed = set()
+    index = tail_index[-1] if tail_index else -1
+    while index >= 0:
+        fixed.add(current[index])
+        index = previous[index]
+
+    moves = []
+    for final_index, mod in enumerate(final):
+        if mod in fixed:
+            continue
+        current.remove(mod)
+        priority = current.index(final[final_index - 1]) + 1 if final_index else 0
+        current.insert(priority, mod)
+        moves.append((mod, priority))
+    return moves
+
+
+def import_modsettings(modList: mobase.IModList, profile: mobase.IProfile, path) -> Optional[dict]:
+    """Reorder the profile's mods after the modsettings.lsx at path. Returns counts and the
+    modules that couldn't be matched, for the log, or None when the file can't be read."""
+    with span("read modsettings.lsx", path=str(path)):
+        try:
+            modules = read_modsettings_modules(path)
+        except ET.ParseError as e:
+            qDebug(f"BG3 modsettings import: {path} is not valid XML ({e})")
+            return None
+        except (OSError, ValueError) as e:
+            qDebug(f"BG3 modsettings import: {e}")
+            return None
+
+    modSequence = modList.allModsByProfilePriority()
+    modStates = {mod: modList.state(mod) for mod in modSequence}
+    with span("resolve modules", modules=len(modules)):
+        modsCache = ModsCache(profile.absolutePath())
+        ordered, unresolved = resolve_modules(modsCache, modules, modSequence, modStates)
+
+    with span("plan priorities", mods=len(ordered)):
+        moves = priority_moves(modSequence, ordered)
+    with span("set priorities", moves=len(moves)):
+        for mod, priority in moves:
+            modList.setPriority(mod, priority)
+
+    return {
+        "modules": len(modules),
+        "mods": len(ordered),
+        "moved": len(moves),
+        "disabled": [mod for mod in ordered if int(modStates[mod] / 2) % 2 == 0],
+        "unresolved": unresolved,
+    }
@@ -0,0 +1,153 @@
+# -*- encoding: utf-8 -*-
+
+# Timing spans for the plugin hooks, exported in the Chrome trace event format
+# (open the files with chrome://tracing or https://ui.perfetto.dev). Tracing is off
+# unless the trace_hooks plugin setting is enabled, spans are then close to free.
+
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+TRACE_FOLDER = "bg3_traces"
+
+
+class Span:
+    __slots__ = ("start", "duration")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.duration = 0.0
+
+
+class Tracer:
+    """Collects spans and counters from every thread while at least one hook trace is open."""
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._active = 0
+        self._origin = time.perf_counter()
+        self._events = []
+        self._counters = {}
+        self._pak_scans = {}
+
+    def _reset(self):
+        self._origin = time.perf_counter()
+        self._events = []
+        self._counters = {}
+        self._pak_scans = {}
+
+    def _timestamp(self, seconds) -> float: # Microseconds since the first open trace
+        return round((seconds - self._origin) * 1_000_000, 3)
+
+    @contextmanager
+    def span(self, name: str, category: str = "plugin", **args):
+        span = Span()
+        try:
+            yield span
+        finally:
+            span.duration = time.perf_counter() - span.start
+            if self.enabled:
+                event = {
+                    "name": name,
+                    "cat": category,
+                    "ph": "X",
+                    "pid": os.getpid(),
+                    "tid": threading.get_ident(),
+                    "ts": self._timestamp(span.start),
+                    "dur": round(span.duration * 1_000_000, 3),
+                }
+                if args:
+                    event["args"] = args
+                with self._lock:
+                    if self._active:
+                        self._events.append(event)
+
+    def count(self, counter: str, value: int = 1):
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._active:
+                self._counters[counter] = self._counters.get(counter, 0) + value
+
+    def pak_scanned(self, key: str, seconds: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._active:
+                self._pak_scans[key] = round(seconds * 1000, 3)
+
+    def _open(self) -> int:
+        with self._lock:
+            if not self._active:
+                self._reset()
+            self._active += 1
+            return len(self._events)
+
+    def _close(self, first_event: int) -> dict:
+        with self._lock:
+            self._active -= 1
+            events = list(self._events[first_event:])
+            counters = dict(self._counters)
+            pak_scans = dict(self._pak_scans)
+
+        now = self._timestamp(time.perf_counter())
+        for counter, value in sorted(counters.items()):
+            events.append({"name": counter, "cat": "counter", "ph": "C", "pid": os.getpid(), "ts": now, "args": {counter: value}})
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {
+                "counters": counters,
+                "pakScanMs": pak_scans,
+            },
+        }
+
+    @contextmanager
+    def collect(self):
+        # Counters and pak scan times of everything run inside, handed back instead of written to a file
+        enabled, self.enabled = self.enabled, True
+        first_event = self._open()
+        collected = {}
+        try:
+            yield collected
+        finally:
+            collected.update(self._close(first_event)["otherData"])
+            self.enabled = enabled
+
+    @contextmanager
+    def hook(self, name: str, profile_path: str, **args):
+        # Span for a whole plugin hook, written to <profile>/bg3_traces/<hook>.json when it ends
+        if not self.enabled:
+            yield
+            return
+
+        first_event = self._open()
+        try:
+            with self.span(name, "hook", **args):
+                yield
+        finally:
+            trace = self._close(first_event)
+            try:
+                write_trace(trace, trace_path(profile_path, name))
+            except OSError:
+                pass  # Never fail a hook because the trace couldn't be written
+
+
+def trace_path(profile_path: str, hook: str) -> str:
+    return os.path.join(profile_path, TRACE_FOLDER, f"{hook}.json")
+
+
+def write_trace(trace: dict, path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", 'w') as file:
+        json.dump(trace, file)
+    os.replace(path + ".tmp", path)
+
+
+# Shared by the plugin and the helper modules
+tracer = Tracer()
+span = tracer.span
+count = tracer.count
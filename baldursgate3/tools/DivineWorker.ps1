@@ -0,0 +1,90 @@
+# Long-lived LSLib host for the BG3 plugin, see DivineWorker.py for the protocol.
+# Runs in PowerShell 7 (LSLib targets .NET 8): loads LSLib.dll once, then answers
+# list-package / extract-package requests read from stdin, one JSON object per line,
+# until stdin is closed.
+#
+#   pwsh -NoProfile -File DivineWorker.ps1 <folder holding LSLib.dll>
+
+param([string]$ToolsDir = $PSScriptRoot)
+
+$ErrorActionPreference = "Stop"
+[Console]::InputEncoding = [System.Text.Encoding]::UTF8
+[Console]::OutputEncoding = [System.Text.UTF8Encoding]::new($false)
+
+function Send($message) {
+    [Console]::Out.WriteLine(($message | ConvertTo-Json -Compress -Depth 4))
+    [Console]::Out.Flush()
+}
+
+# LSLib's managed dependencies sit next to it, native ones (LSLibNative, granny2) are loaded by LSLib itself
+foreach ($dll in @("Newtonsoft.Json", "System.IO.Hashing", "ZstdSharp", "LZ4", "LZ4pn", "OpenTK.Mathematics", "LSLib")) {
+    $path = Join-Path $ToolsDir "$dll.dll"
+    if (Test-Path $path) {
+        Add-Type -Path $path
+    }
+}
+
+function Read-Package([string]$source) {
+    # LSLib 1.19+ reads through PackageReader.Read(path), older builds took the path in the constructor
+    $reader = [LSLib.LS.PackageReader]::new()
+    if ($reader.GetType().GetMethod("Read", [type[]]@([string], [bool]))) {
+        return $reader.Read($source, $false)
+    }
+    return [LSLib.LS.PackageReader]::new($source).Read()
+}
+
+function Close-Package($package) {
+    if ($package -is [System.IDisposable]) {
+        $package.Dispose()
+    }
+}
+
+function Invoke-List($request) {
+    $package = Read-Package $request.source
+    try {
+        $files = @($package.Files | ForEach-Object { $_.Name.Replace("\", "/") })
+    }
+    finally {
+        Close-Package $package
+    }
+    return @{ ok = $true; files = $files }
+}
+
+function Invoke-Extract($request) {
+    $expression = $request.expression
+    # Same matching as Divine's -x: a wildcard on the path inside the pak
+    $filter = { param($file) -not $expression -or ($file.Name.Replace("\", "/") -like $expression) }.GetNewClosure()
+    [LSLib.LS.Packager]::new().UncompressPackage([string]$request.source, [string]$request.destination, $filter)
+    return @{ ok = $true }
+}
+
+Send @{ ready = $true; protocol = 1 }
+
+while ($null -ne ($line = [Console]::In.ReadLine())) {
+    if (-not $line.Trim()) {
+        continue
+    }
+    $request = $line | ConvertFrom-Json
+    try {
+        switch ($request.action) {
+            "list-package" { $response = Invoke-List $request }
+            "extract-package" { $response = Invoke-Extract $request }
+            default { $response = @{ ok = $false; kind = "worker"; error = "Unsupported action $($request.action)" } }
+        }
+    }
+    catch {
+        # Only errors LSLib raises for a damaged or foreign file condemn the pak, anything else
+        # (API mismatch, filter, host) is the worker's, the plugin then runs Divine.exe for the pak
+        $exception = $_.Exception
+        while ($exception -is [System.Management.Automation.MethodInvocationException] -and $exception.InnerException) {
+            $exception = $exception.InnerException
+        }
+        $kind = "worker"
+        if ($exception -is [System.IO.InvalidDataException] -or $exception -is [System.IO.EndOfStreamException] -or $exception.GetType().Name -eq "NotAPackageException") {
+            $kind = "pak"
+        }
+        $response = @{ ok = $false; kind = $kind; error = $exception.Message }
+    }
+    $response.id = $request.id
+    Send $response
+}
@@ -0,0 +1,45 @@
+# -*- encoding: utf-8 -*-
+
+# Makes the plugin importable outside of Mod Organizer 2: puts the repository root on
+# sys.path (so "baldursgate3" imports as a package) and falls back to the stand-in
+# mobase/PyQt6 modules in benchmarks/shims when the real ones aren't installed.
+
+import importlib
+import os
+import sys
+import types
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+try:
+    import mobase  # type: ignore # noqa: F401
+except ImportError:
+    sys.path.insert(0, os.path.join(BENCH_DIR, "shims"))
+
+
+def install_basic_games():
+    # game_baldursgate3.py normally lives in basic_games/games and imports ..basic_game and
+    # ..basic_features, so the repository root plays basic_games.games on top of the shims
+    if "basic_games" in sys.modules:
+        return
+    shims = os.path.join(BENCH_DIR, "shims")
+    sys.path.insert(0, shims)
+    try:
+        importlib.import_module("basic_games")
+        importlib.import_module("basic_games.basic_game")
+        importlib.import_module("basic_games.basic_features")
+    finally:
+        sys.path.remove(shims)
+
+    games = types.ModuleType("basic_games.games")
+    games.__path__ = [REPO_ROOT]
+    sys.modules["basic_games.games"] = games
+
+
+def load_game_plugin():
+    install_basic_games()
+    return importlib.import_module("basic_games.games.game_baldursgate3")
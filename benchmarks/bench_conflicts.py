@@ -0,0 +1,65 @@
+# -*- encoding: utf-8 -*-
+
+# Conflict index queries on a large synthetic library where every Nth pak overrides the
+# same Public/Game files. The index is filled by the regular scan, then queried and
+# updated as a mod is removed and installed again.
+#
+#   python benchmarks/bench_conflicts.py --mods 800 --files-per-pak 50
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import _bootstrap  # noqa: F401
+from mock_organizer import MockModList, MockProfile
+from synthetic_paks import build_library
+
+from baldursgate3 import ConflictIndex, ModSettingsHelper
+
+
+def timed(label, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    print(f"{label:>34}: {(time.perf_counter() - start) * 1000:9.1f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the cross-mod pak conflict index")
+    parser.add_argument("--mods", type=int, default=800)
+    parser.add_argument("--files-per-pak", type=int, default=50)
+    parser.add_argument("--override-every", type=int, default=4)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="bg3_bench_")
+    try:
+        names = build_library(root, args.mods, 1, args.files_per_pak, args.override_every)
+        mod_list = MockModList(os.path.join(root, "mods"), names)
+        profile = MockProfile(os.path.join(root, "profile"))
+        profile_path = profile.absolutePath()
+
+        timed(f"scan + index {len(names)} paks", ModSettingsHelper.modsInstalled, mod_list, profile, names)
+
+        report = timed("conflict report (load order)", ConflictIndex.conflict_report, profile_path, names)
+        found = timed("conflicts (all mods)", ConflictIndex.conflicts, profile_path)
+        below = timed("providers of Public/Game/", ConflictIndex.providers, profile_path, "Public/Game/")
+        single = timed("providers of one file", ConflictIndex.providers, profile_path, "Public/Game/Stats/Generated/Data/Data_0.txt")
+        print(f"{len(found)} conflicting paths, {len(report) - len(found)} report groups, "
+              f"{len(below)} files below Public/Game/, {len(next(iter(single.values()), []))} providers of Data_0.txt")
+
+        overriding = [name for index, name in enumerate(names) if index % args.override_every == args.override_every - 1]
+        if overriding:
+            removed = overriding[0]
+            timed(f"remove {removed}", ModSettingsHelper.modRemoved, mod_list, profile, removed)
+            after = ConflictIndex.conflicts(profile_path)
+            assert all(removed not in [mod for mod, _ in owners] for owners in after.values())
+            timed(f"install {removed} again", ModSettingsHelper.modInstalled, mod_list, profile, removed)
+            assert ConflictIndex.conflicts(profile_path) == found, "index differs after reinstalling"
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
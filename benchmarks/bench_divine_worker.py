@@ -0,0 +1,110 @@
+# -*- encoding: utf-8 -*-
+
+# Divine.exe per call against the long-lived Divine worker, both played by fake_divine.py
+# with a startup delay standing in for the .NET runtime start. Checks that both give the
+# same mod infos, that a worker crashing every few requests is restarted without losing a
+# pak, that a worker failing every request (an LSLib API it doesn't match) hands each pak
+# to Divine.exe instead of reporting it unreadable, and that a worker that can't start
+# falls back to one Divine run per call.
+#
+#   python benchmarks/bench_divine_worker.py --paks 40 --divine-delay-ms 200
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import _bootstrap  # noqa: F401
+from harness import FakeDivine, SubprocessCounter
+from synthetic_paks import mod_uuid, write_mod_pak
+
+from baldursgate3 import ModSettingsHelper
+
+
+def scan(paks, work_dir, workers):
+    def extract(index):
+        return ModSettingsHelper.extract_meta_lsx(paks[index], os.path.join(work_dir, str(index)), in_memory=False)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(extract, range(len(paks))))
+
+
+def run(label, paks, work_dir, workers, counter):
+    started = counter.count
+    start = time.perf_counter()
+    results = scan(paks, work_dir, workers)
+    elapsed = time.perf_counter() - start
+    processes = counter.count - started
+    print(f"{label:>28}: {elapsed * 1000:9.1f} ms, {processes:4} processes, {elapsed * 1000 / len(paks):7.1f} ms/pak")
+    return results, processes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per call Divine runs with the Divine worker")
+    parser.add_argument("--paks", type=int, default=40)
+    parser.add_argument("--files-per-pak", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=ModSettingsHelper.DIVINE_WORKERS)
+    parser.add_argument("--divine-delay-ms", type=int, default=200)
+    parser.add_argument("--crash-every", type=int, default=7)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="bg3_bench_")
+    fake_divine = FakeDivine(os.path.join(root, "divine.log"), args.divine_delay_ms)
+    counter = SubprocessCounter()
+    counter.install()
+    try:
+        paks = []
+        for i in range(args.paks):
+            path = os.path.join(root, f"Mod{i}.pak")
+            write_mod_pak(path, f"Mod{i}", mod_uuid(i), extra_files=args.files_per_pak)
+            paks.append(path)
+
+        fake_divine.install(ModSettingsHelper)
+        per_call, _ = run("Divine per call", paks, os.path.join(root, "per_call"), args.workers, counter)
+
+        fake_divine.install(ModSettingsHelper, worker=True)
+        pooled, processes = run("Divine worker", paks, os.path.join(root, "worker"), args.workers, counter)
+        assert pooled == per_call, "worker results differ from per call Divine"
+        assert processes <= args.workers, f"{processes} workers started for a pool of {args.workers}"
+
+        # Every Nth request kills the worker, each one must be restarted and the request answered
+        os.environ["BG3_FAKE_DIVINE_CRASH_EVERY"] = str(args.crash_every)
+        try:
+            fake_divine.install(ModSettingsHelper, worker=True)
+            pool = ModSettingsHelper.divine_workers()
+            crashed, _ = run(f"worker crashing every {args.crash_every}", paks, os.path.join(root, "crash"), args.workers, counter)
+            restarts = pool.restarts
+        finally:
+            del os.environ["BG3_FAKE_DIVINE_CRASH_EVERY"]
+        print(f"{restarts} worker restarts")
+        assert crashed == per_call, "results lost to worker crashes"
+        assert restarts > 0, "crashing worker was never restarted"
+
+        # Worker errors aren't the pak's: every pak still gets its mod info, from Divine.exe
+        os.environ["BG3_FAKE_DIVINE_WORKER_ERROR"] = "1"
+        try:
+            fake_divine.install(ModSettingsHelper, worker=True)
+            failing, processes = run("worker failing every request", paks, os.path.join(root, "worker_error"), args.workers, counter)
+        finally:
+            del os.environ["BG3_FAKE_DIVINE_WORKER_ERROR"]
+        assert failing == per_call, "worker errors cached as unreadable paks"
+        assert processes > len(paks), "worker errors weren't handed to Divine.exe"
+
+        # A worker that can't start is given up on once, the rest runs Divine per call
+        fake_divine.install(ModSettingsHelper)
+        ModSettingsHelper.divine_worker_command = [sys.executable, "-c", "print('not a worker')"]
+        fallback, _ = run("worker unavailable", paks, os.path.join(root, "fallback"), args.workers, counter)
+        assert fallback == per_call, "fallback results differ from per call Divine"
+        assert ModSettingsHelper.divine_workers() is None, "worker pool still enabled after a failed start"
+    finally:
+        counter.uninstall()
+        ModSettingsHelper.close_divine_workers()
+        ModSettingsHelper.divine_worker_command = None
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# -*- encoding: utf-8 -*-
+
+# The headless entry point against the plugin. Both build their pak cache from nothing on
+# the same synthetic library: the plugin through onAboutToRun with the mock organizer,
+# baldursgate3.Headless as a separate process without mobase or PyQt6, reading the
+# profile's modlist.txt. Their modsettings.lsx must be byte for byte the same. The
+# headless scan is run with one worker and with the default pool for the throughput. A
+# junk .pak must not stop a run, with or without --divine, where Divine.exe can't start.
+#
+#   python benchmarks/bench_headless.py --mods 300 --files-per-pak 200
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import _bootstrap
+
+ROOT = tempfile.mkdtemp(prefix="bg3_bench_")
+os.environ["LOCALAPPDATA"] = os.path.join(ROOT, "localappdata")
+
+game = _bootstrap.load_game_plugin()
+
+from mock_organizer import MockModList, MockOrganizer, MockProfile  # noqa: E402
+from synthetic_paks import build_library  # noqa: E402
+
+
+def write_modlist(path, mod_list):
+    # MO2's format: highest priority first, + enabled, - disabled
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("# This file was automatically generated by Mod Organizer.\n")
+        for mod in reversed(mod_list.allModsByProfilePriority()):
+            f.write(f"{'-' if mod in mod_list.disabled else '+'}{mod}\n")
+        f.write("*DLC: Unmanaged entries are skipped\n")
+
+
+def run_headless(mods_path, modlist_path, output_path, cache_path, workers, *extra):
+    stats_path = os.path.join(ROOT, f"headless_{workers}.json")
+    subprocess.run(
+        [
+            sys.executable, "-m", "baldursgate3.Headless",
+            "--mods", mods_path, "--modlist", modlist_path, "--output", output_path,
+            "--cache", cache_path, "--workers", str(workers), "--json", stats_path, *extra,
+        ],
+        cwd=_bootstrap.REPO_ROOT,  # The folder holding baldursgate3, without the benchmark shims
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+    with open(stats_path) as f:
+        return json.load(f)
+
+
+def check_junk_pak():
+    # Divine.exe can't start off Windows. A --divine run then scans nothing, and must not cache
+    # placeholders either: the in-memory run after it, on the same cache, scans the good paks
+    # and writes their modules. The junk pak is rejected natively and stays uncached.
+    junk_root = os.path.join(ROOT, "junk")
+    names = build_library(junk_root, 3, files_per_pak=2)
+    mods_path = os.path.join(junk_root, "mods")
+    os.makedirs(os.path.join(mods_path, "JunkMod", "PAK_FILES"))
+    with open(os.path.join(mods_path, "JunkMod", "PAK_FILES", "Junk.pak"), "wb") as f:
+        f.write(os.urandom(4096))
+    mod_list = MockModList(mods_path, names + ["JunkMod"])
+    modlist_path = os.path.join(junk_root, "modlist.txt")
+    write_modlist(modlist_path, mod_list)
+    cache_path = os.path.join(junk_root, "cache")
+    for extra in (("--divine",), ()):
+        label = " ".join(extra) or "in memory"
+        output_path = os.path.join(junk_root, label, "modsettings.lsx")
+        stats = run_headless(mods_path, modlist_path, output_path, cache_path, 1, *extra)
+        assert stats["paks"] == len(names) + 1 and os.path.isfile(output_path), f"{label}: junk pak stopped the run"
+        assert stats["cached"] == 0, f"{label}: {stats['cached']} paks cached by a run Divine.exe couldn't do"
+    assert stats["scanned"] == len(names), f"in memory: {stats['scanned']} paks scanned after the --divine run"
+    with open(output_path, "r", encoding="utf-8") as f:
+        written = f.read()
+    assert all(name in written for name in names), "mods missing from modsettings.lsx after the --divine run"
+    print("junk pak, --divine then in memory on one cache: nothing cached without Divine.exe, mods written")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the headless modsettings.lsx build with the plugin's")
+    parser.add_argument("--mods", type=int, default=300)
+    parser.add_argument("--paks-per-mod", type=int, default=1)
+    parser.add_argument("--files-per-pak", type=int, default=200)
+    parser.add_argument("--override-every", type=int, default=10)
+    parser.add_argument("--disabled-every", type=int, default=7)
+    parser.add_argument("--workers", type=int, default=0, help="pool size of the parallel headless run (0 = one per CPU core)")
+    args = parser.parse_args()
+
+    try:
+        names = build_library(ROOT, args.mods, args.paks_per_mod, args.files_per_pak, args.override_every)
+        mods_path = os.path.join(ROOT, "mods")
+        disabled = names[::args.disabled_every] if args.disabled_every else []
+        mod_list = MockModList(mods_path, names, disabled=disabled)
+
+        # In MO2
+        profile_path = os.path.join(ROOT, "profile")
+        overwrite_path = os.path.join(ROOT, "overwrite")
+        os.makedirs(overwrite_path, exist_ok=True)
+        organizer = MockOrganizer(mod_list, MockProfile(profile_path), overwrite_path, settings={"in_memory_extraction": True})
+        plugin = game.BaldursGate3Game()
+        plugin.init(organizer)
+        plugin.onAboutToRun("bin/bg3.exe")
+        with open(os.path.join(profile_path, "modsettings.lsx"), "rb") as f:
+            expected = f.read()
+
+        # Headless, from the profile's modlist.txt
+        modlist_path = os.path.join(profile_path, "modlist.txt")
+        write_modlist(modlist_path, mod_list)
+        print(f"{'workers':>8}{'paks':>8}{'scanned':>9}{'MB':>8}{'wall ms':>10}{'paks/s':>9}{'MB/s':>8}")
+        for workers in (1, args.workers):
+            output_path = os.path.join(ROOT, f"headless_{workers}", "modsettings.lsx")
+            stats = run_headless(mods_path, modlist_path, output_path, os.path.join(ROOT, f"cache_{workers}"), workers)
+            print(
+                f"{workers or os.cpu_count():>8}{stats['paks']:>8}{stats['scanned']:>9}{stats['scanned_bytes'] / 1e6:>8.1f}"
+                f"{stats['wall_ms']:>10.1f}{stats['paks_per_second']:>9.1f}{stats['mb_per_second']:>8.1f}"
+            )
+            with open(output_path, "rb") as f:
+                assert f.read() == expected, f"headless modsettings.lsx ({workers} workers) differs from the plugin's"
+
+        # A second run finds everything cached and leaves the file alone
+        stats = run_headless(mods_path, modlist_path, output_path, os.path.join(ROOT, f"cache_{args.workers}"), args.workers)
+        assert stats["scanned"] == 0 and not stats["written"], "warm headless run rescanned or rewrote"
+        print(f"warm run: {stats['cached']} paks cached, {stats['wall_ms']:.1f} ms")
+
+        check_junk_pak()
+    finally:
+        shutil.rmtree(ROOT, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
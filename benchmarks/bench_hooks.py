@@ -0,0 +1,233 @@
+# -*- encoding: utf-8 -*-
+
+# Runs the plugin's hot paths against a synthetic library of N mods x M paks with the
+# mock organizer, and reports wall time, subprocesses, bytes written and peak memory
+# for each hook. --divine turns in-memory extraction off so pak scans go through
+# fake_divine.py the way they go through Divine.exe in MO2.
+#
+#   python benchmarks/bench_hooks.py --mods 200 --paks-per-mod 2
+#   python benchmarks/bench_hooks.py --mods 50 --divine --json hooks.json
+#   python benchmarks/bench_hooks.py --mods 50 --divine --divine-worker --divine-delay-ms 300
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+
+import _bootstrap
+
+ROOT = tempfile.mkdtemp(prefix="bg3_bench_")
+# The plugin builds its Larian paths from %LOCALAPPDATA%, keep them inside ROOT
+os.environ["LOCALAPPDATA"] = os.path.join(ROOT, "localappdata")
+
+game = _bootstrap.load_game_plugin()
+# The helper modules as the plugin imported them (basic_games.games.baldursgate3.*)
+ModSettingsHelper = game.ModSettingsHelper
+PakCache = game.PakCache
+
+import mobase  # type: ignore # noqa: E402
+from bench_mod_data_checker import patch_bundle  # noqa: E402
+from harness import FakeDivine, Harness  # noqa: E402
+from mock_organizer import MockMod, MockModList, MockOrganizer, MockProfile  # noqa: E402
+from synthetic_paks import build_library  # noqa: E402
+
+
+def add_se_configs(mods_path, names, every, files):
+    for index, name in enumerate(names):
+        if every and index % every == 0:
+            folder = os.path.join(mods_path, name, "SE_CONFIG", name)
+            os.makedirs(folder, exist_ok=True)
+            for f in range(files):
+                with open(os.path.join(folder, f"config_{f}.json"), "w") as config:
+                    json.dump({"Mod": name, "Value": f}, config)
+
+
+def fill_script_extender_folder(se_dir, files):
+    # What a game session leaves behind: logs plus per mod config folders
+    shutil.rmtree(se_dir, ignore_errors=True)
+    for f in range(files):
+        folder = os.path.join(se_dir, f"Mod{f % 20:02d}")
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, f"settings_{f}.json"), "w") as config:
+            config.write(json.dumps({"Setting": f, "Values": list(range(32))}))
+
+
+def reset_profile(profile_path):
+    for name in os.listdir(profile_path):
+        if name.startswith("modsettings"):
+            os.remove(os.path.join(profile_path, name))
+    # The pak cache is shared by the instance (ROOT, see MockOrganizer.basePath)
+    for name in os.listdir(ROOT):
+        if name.startswith(PakCache.STORE_FILE_NAME):
+            os.remove(os.path.join(ROOT, name))
+
+
+def check_removed_during_warmup(plugin, cache_warmup, profile_path, mod_paths, cold_cache):
+    # Mods removed while the warm-up runs, one in the batch being scanned and one further
+    # down: the warm-up must finish and leave no cache rows for either of them
+    cold_cache()
+    scan_paks = cache_warmup.scan_paks
+    removed = []
+
+    def scan_and_remove(*args, **kwargs):
+        if not removed:
+            for mod_path in mod_paths:
+                shutil.rmtree(mod_path)
+                plugin.onModRemoved(os.path.basename(mod_path))
+                removed.append(os.path.basename(mod_path))
+        return scan_paks(*args, **kwargs)
+
+    cache_warmup.scan_paks = scan_and_remove
+    try:
+        plugin.onUserInterfaceLoad(None)
+        plugin._warmup.wait()
+    finally:
+        cache_warmup.scan_paks = scan_paks
+    assert plugin._warmup.error is None, f"warm-up failed on removed mods: {plugin._warmup.error}"
+    cache = PakCache.ModsCache(profile_path)
+    assert not any(cache.mod_paks(mod) for mod in removed), "warm-up wrote back rows of removed mods"
+    print(f"warm-up with {len(removed)} mods removed mid-run: finished, no rows written for them")
+
+
+def check_without_localappdata(plugin, organizer):
+    # Without LOCALAPPDATA nothing may be mapped, created or looked up relative to MO2's working directory
+    local_app_data = os.environ.pop("LOCALAPPDATA")
+    cwd = os.getcwd()
+    work_dir = os.path.join(ROOT, "mo2_cwd")
+    os.makedirs(work_dir)
+    os.chdir(work_dir)
+    try:
+        plugin._pakFileMappings = None
+        plugin._seConfigMappings = None
+        mappings = plugin.mappings()
+        assert plugin.onFinishedRun("bin/bg3.exe", 0)
+
+        fresh = game.BaldursGate3Game()
+        fresh.setGamePath(os.path.join(ROOT, "game"))
+        fresh.init(organizer)
+        directories = {name: getattr(fresh, name)().path() for name in ("documentsDirectory", "savesDirectory")}
+        save_features = [type(feature).__name__ for feature in fresh._features if "Save" in type(feature).__name__]
+    finally:
+        os.chdir(cwd)
+        os.environ["LOCALAPPDATA"] = local_app_data
+    assert mappings == [], f"{len(mappings)} mappings without LOCALAPPDATA"
+    assert not os.listdir(work_dir), f"created {os.listdir(work_dir)} in the working directory"
+    assert all(path and os.path.isabs(path) for path in directories.values()), f"relative directories: {directories}"
+    assert not save_features, f"{save_features} registered without a saves folder"
+    print("LOCALAPPDATA unset: no mappings or save features, nothing created in or pointing at the working directory")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the BG3 plugin hooks on a synthetic mod library")
+    parser.add_argument("--mods", type=int, default=200)
+    parser.add_argument("--paks-per-mod", type=int, default=1)
+    parser.add_argument("--files-per-pak", type=int, default=20)
+    parser.add_argument("--override-every", type=int, default=10, help="every Nth pak only overrides game data")
+    parser.add_argument("--se-config-every", type=int, default=4, help="every Nth mod ships an SE_CONFIG folder")
+    parser.add_argument("--se-files", type=int, default=200, help="files left in the Script Extender folder for onFinishedRun")
+    parser.add_argument("--checker-entries", type=int, default=10000)
+    parser.add_argument("--workers", type=int, default=0)
+    parser.add_argument("--divine", action="store_true", help="scan paks through the fake Divine executable")
+    parser.add_argument("--divine-delay-ms", type=int, default=0, help="startup delay of each fake Divine run")
+    parser.add_argument("--divine-worker", action="store_true", help="send Divine calls to long-lived fake workers")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    try:
+        names = build_library(ROOT, args.mods, args.paks_per_mod, args.files_per_pak, args.override_every)
+        mods_path = os.path.join(ROOT, "mods")
+        add_se_configs(mods_path, names, args.se_config_every, 3)
+
+        profile_path = os.path.join(ROOT, "profile")
+        overwrite_path = os.path.join(ROOT, "overwrite")
+        os.makedirs(overwrite_path, exist_ok=True)
+
+        # The last mod plays the freshly installed one
+        installed = names[-1]
+        mod_list = MockModList(mods_path, names)
+        organizer = MockOrganizer(
+            mod_list,
+            MockProfile(profile_path),
+            overwrite_path,
+            settings={"scan_workers": args.workers, "in_memory_extraction": not args.divine, "background_warmup": True},
+        )
+
+        fake_divine = FakeDivine(os.path.join(ROOT, "divine.log"), args.divine_delay_ms)
+        fake_divine.install(ModSettingsHelper, args.divine_worker)
+
+        plugin = game.BaldursGate3Game()
+        plugin.init(organizer)
+        checker = game.BaldursGate3ModDataChecker()
+        harness = Harness(fake_divine)
+
+        def cold_cache():
+            reset_profile(profile_path)
+            PakCache.create_store(profile_path)
+
+        def warm_cache():
+            plugin.onAboutToRun("bin/bg3.exe")
+
+        def uninstalled():
+            warm_cache()
+            cache = PakCache.ModsCache(profile_path)
+            cache.remove_mod(installed)
+            cache.save()
+
+        def cold_mappings():
+            plugin._pakFileMappings = None
+            plugin._seConfigMappings = None
+
+        se_dir = os.path.join(os.environ["LOCALAPPDATA"], "Larian Studios", "Baldur's Gate 3", "Script Extender")
+
+        def game_session():
+            shutil.rmtree(os.path.join(overwrite_path, "SE_CONFIG"), ignore_errors=True)
+            fill_script_extender_folder(se_dir, args.se_files)
+
+        trees = []
+
+        def archive():
+            trees[:] = [patch_bundle(args.checker_entries)]
+
+        def check_and_fix():
+            if checker.dataLooksValid(trees[0]) == mobase.ModDataChecker.FIXABLE:
+                checker.fix(trees[0])
+
+        def warm_up():
+            plugin.onUserInterfaceLoad(None)
+            plugin._warmup.wait()
+
+        harness.measure("generateSettings (cold cache)", cold_cache, lambda: plugin.onAboutToRun("bin/bg3.exe"))
+        harness.measure("background warm-up", cold_cache, warm_up)
+        harness.measure("generateSettings (after warm-up)", lambda: (cold_cache(), warm_up()), lambda: plugin.onAboutToRun("bin/bg3.exe"))
+        harness.measure("generateSettings (warm cache)", warm_cache, lambda: plugin.onAboutToRun("bin/bg3.exe"))
+        harness.measure("modInstalled", uninstalled, lambda: plugin.onModInstalled(MockMod(installed, os.path.join(mods_path, installed))))
+        harness.measure("mappings (cold)", cold_mappings, plugin.mappings)
+        harness.measure("mappings (warm)", plugin.mappings, plugin.mappings)
+        harness.measure("onFinishedRun", game_session, lambda: plugin.onFinishedRun("bin/bg3.exe", 0))
+        harness.measure("data checker (check + fix)", archive, check_and_fix)
+        check_removed_during_warmup(plugin, game.CacheWarmup, profile_path, [os.path.join(mods_path, name) for name in (names[1], names[-1])], cold_cache)
+        check_without_localappdata(plugin, organizer)
+
+        paks = len(names) * args.paks_per_mod
+        extraction = "in-memory"
+        if args.divine:
+            extraction = "fake Divine worker" if args.divine_worker else "fake Divine"
+        print(f"{len(names)} mods, {paks} paks, {extraction} extraction")
+        harness.report()
+
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump({
+                    "mods": len(names),
+                    "paks": paks,
+                    "divine": args.divine,
+                    "divine_worker": args.divine_worker,
+                    "results": [result.as_dict() for result in harness.results],
+                }, f, indent=2)
+    finally:
+        shutil.rmtree(ROOT, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# -*- encoding: utf-8 -*-
+
+# Dependency sorting on a synthetic library where mods depend on mods with a higher MO2
+# priority, plus one missing dependency, one dependency on a disabled mod and one cycle.
+# Checks that every module ends up after its dependencies and that installing a mod only
+# scans that mod's pak. A fuzz check on small random graphs, full of cycles, checks that
+# every dependency that isn't inside a cycle is kept.
+#
+#   python benchmarks/bench_load_order.py --mods 400
+
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import _bootstrap  # noqa: F401
+from mock_organizer import MockModList, MockProfile
+from synthetic_paks import mod_uuid, write_mod_pak
+
+from baldursgate3 import LoadOrder, ModSettingsHelper
+from baldursgate3.PakCache import ModsCache
+
+
+def build_dependent_library(root, mods: int, max_dependencies: int, seed: int):
+    rng = random.Random(seed)
+    names = [f"SyntheticMod{i:04d}" for i in range(mods)]
+    graph = {}
+    for i, name in enumerate(names):
+        later = range(i + 1, mods - 3)  # The disabled mod and the cycle only get the edges below
+        graph[i] = rng.sample(later, min(len(later), rng.randint(0, max_dependencies)))
+    graph[0] = graph[0] + [mods + 1]  # Not installed
+    graph[1] = graph[1] + [mods - 1]  # Disabled, see main()
+    graph[mods - 2] = [mods - 3]      # These two depend on each other
+    graph[mods - 3] = graph[mods - 3] + [mods - 2]
+
+    for i, name in enumerate(names):
+        pak_folder = os.path.join(root, "mods", name, "PAK_FILES")
+        os.makedirs(pak_folder, exist_ok=True)
+        dependencies = [(f"SyntheticMod{d:04d}", mod_uuid(d)) for d in graph[i]]
+        write_mod_pak(os.path.join(pak_folder, f"{name}.pak"), name, mod_uuid(i), extra_files=2, dependencies=dependencies)
+    os.makedirs(os.path.join(root, "profile"), exist_ok=True)
+    return names
+
+
+def check_cycle_breaking(seed: int, graphs: int = 2000):
+    # Random graphs of up to 12 modules with many cycles, some of them waiting on each other
+    rng = random.Random(seed)
+    broken = 0
+    for _ in range(graphs):
+        size = rng.randint(3, 12)
+        requires = [set(rng.sample([i for i in range(size) if i != index], rng.randint(0, 2))) for index in range(size)]
+        order, cycles = LoadOrder.sort_order(requires)
+        assert sorted(order) == list(range(size)), f"{requires}: not every module placed once"
+        position = {index: place for place, index in enumerate(order)}
+        cycle_of = {index: number for number, cycle in enumerate(cycles) for index in cycle}
+        for index, required in enumerate(requires):
+            for provider in required:
+                if index in cycle_of and cycle_of[index] == cycle_of.get(provider):
+                    broken += 1
+                    continue
+                assert position[provider] < position[index], f"{requires}: {index} loads before {provider}, which is in no cycle with it"
+    print(f"{graphs} random graphs: every dependency outside a cycle kept, {broken} cycle edges")
+
+
+def timed(label, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    print(f"{label:>36}: {(time.perf_counter() - start) * 1000:9.1f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dependency sorting of the BG3 load order")
+    parser.add_argument("--mods", type=int, default=400)
+    parser.add_argument("--max-dependencies", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="bg3_bench_")
+    try:
+        names = build_dependent_library(root, args.mods, args.max_dependencies, args.seed)
+        mod_list = MockModList(os.path.join(root, "mods"), names, disabled=[names[-1]])
+        profile = MockProfile(os.path.join(root, "profile"))
+        profile_path = profile.absolutePath()
+
+        timed("generateSettings (cold, sorted)", ModSettingsHelper.generateSettings, mod_list, profile, 0, True, True)
+        timed("generateSettings (warm, unsorted)", ModSettingsHelper.generateSettings, mod_list, profile, 0, True, False)
+        timed("generateSettings (warm, sorted)", ModSettingsHelper.generateSettings, mod_list, profile, 0, True, True)
+
+        modsCache = ModsCache(profile_path)
+        states = {mod: mod_list.state(mod) for mod in names}
+        modules, problems = timed("load order (sorted)", ModSettingsHelper.load_order_modules, modsCache, names, states, True)
+
+        position = {}
+        for index, attributes in enumerate(modules):
+            position[next(value for attr_id, value, _ in attributes if attr_id == 'UUID')] = index
+        cycle = {mod_uuid(args.mods - 3), mod_uuid(args.mods - 2)}
+        for mod_info in modsCache.entries.values():
+            uuid = mod_info['UUID']['value']
+            if uuid not in position or uuid in cycle:
+                continue
+            for dependency in mod_info['Dependencies']:
+                if dependency['UUID'] in position and dependency['UUID'] not in cycle:
+                    assert position[dependency['UUID']] < position[uuid], f"{mod_info['Mod']} loads before {dependency['Folder']}"
+        print(f"{len(modules) - 1} modules, {len(problems)} problems")
+        for problem in problems:
+            print(f"  {problem}")
+        assert len(problems) == 3, "expected a missing, a disabled and a cyclic dependency"
+        assert os.path.exists(os.path.join(profile_path, LoadOrder.DEPENDENCY_REPORT_FILE_NAME))
+
+        # A reinstalled mod only has its own pak rescanned
+        installed = names[len(names) // 2]
+        modsCache.remove_mod(installed)
+        modsCache.save()
+        before = ModsCache(profile_path)
+        jobs = ModSettingsHelper.plan_pak_scans(before, mod_list, names)
+        assert [job[1] for job in jobs] == [installed], "reinstall rescanned other mods"
+        timed(f"modInstalled {installed}", ModSettingsHelper.modInstalled, mod_list, profile, installed)
+        timed("generateSettings (after install)", ModSettingsHelper.generateSettings, mod_list, profile, 0, True, True)
+
+        check_cycle_breaking(args.seed)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+# -*- encoding: utf-8 -*-
+
+# PAK_FILES mapping enumeration on a deep directory layout: the old recursive
+# listDirectories + findFiles per directory against MappingHelper's single walk, and the
+# number of mappings left once subtrees owned by a single mod are mapped as directories.
+# Every few mods also drop paks into a folder shared with other mods, which has to stay
+# mapped file by file, and some mods have a pak and a folder hidden in MO2 (.mohidden),
+# which the VFS leaves out. Expanding the directory mappings must give the old file mappings.
+#
+# The mock answers from memory, so every call into MO2 is charged --call-cost-us: the
+# organizer and mod list calls, the filter MO2 calls back for every file, and the five
+# crossings (constructor and four attributes) of every mobase.Mapping the hook returns.
+# The walk reads the disk instead, the break-even cost is printed for the first call.
+#
+#   python benchmarks/bench_mappings.py --mods 300 --depth 4 --shared-every 5 --hidden-every 7 --call-cost-us 5
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import _bootstrap  # noqa: F401
+from mock_organizer import MockModList, MockOrganizer, MockProfile, cross
+
+from baldursgate3.MappingHelper import PakFileMappingCache
+
+PAK_MOD_PREFIX = "PAK_FILES"
+
+# mobase.Mapping() and its four attributes, set one by one like the plugin does
+MAPPING_CROSSINGS = 5
+
+
+def build_deep_layout(root, mods, depth, files_per_dir, shared_every, hidden_every):
+    names = []
+    for i in range(mods):
+        name = f"DeepMod{i:04d}"
+        folder = os.path.join(root, "mods", name, PAK_MOD_PREFIX)
+        if shared_every and i % shared_every == 0:
+            # Same folder in several mods, the paks overwrite each other two by two
+            shared = os.path.join(folder, "Shared")
+            os.makedirs(shared, exist_ok=True)
+            for f in (i // shared_every, i // shared_every + 1):
+                with open(os.path.join(shared, f"Shared_{f}.pak"), "wb") as pak:
+                    pak.write(b"LSPK")
+        for level in range(depth):
+            folder = os.path.join(folder, f"{name}_L{level}")
+            os.makedirs(folder, exist_ok=True)
+            for f in range(files_per_dir):
+                with open(os.path.join(folder, f"{name}_{level}_{f}.pak"), "wb") as pak:
+                    pak.write(b"LSPK")
+        if hidden_every and i % hidden_every == 0:
+            # Hidden from the conflicts tab: a pak at the bottom and a whole folder at the top
+            hidden_folder = os.path.join(root, "mods", name, PAK_MOD_PREFIX, f"{name}_L0", "Old.mohidden")
+            os.makedirs(hidden_folder, exist_ok=True)
+            for path in (os.path.join(folder, f"{name}_hidden.pak.mohidden"), os.path.join(hidden_folder, "Old.pak")):
+                with open(path, "wb") as pak:
+                    pak.write(b"LSPK")
+        names.append(name)
+    os.makedirs(os.path.join(root, "overwrite"), exist_ok=True)
+    os.makedirs(os.path.join(root, "profile"), exist_ok=True)
+    return names
+
+
+def list_dirs_recursive(organizer, dirs_list, prefix=""):
+    for dir_ in organizer.listDirectories(prefix):
+        dir_ = os.path.join(prefix, dir_)
+        dirs_list.append(dir_)
+        list_dirs_recursive(organizer, dirs_list, dir_)
+
+
+def old_mappings(organizer, destination):
+    mappings = []
+    mod_dirs = [PAK_MOD_PREFIX]
+    list_dirs_recursive(organizer, mod_dirs, prefix=PAK_MOD_PREFIX)
+    for dir_ in mod_dirs:
+        for file_ in organizer.findFiles(path=dir_, filter=lambda x: True):
+            mappings.append((file_, os.path.join(destination, file_.split(PAK_MOD_PREFIX)[1].strip("\\").strip("/")), False))
+    return mappings
+
+
+def to_mobase(mappings, call_cost):
+    for _ in mappings:
+        cross(call_cost * MAPPING_CROSSINGS)
+    return len(mappings) * MAPPING_CROSSINGS
+
+
+def expand_directories(mappings):
+    # File mappings a directory mapping stands for, to compare against the per file list
+    files = []
+    for source, destination, is_directory in mappings:
+        if not is_directory:
+            files.append((source, destination, False))
+            continue
+        for root, dirs, filenames in os.walk(source):
+            relative_root = os.path.relpath(root, source)
+            for filename in filenames:
+                relative_path = filename if relative_root == "." else os.path.join(relative_root, filename)
+                files.append((os.path.join(root, filename), os.path.join(destination, relative_path), False))
+    return files
+
+
+def new_mappings(cache, organizer, destination):
+    mod_list = organizer.modList()
+    pak_folders = [
+        os.path.join(mod_list.getMod(mod).absolutePath(), PAK_MOD_PREFIX)
+        for mod in mod_list.allModsByProfilePriority()
+        if int(mod_list.state(mod) / 2) % 2 != 0
+    ]
+    pak_folders.append(os.path.join(organizer.overwritePath(), PAK_MOD_PREFIX))
+    return cache.mappings(pak_folders, destination)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PAK_FILES mapping enumeration")
+    parser.add_argument("--mods", type=int, default=300)
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--files-per-dir", type=int, default=2)
+    parser.add_argument("--shared-every", type=int, default=5, help="every Nth mod also has paks in a shared folder, 0 for none")
+    parser.add_argument("--hidden-every", type=int, default=7, help="every Nth mod has a hidden pak and folder, 0 for none")
+    parser.add_argument("--call-cost-us", type=float, default=5.0, help="cost of one call between Python and MO2, in microseconds")
+    args = parser.parse_args()
+    call_cost = args.call_cost_us / 1e6
+
+    root = tempfile.mkdtemp(prefix="bg3_bench_")
+    try:
+        names = build_deep_layout(root, args.mods, args.depth, args.files_per_dir, args.shared_every, args.hidden_every)
+        mod_list = MockModList(os.path.join(root, "mods"), names)
+        organizer = MockOrganizer(mod_list, MockProfile(os.path.join(root, "profile")), os.path.join(root, "overwrite"))
+        destination = os.path.join(root, "appdata", "Mods")
+        organizer.listDirectories("")  # Build the mock VFS outside the timings
+
+        organizer.call_cost = mod_list.call_cost = call_cost
+
+        organizer.calls = 0
+        start = time.perf_counter()
+        old = old_mappings(organizer, destination)
+        calls = organizer.calls + to_mobase(old, call_cost)
+        old_elapsed = time.perf_counter() - start
+        print(f"listDirectories + findFiles: {old_elapsed * 1000:8.1f} ms, {calls} calls into MO2, {len(old)} mappings")
+
+        cache = PakFileMappingCache()
+        results = []
+        for label in ("single walk (cold)", "single walk (warm)"):
+            mod_list.calls = 0
+            start = time.perf_counter()
+            new = new_mappings(cache, organizer, destination)
+            new_calls = mod_list.calls + to_mobase(new, call_cost)
+            elapsed = time.perf_counter() - start
+            results.append((elapsed, new_calls))
+            print(f"{label:>27}: {elapsed * 1000:8.1f} ms, {new_calls} calls into MO2, {len(new)} mappings")
+
+        # Cost per call at which the first walk catches up with the VFS queries
+        (cold_elapsed, cold_calls), _ = results
+        saved_calls = calls - cold_calls
+        without_cost = (cold_elapsed - old_elapsed) / saved_calls + call_cost if saved_calls > 0 else float("inf")
+        print(f"{'break-even (cold)':>27}: {max(without_cost, 0) * 1e6:8.1f} us per call")
+
+        directories = sum(1 for mapping in new if mapping[2])
+        print(f"{'compacted':>27}: {cache.file_count} files -> {len(new)} mappings ({directories} directories)")
+        assert cache.file_count == len(old), "walk and VFS disagree on the winning files"
+        assert sorted(old) == sorted(expand_directories(new)), "mapping lists differ"
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
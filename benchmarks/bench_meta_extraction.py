@@ -0,0 +1,137 @@
+# -*- encoding: utf-8 -*-
+
+# Compares in-memory meta.lsx extraction with the old temp_extracted folder flow
+# (extract to disk, os.walk for meta.lsx, parse it twice, rmtree). Truncated and corrupt
+# paks are checked first: the native reader has to report them as PakError, so they go
+# through the Divine fallback instead of failing the whole scan.
+#
+#   python benchmarks/bench_meta_extraction.py --paks 500
+
+import argparse
+import os
+import shutil
+import struct
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+
+import _bootstrap  # noqa: F401
+from synthetic_paks import mod_uuid, write_mod_pak
+
+from baldursgate3 import ModSettingsHelper
+from baldursgate3.PakReader import PakError, open_pak
+
+
+def extract_meta_lsx_tempdir(pak_path, output_dir):
+    # Same file system traffic as extract_meta_lsx_divine, minus the Divine process
+    with open_pak(pak_path) as pak:
+        entry = pak.find_meta_lsx()
+        target = os.path.join(output_dir, *entry.name.split("/"))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, "wb") as f:
+            f.write(pak.read(entry))
+        list_output = "\n".join(pak.list_files())
+
+    meta_lsx_path = ModSettingsHelper.find_meta_lsx("meta.lsx", output_dir)
+    root = ET.parse(meta_lsx_path).getroot()
+    module_info = root.find(".//node[@id='ModuleInfo']")
+    mod_folder = ModSettingsHelper.get_attribute_value(module_info, "Folder")
+    files = ModSettingsHelper.list_output_files(list_output)
+    prefixes = ModSettingsHelper.pak_prefixes(files)
+    is_override = ModSettingsHelper.detect_override(mod_folder.get("value"), prefixes)
+
+    modinfo = ModSettingsHelper.parse_meta_lsx(meta_lsx_path)
+    modinfo["IsOverride"] = is_override
+    modinfo["Prefixes"] = sorted(prefixes)
+    modinfo["Files"] = files
+    return modinfo
+
+
+def damaged_paks(work_dir):
+    # (label, path) of packages a partial download or a broken tool leaves behind
+    source = os.path.join(work_dir, "Source.pak")
+    write_mod_pak(source, "Damaged", mod_uuid(0), extra_files=5)
+    with open(source, "rb") as f:
+        data = f.read()
+    file_list_offset = struct.unpack_from("<Q", data, 8)[0]
+    meta_offset = 4 + 36  # Body right after the v18 header, meta.lsx is the first file
+
+    damaged = {
+        "20 bytes": data[:20],
+        "cut in the header": data[:30],
+        "cut before the file list": data[:file_list_offset + 4],
+        "cut in the file list": data[:-100],
+        "corrupt file list block": data[:file_list_offset] + struct.pack("<II", 1, 2) + b"\xf0\xff",
+        "corrupt meta.lsx block": data[:meta_offset] + b"\x0f\x00\x00" + data[meta_offset + 3:],
+    }
+    paths = []
+    for i, (label, content) in enumerate(damaged.items()):
+        path = os.path.join(work_dir, f"Damaged{i}.pak")
+        with open(path, "wb") as f:
+            f.write(content)
+        paths.append((label, path))
+    return paths
+
+
+def check_damaged_paks(work_dir):
+    paks = damaged_paks(work_dir)
+    for label, path in paks:
+        try:
+            ModSettingsHelper.extract_meta_lsx_native(path)
+        except PakError:
+            continue
+        except Exception as e:
+            raise AssertionError(f"{label}: {type(e).__name__} escaped the pak reader: {e}")
+        raise AssertionError(f"{label}: damaged pak read without an error")
+    print(f"damaged paks: all {len(paks)} reported as PakError")
+
+
+def run_tempdir(paks, work_dir):
+    temp_dir = os.path.join(work_dir, "temp_extracted")
+    results = []
+    for pak in paks:
+        pak_temp_dir = os.path.join(temp_dir, os.path.basename(pak))
+        os.makedirs(pak_temp_dir, exist_ok=True)
+        results.append(extract_meta_lsx_tempdir(pak, pak_temp_dir))
+    shutil.rmtree(temp_dir, ignore_errors=True)
+    return results
+
+
+def run_in_memory(paks, work_dir):
+    return [ModSettingsHelper.extract_meta_lsx(pak) for pak in paks]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare in-memory and temp folder meta.lsx extraction")
+    parser.add_argument("--paks", type=int, default=300)
+    parser.add_argument("--files-per-pak", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bg3_bench_")
+    try:
+        check_damaged_paks(work_dir)
+
+        paks = []
+        for i in range(args.paks):
+            path = os.path.join(work_dir, f"Mod{i}.pak")
+            write_mod_pak(path, f"Mod{i}", mod_uuid(i), extra_files=args.files_per_pak)
+            paks.append(path)
+
+        baseline = None
+        for label, run in (("temp dir", run_tempdir), ("in memory", run_in_memory)):
+            best = float("inf")
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                results = run(paks, work_dir)
+                best = min(best, time.perf_counter() - start)
+            if baseline is None:
+                baseline = results
+            assert results == baseline, f"{label} results differ from the temp dir path"
+            print(f"{label:>10}: {best * 1000:8.1f} ms total, {best * 1e6 / len(paks):7.1f} us/pak")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
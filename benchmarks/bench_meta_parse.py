@@ -0,0 +1,120 @@
+# -*- encoding: utf-8 -*-
+
+# Compares the meta.lsx parsers with the old flow, which parsed the file once for the Folder
+# and a second time for the rest of ModuleInfo, on meta.lsx files with long descriptions and
+# many dependencies. Files on disk and data read out of a pak go through the same single
+# parse, and both must give the same modinfo, dependencies included. The old flow never read
+# the Dependencies block, so with many dependencies the single parse also times the extra
+# dependency list.
+#
+#   python benchmarks/bench_meta_parse.py --files 500 --dependencies 100
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+
+import _bootstrap  # noqa: F401
+from synthetic_paks import meta_lsx, mod_uuid
+
+from baldursgate3 import ModSettingsHelper
+
+FIELDS = ('Folder', 'Name', 'PublishHandle', 'UUID', 'MD5', 'Version', 'Version64')
+
+
+def legacy_module_info(root, source):
+    module_info = root.find(".//node[@id='ModuleInfo']")
+    if module_info is None:
+        raise ValueError(f"'ModuleInfo' node not found in {source}")
+    return {field: ModSettingsHelper.get_attribute_value(module_info, field) for field in FIELDS}
+
+
+def legacy_parse_file(path):
+    # extract_meta_lsx_divine before the streaming parser
+    root = ET.parse(path).getroot()
+    module_info = root.find(".//node[@id='ModuleInfo']")
+    folder = ModSettingsHelper.get_attribute_value(module_info, 'Folder')
+    modinfo = legacy_module_info(ET.parse(path).getroot(), path)
+    return folder, modinfo
+
+
+def legacy_parse_data(data, source):
+    # extract_meta_lsx_native before the streaming parser
+    root = ET.fromstring(data)
+    module_info = root.find(".//node[@id='ModuleInfo']")
+    folder = ModSettingsHelper.get_attribute_value(module_info, 'Folder')
+    return folder, legacy_module_info(root, source)
+
+
+def single_parse_file(path):
+    modinfo = ModSettingsHelper.parse_meta_lsx(path)
+    return modinfo['Folder'], modinfo
+
+
+def single_parse_data(data, source):
+    modinfo = ModSettingsHelper.parse_meta_lsx_data(data, source)
+    return modinfo['Folder'], modinfo
+
+
+def best_of(repeat, func, items):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [func(*item) for item in items]
+        best = min(best, time.perf_counter() - start)
+    return best, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare single and double meta.lsx parsing")
+    parser.add_argument("--files", type=int, default=300)
+    parser.add_argument("--dependencies", type=int, default=100)
+    parser.add_argument("--description-kb", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bg3_bench_")
+    try:
+        description = "x" * (args.description_kb * 1024)
+        blobs = []
+        for i in range(args.files):
+            dependencies = [(f"Dep{d}", mod_uuid(100000 + d)) for d in range(args.dependencies)]
+            blobs.append(meta_lsx(f"Mod{i}", uuid=mod_uuid(i), dependencies=dependencies, description=description))
+
+        paths = []
+        for i, data in enumerate(blobs):
+            path = os.path.join(work_dir, f"meta_{i}.lsx")
+            with open(path, "wb") as f:
+                f.write(data)
+            paths.append(path)
+
+        size = sum(len(data) for data in blobs) / len(blobs)
+        print(f"{args.files} meta.lsx files, {args.dependencies} dependencies, {size / 1024:.1f} KiB each")
+
+        cases = (
+            ("file", [(path,) for path in paths], legacy_parse_file, single_parse_file),
+            ("in memory", [(data, f"meta_{i}.lsx") for i, data in enumerate(blobs)], legacy_parse_data, single_parse_data),
+        )
+        modinfos = []
+        for label, items, legacy, single in cases:
+            legacy_time, legacy_results = best_of(args.repeat, legacy, items)
+            single_time, single_results = best_of(args.repeat, single, items)
+            modinfos.append([info for _, info in single_results])
+
+            for (legacy_folder, legacy_info), (folder, info) in zip(legacy_results, single_results):
+                assert folder == legacy_folder, f"{label}: folder differs"
+                assert {field: info[field] for field in FIELDS} == legacy_info, f"{label}: ModuleInfo differs"
+                assert len(info['Dependencies']) == args.dependencies, f"{label}: dependencies missing"
+
+            per_file = 1e6 / len(items)
+            print(f"{label:>10}: double parse {legacy_time * per_file:8.1f} us/file, "
+                  f"single parse {single_time * per_file:8.1f} us/file ({legacy_time / single_time:.2f}x)")
+        assert modinfos[0] == modinfos[1], "meta.lsx on disk and in memory give different modinfo"
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+# -*- encoding: utf-8 -*-
+
+# BaldursGate3ModDataChecker on synthetic 10k entry archives, against the previous
+# nested-loop implementation (kept below as LegacyModDataChecker for comparison).
+#
+#   python benchmarks/bench_mod_data_checker.py --entries 10000
+
+import argparse
+import time
+
+import _bootstrap
+
+import mobase  # type: ignore
+
+game = _bootstrap.load_game_plugin()
+
+VALID_FOLDERS = [
+    "Cursors", "DLC", "Engine", "Fonts", "Generated", "Localization", "Mods", "PakInfo",
+    "PlayerProfiles", "Public", "Root", "Shaders", "Video", "PAK_FILES", "SE_CONFIG",
+]
+VALID_FILE_EXTENSIONS = [".pak", ".dll", ".json"]
+
+
+class LegacyModDataChecker:
+    def dataLooksValid(self, tree):
+        folders = []
+        files = []
+        for entry in tree:
+            if isinstance(entry, mobase.IFileTree):
+                folders.append(entry)
+            else:
+                files.append(entry)
+
+        for mainFolder in folders:
+            for validFolder in VALID_FOLDERS:
+                if mainFolder.name().lower() == validFolder.lower():
+                    return mobase.ModDataChecker.VALID
+
+        for mainFile in files:
+            for extension in VALID_FILE_EXTENSIONS:
+                if mainFile.name().lower().endswith(extension.lower()) and mainFile.name() != "info.json":
+                    return mobase.ModDataChecker.FIXABLE
+
+        for mainFolder in folders:
+            if mainFolder.name().lower() == "bin":
+                return mobase.ModDataChecker.FIXABLE
+            else:
+                for mainFile in mainFolder:
+                    for extension in VALID_FILE_EXTENSIONS:
+                        if mainFile.name().lower().endswith(extension.lower()) and mainFile.name() != "info.json":
+                            return mobase.ModDataChecker.FIXABLE
+
+        for src_folder in folders:
+            for dst_folder in VALID_FOLDERS:
+                if src_folder.name().lower() == dst_folder.lower():
+                    return mobase.ModDataChecker.VALID
+
+        return mobase.ModDataChecker.INVALID
+
+    def fix(self, tree):
+        folders = []
+        files = []
+        for entry in tree:
+            if isinstance(entry, mobase.IFileTree):
+                folders.append(entry)
+            else:
+                files.append(entry)
+
+        for mainFile in files:
+            for extension in [".url", ".html", ".ink"]:
+                if mainFile.name().lower().endswith(extension):
+                    tree.remove(mainFile)
+            for filename in ["readme", "info.json"]:
+                if mainFile.name().lower() == filename:
+                    tree.remove(mainFile)
+
+        for mainFolder in folders:
+            for mainFile in mainFolder:
+                for extension in [".url", ".html", ".ink"]:
+                    if mainFile.name().lower().endswith(extension):
+                        tree.remove(mainFolder)
+                for filename in ["readme", "info.json"]:
+                    if mainFile.name().lower() == filename:
+                        tree.remove(mainFolder)
+
+        for mainFile in files:
+            if mainFile.name().lower().endswith(".pak"):
+                tree.move(mainFile, "/PAK_FILES/", policy=mobase.IFileTree.MERGE)
+            if mainFile.name().lower().endswith(".json") and mainFile.name() != "info.json":
+                tree.move(mainFile, "/SE_CONFIG/", policy=mobase.IFileTree.MERGE)
+
+        for mainFolder in folders:
+            if mainFolder.name().lower() == "bin":
+                tree.move(mainFolder, "/Root/", policy=mobase.IFileTree.MERGE)
+            else:
+                for mainFile in mainFolder:
+                    if mainFile.name().lower().endswith(".pak"):
+                        tree.move(mainFile, "/PAK_FILES/", policy=mobase.IFileTree.MERGE)
+                    if mainFile.name().lower().endswith(".json") and mainFile.name() != "info.json":
+                        tree.move(mainFile, "/SE_CONFIG/", policy=mobase.IFileTree.MERGE)
+        return tree
+
+
+def patch_bundle(entries):
+    # Many per-patch folders full of assets, the paks sit one level down
+    tree = mobase.IFileTree()
+    per_folder = 100
+    for f in range(max(1, entries // per_folder)):
+        folder = tree.addDirectory(f"Patch {f:03d}")
+        for i in range(per_folder - 1):
+            folder.addFile(f"texture_{i:03d}.dds")
+        folder.addFile(f"Patch{f:03d}.pak")
+    tree.addFile("readme")
+    tree.addFile("Nexus page.url")
+    return tree
+
+
+def valid_data(entries):
+    # Flat archive whose only recognised folder comes last
+    tree = mobase.IFileTree()
+    for i in range(entries - 1):
+        tree.addFile(f"notes_{i:05d}.txt")
+    tree.addDirectory("Public").addFile("x.lsx")
+    return tree
+
+
+def invalid_data(entries):
+    tree = mobase.IFileTree()
+    per_folder = 50
+    for f in range(max(1, entries // per_folder)):
+        folder = tree.addDirectory(f"Screens {f:03d}")
+        for i in range(per_folder):
+            folder.addFile(f"shot_{i:03d}.png")
+    return tree
+
+
+def paths(tree, prefix=""):
+    result = []
+    for entry in tree:
+        path = f"{prefix}/{entry.name()}"
+        result.append(path)
+        if isinstance(entry, mobase.IFileTree):
+            result.extend(paths(entry, path))
+    return sorted(result)
+
+
+def timed(func, *args, repeat=1):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the BG3 mod data checker")
+    parser.add_argument("--entries", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    legacy = LegacyModDataChecker()
+    for label, build in (("patch bundle", patch_bundle), ("valid", valid_data), ("invalid", invalid_data)):
+        tree = build(args.entries)
+        checker = game.BaldursGate3ModDataChecker()
+
+        legacy_time, legacy_verdict = timed(legacy.dataLooksValid, tree, repeat=args.repeat)
+        check_time, verdict = timed(checker.dataLooksValid, tree, repeat=args.repeat)
+        assert verdict == legacy_verdict, f"{label}: {verdict} != {legacy_verdict}"
+        print(f"{label:>12} check: legacy {legacy_time * 1000:7.2f} ms, single pass {check_time * 1000:7.2f} ms")
+
+        if verdict == mobase.ModDataChecker.FIXABLE:
+            legacy_fix_time, legacy_tree = timed(legacy.fix, build(args.entries))
+            fix_time, fixed_tree = timed(checker.fix, build(args.entries))
+            assert paths(fixed_tree) == paths(legacy_tree), f"{label}: fixed trees differ"
+            print(f"{label:>12} fix:   legacy {legacy_fix_time * 1000:7.2f} ms, planned     {fix_time * 1000:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+# -*- encoding: utf-8 -*-
+
+# Launch-time cache lookups on a large synthetic library: the old per-mod pattern
+# (re-read modsCache.json and walk every entry for each mod) against one ModsCache
+# load with the mod -> pak index, plus full generateSettings timings. Also checks that
+# paks only share a cache row when their whole content matches: rebuilt paks with the
+# same size, head and tail but another meta.lsx in the middle must keep their own,
+# that paks without a meta.lsx stay out of the load order, that an unchanged launch
+# doesn't load the cache while any change to the mods, their paks or the written file
+# does, and that modsettings.lsx is byte for byte what minidom wrote.
+#
+#   python benchmarks/bench_mods_cache.py --mods 1000
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from xml.dom import minidom
+
+import _bootstrap  # noqa: F401
+from mock_organizer import MockModList, MockProfile
+from synthetic_paks import METHOD_NONE, build_library, meta_lsx, mod_uuid, write_pak
+
+from baldursgate3 import ModSettingsHelper, PakCache
+from baldursgate3.PakCache import ModsCache
+
+
+def per_mod_lookups(json_path, mod_list, names):
+    found = 0
+    for mod in names:
+        with open(json_path, "r") as file:
+            cache = json.load(file)
+        found += len([entry for entry in cache.values() if mod in entry["Mod"]])
+        mod_list.state(mod)
+    return found
+
+
+def indexed_lookups(profile_path, mod_list, names):
+    cache = ModsCache(profile_path)
+    states = {mod: mod_list.state(mod) for mod in names}
+    return sum(len(cache.mod_paks(mod)) for mod in names if states[mod])
+
+
+def write_rebuilt_pak(mods_path, mod, uuid):
+    # Same size, head and tail for every uuid, only the meta.lsx between the paddings differs
+    pak_folder = os.path.join(mods_path, mod, "PAK_FILES")
+    os.makedirs(pak_folder, exist_ok=True)
+    padding = b"\0" * (2 * PakCache.HASH_CHUNK_SIZE)
+    write_pak(os.path.join(pak_folder, "Rebuilt.pak"), {
+        "Public/Rebuilt/Assets/Before.bin": padding,
+        "Mods/Rebuilt/meta.lsx": meta_lsx("Rebuilt", uuid=uuid),
+        "Public/Rebuilt/Assets/After.bin": padding,
+    }, method=METHOD_NONE)
+
+
+def check_content_sharing(root):
+    mods_path = os.path.join(root, "rebuilt", "mods")
+    profile_path = os.path.join(root, "rebuilt", "profile")
+    os.makedirs(profile_path)
+    first, second = mod_uuid(100001), mod_uuid(100002)
+    for mod, uuid in (("RebuiltA", first), ("RebuiltB", second), ("RebuiltCopyOfA", first)):
+        write_rebuilt_pak(mods_path, mod, uuid)
+    mod_list = MockModList(mods_path, ["RebuiltA", "RebuiltB", "RebuiltCopyOfA"])
+    profile = MockProfile(profile_path)
+
+    scans = []
+    scan_pak = ModSettingsHelper.scan_pak
+    ModSettingsHelper.scan_pak = lambda *a, **k: scans.append(a[0][1]) or scan_pak(*a, **k)
+    try:
+        ModSettingsHelper.generateSettings(mod_list, profile)
+        assert sorted(scans) == ["RebuiltA", "RebuiltB"], f"scanned {scans}"
+
+        # A later copy is matched against the cache, not scanned
+        write_rebuilt_pak(mods_path, "RebuiltCopyOfB", second)
+        mod_list.names.append("RebuiltCopyOfB")
+        ModSettingsHelper.generateSettings(mod_list, profile)
+        assert len(scans) == 2, f"copy scanned again: {scans}"
+    finally:
+        ModSettingsHelper.scan_pak = scan_pak
+
+    cache = ModsCache(profile_path)
+    uuids = {mod: entry["UUID"]["value"] for mod in mod_list.names for entry in cache.mod_paks(mod).values()}
+    assert uuids == {"RebuiltA": first, "RebuiltB": second, "RebuiltCopyOfA": first, "RebuiltCopyOfB": second}, f"metadata mixed up: {uuids}"
+    db = PakCache.connect(profile_path)
+    try:
+        rows = db.execute("SELECT COUNT(*) FROM paks").fetchone()[0]
+    finally:
+        db.close()
+    assert rows == 2, f"{rows} paks rows for 2 contents"
+    print("rebuilt paks with equal size, head and tail: 4 locations, 2 contents, 2 scans")
+
+
+def check_pak_without_meta(root):
+    # Texture or script only paks carry no meta.lsx, their cache entry keeps the placeholder Folder
+    mods_path = os.path.join(root, "no_meta", "mods")
+    profile_path = os.path.join(root, "no_meta", "profile")
+    os.makedirs(profile_path)
+    pak_folder = os.path.join(mods_path, "TexturesOnly", "PAK_FILES")
+    os.makedirs(pak_folder)
+    write_pak(os.path.join(pak_folder, "Textures.pak"), {"Public/TexturesOnly/Assets/Textures/Skin.dds": b"DDS " * 64})
+    profile = MockProfile(profile_path)
+    ModSettingsHelper.generateSettings(MockModList(mods_path, ["TexturesOnly"]), profile)
+    with open(os.path.join(profile_path, "modsettings.lsx"), "r", encoding="utf-8") as f:
+        assert "TexturesOnly" not in f.read(), "pak without meta.lsx written to modsettings.lsx"
+    print("pak without meta.lsx: cached, left out of the load order")
+
+
+def check_unchanged_inputs(root):
+    mods_path = os.path.join(root, "inputs", "mods")
+    profile_path = os.path.join(root, "inputs", "profile")
+    os.makedirs(profile_path)
+    names = build_library(os.path.join(root, "inputs"), 5, 1, files_per_pak=5)
+    mod_list = MockModList(mods_path, names)
+    profile = MockProfile(profile_path)
+    output_path = os.path.join(profile_path, "modsettings.lsx")
+
+    loads = []
+    cache_class = ModSettingsHelper.ModsCache
+    ModSettingsHelper.ModsCache = lambda *a: loads.append(a) or cache_class(*a)
+    scan_pak = ModSettingsHelper.scan_pak
+    try:
+        def loads_cache():
+            del loads[:]
+            ModSettingsHelper.generateSettings(mod_list, profile)
+            return bool(loads)
+
+        loads_cache()
+        pak_path = ModSettingsHelper.mod_pak_paths(mod_list, names[0])[0][1]
+        stat = os.stat(pak_path)
+        assert not loads_cache(), "cache loaded on an unchanged launch"
+        changes = {
+            "pak touched": lambda: os.utime(pak_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9)),
+            "mod disabled": lambda: mod_list.disabled.add(names[1]),
+            "priorities changed": lambda: mod_list.names.reverse(),
+            "modsettings.lsx edited": lambda: os.utime(output_path, ns=(stat.st_atime_ns, stat.st_mtime_ns)),
+        }
+        for change, apply in changes.items():
+            apply()
+            assert loads_cache(), f"{change}: launch skipped"
+            assert not loads_cache(), f"{change}: cache loaded again on the next launch"
+
+        # A pak that couldn't be scanned is retried on the next launch, even with nothing changed
+        with open(pak_path, "ab") as pak:
+            pak.write(b"\0")
+        ModSettingsHelper.scan_pak = lambda *a, **k: None
+        loads_cache()
+        ModSettingsHelper.scan_pak = scan_pak
+        assert loads_cache(), "pak that failed to scan skipped on the next launch"
+    finally:
+        ModSettingsHelper.ModsCache = cache_class
+        ModSettingsHelper.scan_pak = scan_pak
+    print("unchanged launch: cache not loaded, pak, mod state, priority and file edits all noticed")
+
+
+def minidom_modsettings(modules):
+    # The document the plugin used to build, written the way it wrote it
+    document = minidom.Document()
+    save = document.appendChild(document.createElement('save'))
+    version = save.appendChild(document.createElement('version'))
+    for key, value in (('major', '4'), ('minor', '7'), ('revision', '1'), ('build', '3')):
+        version.setAttribute(key, value)
+    region = save.appendChild(document.createElement('region'))
+    region.setAttribute('id', 'ModuleSettings')
+    root = region.appendChild(document.createElement('node'))
+    root.setAttribute('id', 'root')
+    children = root.appendChild(document.createElement('children'))
+
+    def node(parent, node_id):
+        element = parent.appendChild(document.createElement('node'))
+        element.setAttribute('id', node_id)
+        return element
+
+    def attribute(parent, attr_id, value, attr_type):
+        element = parent.appendChild(document.createElement('attribute'))
+        element.setAttribute('id', attr_id)
+        element.setAttribute('value', value)
+        element.setAttribute('type', attr_type)
+
+    mod_order = node(children, 'ModOrder').appendChild(document.createElement('children'))
+    mods = node(children, 'Mods').appendChild(document.createElement('children'))
+    for attributes in modules:
+        for attr in attributes:
+            if attr[0] == 'UUID':
+                attribute(node(mod_order, 'Module'), *attr)
+        short_desc = node(mods, 'ModuleShortDesc')
+        for attr in attributes:
+            attribute(short_desc, *attr)
+    return document.toprettyxml(indent="  ")
+
+
+def check_minidom_layout(root):
+    modules = [ModSettingsHelper.GUSTAV_MODULE]
+    for i, name in enumerate(['Plain', 'Say "Hi"', "Rock 'n' Roll", 'Both "double" and \'single\'', 'Tags <b> & more']):
+        modules.append([
+            ('Folder', f"Quoted{i}", 'LSString'),
+            ('MD5', '', 'LSString'),
+            ('Name', name, 'LSString'),
+            ('PublishHandle', '0', 'uint64'),
+            ('UUID', mod_uuid(200000 + i), 'FixedString'),
+            ('Version64', '36028797018963968', 'int64'),
+        ])
+    output_path = os.path.join(root, "layout.lsx")
+    ModSettingsHelper.write_modsettings(output_path, modules)
+    with open(output_path, "r", encoding="utf-8") as f:
+        assert f.read() == minidom_modsettings(modules), "modsettings.lsx differs from the minidom output"
+    print("modsettings.lsx: same bytes as minidom, quotes in values included")
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark mods cache lookups")
+    parser.add_argument("--mods", type=int, default=1000)
+    parser.add_argument("--paks-per-mod", type=int, default=1)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="bg3_bench_")
+    try:
+        names = build_library(root, args.mods, args.paks_per_mod, files_per_pak=5)
+        profile_path = os.path.join(root, "profile")
+        mod_list = MockModList(os.path.join(root, "mods"), names)
+        profile = MockProfile(profile_path)
+
+        elapsed, _ = timed(ModSettingsHelper.generateSettings, mod_list, profile)
+        print(f"cold generateSettings (scan {len(names) * args.paks_per_mod} paks): {elapsed * 1000:9.1f} ms")
+
+        # The old per-mod pattern read a modsCache.json, dump the same entries to one
+        json_path = os.path.join(root, "modsCache.json")
+        with open(json_path, "w") as file:
+            json.dump(ModsCache(profile_path).entries, file, indent=4)
+
+        elapsed_old, found_old = timed(per_mod_lookups, json_path, mod_list, names)
+        elapsed_new, found_new = timed(indexed_lookups, profile_path, mod_list, names)
+        assert found_old == found_new
+        print(f"per-mod cache reload + scan:  {elapsed_old * 1000:9.1f} ms")
+        print(f"single load + mod index:      {elapsed_new * 1000:9.1f} ms ({elapsed_old / elapsed_new:.0f}x)")
+
+        os.remove(os.path.join(profile_path, ModSettingsHelper.SETTINGS_DIGEST_FILE_NAME))
+        mod_list.calls = 0
+        elapsed, _ = timed(ModSettingsHelper.generateSettings, mod_list, profile)
+        print(f"warm generateSettings (rewrite):   {elapsed * 1000:9.1f} ms, {mod_list.calls} mod list calls")
+
+        mod_list.calls = 0
+        elapsed, _ = timed(ModSettingsHelper.generateSettings, mod_list, profile)
+        print(f"warm generateSettings (unchanged): {elapsed * 1000:9.1f} ms, {mod_list.calls} mod list calls")
+
+        check_content_sharing(root)
+        check_pak_without_meta(root)
+        check_unchanged_inputs(root)
+        check_minidom_layout(root)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
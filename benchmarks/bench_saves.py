@@ -0,0 +1,150 @@
+# -*- encoding: utf-8 -*-
+
+# Opening MO2's saves tab on a large Story folder. Every save is a padded .lsv package with
+# a SaveInfo.json and a full size screenshot next to it. Compares reading every save and
+# decoding every screenshot on each refresh with SaveIndex: a first open that builds the
+# index, then an MO2 restart that loads it back, with only the visible screenshots decoded.
+#
+#   python benchmarks/bench_saves.py --saves 400 --save-kb 4096 --visible 20
+
+import argparse
+import json
+import os
+import shutil
+import struct
+import tempfile
+import time
+
+import _bootstrap  # noqa: F401
+from PyQt6.QtGui import QImage
+from synthetic_paks import METHOD_NONE, write_pak
+
+from baldursgate3 import SaveIndex
+
+# Screenshot size of BG3 saves
+SCREENSHOT_WIDTH = 640
+SCREENSHOT_HEIGHT = 360
+
+
+def save_info(index: int) -> bytes:
+    return json.dumps({
+        "Save Name": f"Save {index}",
+        "Current Level": "WLD_Main_A",
+        "Difficulty": ["Balanced"],
+        "Game Version": "4.1.1.6758295",
+        "Active Party": {"Characters": [{"Origin": "Tav", "Level": index % 12 + 1}, {"Origin": "Shadowheart", "Level": index % 12 + 1}]},
+    }).encode("utf-8")
+
+
+def build_story_folder(root, saves: int, save_kb: int):
+    # Story/<name>__<id>/<name>.lsv + <name>.webp, like the game writes them
+    paths = []
+    padding = b"\0" * (save_kb * 1024)
+    pixels = bytes(range(256)) * (SCREENSHOT_WIDTH * SCREENSHOT_HEIGHT * 4 // 256)
+    for i in range(saves):
+        folder = os.path.join(root, "Story", f"Save{i:04d}__{i:08x}")
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"Save{i:04d}.lsv")
+        write_pak(path, {"SaveInfo.json": save_info(i), "Globals.lsf": padding}, method=METHOD_NONE)
+        with open(os.path.splitext(path)[0] + ".webp", "wb") as f:
+            f.write(b"RIFF" + struct.pack("<II", SCREENSHOT_WIDTH, SCREENSHOT_HEIGHT) + pixels)
+        paths.append(path)
+    return paths
+
+
+def list_saves(root):
+    # What MO2 does before asking for any details: find the .lsv files
+    return sorted(
+        os.path.join(folder, name)
+        for folder, _, files in os.walk(os.path.join(root, "Story"))
+        for name in files if name.endswith(".lsv")
+    )
+
+
+def open_unindexed(root):
+    # Every save read and every screenshot decoded in full on each refresh
+    details = []
+    for path in list_saves(root):
+        info = SaveIndex.read_save_info(path)
+        QImage(os.path.splitext(path)[0] + ".webp")
+        details.append(SaveIndex.save_metadata(info))
+    return details
+
+
+def open_indexed(index, root, visible):
+    details = []
+    saves = list_saves(root)
+    for path in saves:
+        details.append(index.metadata(path))
+    for path in saves[:visible]:
+        index.thumbnail(path)
+    return details
+
+
+def timed(label, func, *args):
+    reads_before = read_count[0]
+    decoded_before = QImage.decoded
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    print(f"{label:>30}: {elapsed * 1000:9.1f} ms, {read_count[0] - reads_before:5} SaveInfo reads, {QImage.decoded - decoded_before:5} screenshots decoded")
+    return result, elapsed
+
+
+read_count = [0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the saves tab with and without the save index")
+    parser.add_argument("--saves", type=int, default=400)
+    parser.add_argument("--save-kb", type=int, default=2048, help="padding in every .lsv")
+    parser.add_argument("--visible", type=int, default=20, help="saves whose screenshot is displayed")
+    parser.add_argument("--budget-ms", type=float, default=1000.0, help="budget for opening the tab with the index")
+    args = parser.parse_args()
+
+    read_save_info = SaveIndex.read_save_info
+
+    def counting_read(path):
+        read_count[0] += 1
+        return read_save_info(path)
+
+    SaveIndex.read_save_info = counting_read
+    root = tempfile.mkdtemp(prefix="bg3_bench_")
+    try:
+        build_story_folder(root, args.saves, args.save_kb)
+        index_path = os.path.join(root, SaveIndex.INDEX_FILE_NAME)
+
+        unindexed, _ = timed("no index", open_unindexed, root)
+
+        index = SaveIndex.SaveIndex(index_path)
+        first, _ = timed("first open (builds index)", open_indexed, index, root, args.visible)
+        again, _ = timed("refresh", open_indexed, index, root, args.visible)
+        index.save()
+
+        restarted = SaveIndex.SaveIndex(index_path)
+        reads_before = read_count[0]
+        loaded, elapsed = timed("after restart", open_indexed, restarted, root, args.visible)
+        assert read_count[0] == reads_before, "saves re-read although the index is current"
+
+        # A save written since the index was stored is the only one read again
+        changed = list_saves(root)[0]
+        write_pak(changed, {"SaveInfo.json": save_info(args.saves), "Globals.lsf": b"\0"}, method=METHOD_NONE)
+        reads_before = read_count[0]
+        updated, _ = timed("one save overwritten", open_indexed, restarted, root, args.visible)
+        assert read_count[0] == reads_before + 1, "changed save not re-read exactly once"
+        assert updated[0]["Name"] == f"Save {args.saves}"
+
+        assert first == again == loaded == unindexed, "index details differ from reading the saves"
+        image = restarted.thumbnail(changed)
+        assert image.width() == SaveIndex.THUMBNAIL_WIDTH, "screenshot not scaled down"
+        print(f"index file {os.path.getsize(index_path) / 1024:.1f} KiB, {len(restarted._thumbnails)} screenshots cached")
+
+        if elapsed * 1000 > args.budget_ms:
+            raise SystemExit(f"opening the saves tab took {elapsed * 1000:.1f} ms, over the {args.budget_ms:.0f} ms budget")
+    finally:
+        SaveIndex.read_save_info = read_save_info
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# -*- encoding: utf-8 -*-
+
+# Importing a modsettings.lsx written by another mod manager. The pak cache is warmed
+# first, then the enabled modules are written back in a shuffled order (plus one module
+# no mod provides) and picked through the plugin's Tools menu action. Checks that no pak
+# is scanned, that mods without paks keep their priority, that the next launch writes the
+# imported order and that broken files are logged without touching the order.
+#
+#   python benchmarks/bench_settings_import.py --mods 500
+
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import _bootstrap
+
+ROOT = tempfile.mkdtemp(prefix="bg3_bench_")
+os.environ["LOCALAPPDATA"] = os.path.join(ROOT, "localappdata")
+
+game = _bootstrap.load_game_plugin()
+ModSettingsHelper = game.ModSettingsHelper
+SettingsImport = game.SettingsImport
+
+from mock_organizer import MockModList, MockOrganizer, MockProfile  # noqa: E402
+from PyQt6.QtWidgets import QFileDialog, QMainWindow, QMenu  # noqa: E402
+from synthetic_paks import build_library  # noqa: E402
+
+UNKNOWN_MODULE = ('UUID', 'ffffffff-0000-0000-0000-000000000000', 'FixedString')
+
+
+def module_uuids(path):
+    return [uuid for uuid, _ in SettingsImport.read_modsettings_modules(path)]
+
+
+def import_through_menu(window, path):
+    action = next(action for action in window.findChild(QMenu, "menuTools").actions() if "modsettings" in action.text())
+    QFileDialog.selected = (path, "")
+    try:
+        action.trigger()
+    finally:
+        QFileDialog.selected = ("", "")
+
+
+def check_broken_files(window, mod_list):
+    # Not XML, XML without a module list, and a file that is gone: logged, nothing moves
+    broken = {
+        "truncated.lsx": b'<?xml version="1.0" encoding="UTF-8"?>\n<save><region id="ModuleSettings"><node',
+        "config.lsx": b'<?xml version="1.0" encoding="UTF-8"?>\n<save><region id="Config"><node id="root"/></region></save>',
+    }
+    names = list(mod_list.names)
+    changes = mod_list.priority_changes
+    for name, data in broken.items():
+        path = os.path.join(ROOT, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        import_through_menu(window, path)
+    import_through_menu(window, os.path.join(ROOT, "missing.lsx"))
+    import_through_menu(window, "")  # Dialog cancelled
+    assert mod_list.priority_changes == changes and mod_list.names == names, "broken file moved mods"
+    print(f"{len(broken) + 2} broken, missing or cancelled imports: logged, no priority changes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark importing a modsettings.lsx into MO2 priorities")
+    parser.add_argument("--mods", type=int, default=500)
+    parser.add_argument("--separator-every", type=int, default=25, help="every Nth entry is a mod without paks")
+    parser.add_argument("--seed", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=1000.0)
+    args = parser.parse_args()
+
+    try:
+        names = build_library(ROOT, args.mods, files_per_pak=2)
+        mods_path = os.path.join(ROOT, "mods")
+        separators = []
+        for index in range(0, len(names), args.separator_every or len(names) + 1):
+            separator = f"Separator{index:04d}_separator"
+            os.makedirs(os.path.join(mods_path, separator), exist_ok=True)
+            separators.append((index + len(separators), separator))
+        for position, separator in separators:
+            names.insert(position, separator)
+
+        profile_path = os.path.join(ROOT, "profile")
+        overwrite_path = os.path.join(ROOT, "overwrite")
+        os.makedirs(overwrite_path, exist_ok=True)
+        mod_list = MockModList(mods_path, names)
+        organizer = MockOrganizer(mod_list, MockProfile(profile_path), overwrite_path, settings={"in_memory_extraction": True})
+        plugin = game.BaldursGate3Game()
+        plugin.init(organizer)
+        window = QMainWindow()
+        plugin.onUserInterfaceLoad(window)
+        plugin.onAboutToRun("bin/bg3.exe")  # Warm pak cache
+
+        # The other manager's order: every module shuffled, plus one that isn't installed
+        settings_path = os.path.join(profile_path, "modsettings.lsx")
+        modules, _ = ModSettingsHelper.load_order_modules(
+            ModSettingsHelper.ModsCache(profile_path), names, {mod: mod_list.state(mod) for mod in names}
+        )
+        gustav, mods = modules[0], modules[1:]
+        random.Random(args.seed).shuffle(mods)
+        imported_path = os.path.join(ROOT, "bg3mm_modsettings.lsx")
+        ModSettingsHelper.write_modsettings(imported_path, [gustav] + mods[:1] + [[UNKNOWN_MODULE]] + mods[1:])
+        expected = [uuid for uuid in module_uuids(imported_path) if uuid != UNKNOWN_MODULE[1]]
+
+        scans = []
+        scan_pak = ModSettingsHelper.scan_pak
+        ModSettingsHelper.scan_pak = lambda *a, **k: scans.append(a) or scan_pak(*a, **k)
+        separator_priorities = {separator: names.index(separator) for _, separator in separators}
+        try:
+            start = time.perf_counter()
+            import_through_menu(window, imported_path)
+            elapsed = time.perf_counter() - start
+        finally:
+            ModSettingsHelper.scan_pak = scan_pak
+        print(f"import of {len(mods)} modules: {elapsed * 1000:8.1f} ms, {mod_list.priority_changes} priority changes")
+
+        assert not scans, f"{len(scans)} paks scanned during the import"
+        assert {separator: mod_list.names.index(separator) for separator in separator_priorities} == separator_priorities, "separators moved"
+
+        # The next launch writes the imported order
+        plugin.onAboutToRun("bin/bg3.exe")
+        assert module_uuids(settings_path) == expected, "launch order differs from the imported file"
+
+        # Importing the same file again has nothing left to move
+        changes = mod_list.priority_changes
+        import_through_menu(window, imported_path)
+        assert mod_list.priority_changes == changes, "second import moved mods"
+
+        check_broken_files(window, mod_list)
+
+        if elapsed * 1000 > args.budget_ms:
+            raise SystemExit(f"import took {elapsed * 1000:.1f} ms, over the {args.budget_ms:.0f} ms budget")
+    finally:
+        shutil.rmtree(ROOT, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# -*- encoding: utf-8 -*-
+
+# Cost of loading the plugin the way MO2 does at startup: import game_baldursgate3,
+# construct the plugin and call init(). Each run happens in a fresh interpreter so
+# nothing is cached in sys.modules. Fails when the median goes over the budget, and
+# lists the heavy modules and cache helpers that got loaded before any hook ran.
+#
+#   python benchmarks/bench_startup.py --runs 9 --budget-ms 15
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Only needed once a hook scans paks, writes modsettings.lsx or starts Divine
+HEAVY_MODULES = ["sqlite3", "xml.etree.ElementTree", "xml.sax.saxutils", "subprocess", "tempfile", "concurrent.futures"]
+HELPERS = ["CacheWarmup", "ConflictIndex", "MappingHelper", "ModSettingsHelper", "PakCache", "SaveIndex", "ScriptExtenderHelper", "SettingsImport", "Tracing"]
+
+# Already imported in MO2's interpreter by basic_games and the other plugins by the time the
+# BG3 plugin loads, importing them again costs nothing there
+BASELINE_MODULES = ["json", "pathlib", "re", "shutil", "typing"]
+
+CHILD = r"""
+import importlib, json, os, sys, time
+for name in {baseline!r}:
+    importlib.import_module(name)
+sys.path.insert(0, {bench_dir!r})
+import _bootstrap
+from mock_organizer import MockModList, MockOrganizer, MockProfile
+import mobase, PyQt6.QtCore
+_bootstrap.install_basic_games()  # Loaded by MO2 before any game plugin
+
+root = {root!r}
+organizer = MockOrganizer(MockModList(os.path.join(root, "mods"), []), MockProfile(os.path.join(root, "profile")), os.path.join(root, "overwrite"))
+already = {{name for name in {heavy!r} if name in sys.modules}}
+
+start = time.perf_counter()
+game = _bootstrap.load_game_plugin()
+imported = time.perf_counter()
+plugin = game.BaldursGate3Game()
+plugin.init(organizer)
+initialised = time.perf_counter()
+
+helpers = [
+    name for name in {helpers!r}
+    if type(sys.modules.get("basic_games.games.baldursgate3." + name)).__name__ not in ("_LazyModule", "NoneType")
+]
+heavy = [name for name in {heavy!r} if name in sys.modules and name not in already]
+
+# The first hook pays for what init deferred
+plugin.onProfileCreated(organizer.profile())
+hooked = time.perf_counter()
+
+print(json.dumps({{
+    "import_ms": (imported - start) * 1000,
+    "init_ms": (initialised - imported) * 1000,
+    "first_hook_ms": (hooked - initialised) * 1000,
+    "helpers": helpers,
+    "heavy": heavy,
+}}))
+"""
+
+
+def run_child(root):
+    os.makedirs(os.path.join(root, "profile"), exist_ok=True)
+    os.makedirs(os.path.join(root, "overwrite"), exist_ok=True)
+    code = CHILD.format(bench_dir=BENCH_DIR, root=root, baseline=BASELINE_MODULES, heavy=HEAVY_MODULES, helpers=HELPERS)
+    env = dict(os.environ, LOCALAPPDATA=os.path.join(root, "localappdata"))
+    output = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True, env=env)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the BG3 plugin's import and init cost")
+    parser.add_argument("--runs", type=int, default=9)
+    parser.add_argument("--budget-ms", type=float, default=15.0, help="budget for import + init, median of the runs")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bg3_bench_") as root:
+        runs = [run_child(os.path.join(root, str(run))) for run in range(args.runs)]
+
+    import_ms = statistics.median(run["import_ms"] for run in runs)
+    init_ms = statistics.median(run["init_ms"] for run in runs)
+    first_hook_ms = statistics.median(run["first_hook_ms"] for run in runs)
+    total = import_ms + init_ms
+    print(f"import {import_ms:6.1f} ms, init {init_ms:6.1f} ms, total {total:6.1f} ms (budget {args.budget_ms:.1f} ms)")
+    print(f"first hook (onProfileCreated) {first_hook_ms:6.1f} ms")
+    print(f"helpers loaded before any hook: {', '.join(runs[-1]['helpers']) or 'none'}")
+    print(f"heavy modules loaded before any hook: {', '.join(runs[-1]['heavy']) or 'none'}")
+
+    if total > args.budget_ms:
+        sys.exit(f"import + init took {total:.1f} ms, over the {args.budget_ms:.1f} ms budget")
+
+
+if __name__ == "__main__":
+    main()
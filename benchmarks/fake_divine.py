@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+
+# Stand-in for LSLib's Divine.exe command line, enough for the calls ModSettingsHelper makes:
+#
+#   fake_divine.py -a extract-package -g bg3 -s <pak> -d <dir> -x "*/meta.lsx" -l off
+#   fake_divine.py -a list-package -g bg3 -s <pak>
+#   fake_divine.py -a serve          stand-in for tools/DivineWorker.ps1 (see DivineWorker.py)
+#
+# Paks are read with the plugin's own PakReader. BG3_FAKE_DIVINE_DELAY_MS adds a startup
+# delay (the real one pays for a .NET runtime start), BG3_FAKE_DIVINE_LOG names a file that
+# gets one "<action> <bytes written>" line per run or request so the harness can count its
+# disk writes. BG3_FAKE_DIVINE_CRASH_EVERY=N makes a serving worker die on every Nth request,
+# BG3_FAKE_DIVINE_WORKER_ERROR=1 makes it fail every request the way an LSLib API mismatch would.
+
+import argparse
+import fnmatch
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from baldursgate3.PakReader import PakError, open_pak  # noqa: E402
+
+
+def extract_package(source, destination, expression):
+    written = 0
+    with open_pak(source) as pak:
+        for entry in pak.entries():
+            if expression and not fnmatch.fnmatchcase(entry.name, expression):
+                continue
+            target = os.path.join(destination, *entry.name.split("/"))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            data = pak.read(entry)
+            with open(target, "wb") as f:
+                f.write(data)
+            written += len(data)
+    return written
+
+
+def list_package(source):
+    with open_pak(source) as pak:
+        for entry in pak.entries():
+            print(f"{entry.name}\t{entry.uncompressed_size}")
+    return 0
+
+
+def log_action(action, written):
+    log = os.environ.get("BG3_FAKE_DIVINE_LOG")
+    if log:
+        with open(log, "a") as f:
+            f.write(f"{action} {written}\n")
+
+
+def serve():
+    # One JSON request per line until stdin closes, the startup delay is only paid once
+    crash_every = int(os.environ.get("BG3_FAKE_DIVINE_CRASH_EVERY", "0"))
+    worker_error = os.environ.get("BG3_FAKE_DIVINE_WORKER_ERROR") == "1"
+    print(json.dumps({"ready": True, "protocol": 1}), flush=True)
+    for served, line in enumerate(sys.stdin, 1):
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        if crash_every and served % crash_every == 0:
+            os._exit(3)
+        try:
+            if worker_error:
+                response = {"ok": False, "kind": "worker", "error": "Method not found: LSLib.LS.PackageReader.Read"}
+            elif request["action"] == "extract-package":
+                log_action(request["action"], extract_package(request["source"], request["destination"], request.get("expression")))
+                response = {"ok": True}
+            elif request["action"] == "list-package":
+                with open_pak(request["source"]) as pak:
+                    response = {"ok": True, "files": [entry.name for entry in pak.entries()]}
+                log_action(request["action"], 0)
+            else:
+                response = {"ok": False, "kind": "worker", "error": f"Unsupported action {request['action']}"}
+        except (OSError, PakError) as e:
+            response = {"ok": False, "kind": "pak", "error": str(e)}
+        response["id"] = request.get("id")
+        print(json.dumps(response), flush=True)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Divine.exe stand-in for the benchmarks")
+    parser.add_argument("-a", "--action", required=True)
+    parser.add_argument("-g", "--game", default="bg3")
+    parser.add_argument("-s", "--source")
+    parser.add_argument("-d", "--destination")
+    parser.add_argument("-x", "--expression")
+    parser.add_argument("-l", "--loglevel", default="info")
+    args = parser.parse_args()
+
+    delay = int(os.environ.get("BG3_FAKE_DIVINE_DELAY_MS", "0"))
+    if delay:
+        time.sleep(delay / 1000)
+
+    if args.action == "serve":
+        return serve()
+
+    try:
+        if args.action == "extract-package":
+            written = extract_package(args.source, args.destination, args.expression)
+        elif args.action == "list-package":
+            written = list_package(args.source)
+        else:
+            print(f"Unsupported action {args.action}", file=sys.stderr)
+            return 1
+    except (OSError, PakError) as e:
+        print(f"Failed to open {args.source}: {e}", file=sys.stderr)
+        return 2
+
+    log_action(args.action, written)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
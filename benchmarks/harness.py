@@ -0,0 +1,156 @@
+# -*- encoding: utf-8 -*-
+
+# Per hook measurements for the plugin: wall time, subprocesses started, bytes written
+# and peak Python memory. Each scenario is a (setup, run) pair so it can be run twice
+# from the same starting state, once for the timings and once under tracemalloc (which
+# slows allocation heavy code down too much to share a run with the wall time).
+
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FAKE_DIVINE = os.path.join(BENCH_DIR, "fake_divine.py")
+
+
+class SubprocessCounter:
+    """Counts every process started through subprocess while installed."""
+
+    def __init__(self):
+        self.count = 0
+        self._original = None
+
+    def install(self):
+        counter = self
+        original = self._original = subprocess.Popen
+
+        class CountingPopen(original):
+            def __init__(self, *args, **kwargs):
+                counter.count += 1
+                super().__init__(*args, **kwargs)
+
+        subprocess.Popen = CountingPopen
+
+    def uninstall(self):
+        if self._original is not None:
+            subprocess.Popen = self._original
+            self._original = None
+
+
+def process_bytes_written():
+    # Bytes passed to write() by this process (Linux), None where /proc isn't available
+    try:
+        with open("/proc/self/io", "r") as f:
+            for line in f:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+class FakeDivine:
+    """Points ModSettingsHelper at fake_divine.py and collects what its runs wrote."""
+
+    def __init__(self, log_path, delay_ms=0):
+        self.log_path = log_path
+        self.delay_ms = delay_ms
+
+    def install(self, settings_helper, worker: bool = False):
+        # worker: serve the calls from one long-lived fake_divine.py -a serve per pool slot
+        settings_helper.close_divine_workers()
+        settings_helper.divine_worker_command = [sys.executable, FAKE_DIVINE, "-a", "serve"] if worker else None
+        if sys.platform == "win32":
+            # subprocess can't start a .py directly there, go through a launcher next to the log
+            launcher = os.path.splitext(self.log_path)[0] + "_divine.cmd"
+            with open(launcher, "w") as f:
+                f.write(f'@"{sys.executable}" "{FAKE_DIVINE}" %*\n')
+            settings_helper.divine_path = launcher
+        else:
+            settings_helper.divine_path = FAKE_DIVINE
+        os.environ["BG3_FAKE_DIVINE_LOG"] = self.log_path
+        os.environ["BG3_FAKE_DIVINE_DELAY_MS"] = str(self.delay_ms)
+
+    def bytes_written(self):
+        try:
+            with open(self.log_path, "r") as f:
+                return sum(int(line.split()[1]) for line in f if line.strip())
+        except OSError:
+            return 0
+
+
+class Result:
+    def __init__(self, name, wall, subprocesses, bytes_written, peak_memory):
+        self.name = name
+        self.wall = wall
+        self.subprocesses = subprocesses
+        self.bytes_written = bytes_written
+        self.peak_memory = peak_memory
+
+    def as_dict(self):
+        return {
+            "hook": self.name,
+            "wall_ms": round(self.wall * 1000, 3),
+            "subprocesses": self.subprocesses,
+            "bytes_written": self.bytes_written,
+            "peak_memory_bytes": self.peak_memory,
+        }
+
+
+class Harness:
+    def __init__(self, fake_divine=None):
+        self.fake_divine = fake_divine
+        self.counter = SubprocessCounter()
+        self.results = []
+
+    def measure(self, name, setup, run):
+        self.counter.install()
+        try:
+            setup()
+            divine_before = self.fake_divine.bytes_written() if self.fake_divine else 0
+            written_before = process_bytes_written()
+            subprocesses_before = self.counter.count
+
+            start = time.perf_counter()
+            run()
+            wall = time.perf_counter() - start
+
+            written_after = process_bytes_written()
+            subprocesses = self.counter.count - subprocesses_before
+            bytes_written = None
+            if written_before is not None and written_after is not None:
+                bytes_written = written_after - written_before
+                if self.fake_divine:
+                    bytes_written += self.fake_divine.bytes_written() - divine_before
+
+            setup()
+            tracemalloc.start()
+            try:
+                run()
+                peak_memory = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+        finally:
+            self.counter.uninstall()
+
+        result = Result(name, wall, subprocesses, bytes_written, peak_memory)
+        self.results.append(result)
+        return result
+
+    def report(self, out=sys.stdout):
+        out.write(f"{'hook':<32}{'wall ms':>12}{'procs':>8}{'written':>14}{'peak mem':>14}\n")
+        for result in self.results:
+            written = "n/a" if result.bytes_written is None else format_bytes(result.bytes_written)
+            out.write(
+                f"{result.name:<32}{result.wall * 1000:>12.2f}{result.subprocesses:>8}"
+                f"{written:>14}{format_bytes(result.peak_memory):>14}\n"
+            )
+
+
+def format_bytes(value):
+    for unit in ("B", "KiB", "MiB"):
+        if abs(value) < 1024 or unit == "MiB":
+            return f"{value:.0f} {unit}" if unit == "B" else f"{value:.1f} {unit}"
+        value /= 1024
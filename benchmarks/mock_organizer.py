@@ -0,0 +1,197 @@
+# -*- encoding: utf-8 -*-
+
+# In-process stand-ins for the mobase objects the plugin hooks receive.
+# Calls into the mod list are counted so benchmarks can report MO2 round trips, and can be
+# given a cost (call_cost, seconds) standing for the Python <-> C++ crossing of the real ones.
+
+import os
+import time
+
+# mobase.ModState flags
+MOD_STATE_EXISTS = 0x1
+MOD_STATE_ACTIVE = 0x2
+
+
+def cross(cost):
+    # Busy wait, a sleep can't be this short
+    if cost:
+        end = time.perf_counter() + cost
+        while time.perf_counter() < end:
+            pass
+
+
+class MockMod:
+    def __init__(self, name, path):
+        self._name = name
+        self._path = path
+
+    def name(self):
+        return self._name
+
+    def absolutePath(self):
+        return self._path
+
+
+class MockModList:
+    def __init__(self, mods_path, names, disabled=()):
+        self.mods_path = mods_path
+        self.names = list(names)
+        self.disabled = set(disabled)
+        self.calls = 0
+        self.call_cost = 0.0
+        self.priority_changes = 0
+        self.callbacks = {}
+
+    def getMod(self, name):
+        self.calls += 1
+        cross(self.call_cost)
+        if name not in self.names:
+            return None
+        return MockMod(name, os.path.join(self.mods_path, name))
+
+    def allMods(self):
+        self.calls += 1
+        cross(self.call_cost)
+        return sorted(self.names)
+
+    def allModsByProfilePriority(self):
+        self.calls += 1
+        cross(self.call_cost)
+        return list(self.names)
+
+    def priority(self, name):
+        self.calls += 1
+        cross(self.call_cost)
+        return self.names.index(name)
+
+    def setPriority(self, name, priority):
+        # Like MO2, the mod ends up at that priority and the ones in between shift by one
+        self.calls += 1
+        cross(self.call_cost)
+        self.priority_changes += 1
+        self.names.remove(name)
+        self.names.insert(priority, name)
+        return True
+
+    def state(self, name):
+        self.calls += 1
+        cross(self.call_cost)
+        if name not in self.names:
+            return 0
+        if name in self.disabled:
+            return MOD_STATE_EXISTS
+        return MOD_STATE_EXISTS | MOD_STATE_ACTIVE
+
+    def onModInstalled(self, callback):
+        self.callbacks.setdefault("onModInstalled", []).append(callback)
+        return True
+
+    def onModRemoved(self, callback):
+        self.callbacks.setdefault("onModRemoved", []).append(callback)
+        return True
+
+
+class MockProfile:
+    def __init__(self, path):
+        self._path = path
+
+    def absolutePath(self):
+        return self._path
+
+
+class MockOrganizer:
+    """Organizer whose virtual file system is the merge of the enabled mods (priority order)
+    plus overwrite, like MO2 presents it. listDirectories/findFiles are counted."""
+
+    def __init__(self, mod_list, profile, overwrite_path, settings=None, base_path=None):
+        self._mod_list = mod_list
+        self._profile = profile
+        self._overwrite_path = overwrite_path
+        self._base_path = base_path or os.path.dirname(overwrite_path)
+        self.settings = dict(settings or {})
+        self.callbacks = {}
+        self.calls = 0
+        self.call_cost = 0.0
+        self._vfs = None
+
+    def pluginSetting(self, plugin_name, key):
+        return self.settings.get(key)
+
+    def setPluginSetting(self, plugin_name, key, value):
+        old, self.settings[key] = self.settings.get(key), value
+        if old != value:
+            for callback in self.callbacks.get("onPluginSettingChanged", []):
+                callback(plugin_name, key, old, value)
+
+    def _register(self, hook, callback):
+        self.callbacks.setdefault(hook, []).append(callback)
+        return True
+
+    def onAboutToRun(self, callback):
+        return self._register("onAboutToRun", callback)
+
+    def onFinishedRun(self, callback):
+        return self._register("onFinishedRun", callback)
+
+    def onUserInterfaceInitialized(self, callback):
+        return self._register("onUserInterfaceInitialized", callback)
+
+    def onProfileCreated(self, callback):
+        return self._register("onProfileCreated", callback)
+
+    def onPluginSettingChanged(self, callback):
+        return self._register("onPluginSettingChanged", callback)
+
+    def modList(self):
+        return self._mod_list
+
+    def profile(self):
+        return self._profile
+
+    def overwritePath(self):
+        return self._overwrite_path
+
+    def basePath(self):
+        return self._base_path
+
+    def _virtual_tree(self):
+        # {virtual dir (lower case): ({sub dir names}, {file name (lower case): real path})}
+        if self._vfs is None:
+            self._vfs = {"": (set(), {})}
+            roots = [
+                os.path.join(self._mod_list.mods_path, name)
+                for name in self._mod_list.allModsByProfilePriority()
+                if self._mod_list.state(name) & MOD_STATE_ACTIVE
+            ]
+            for root in roots + [self._overwrite_path]:
+                for dirpath, dirs, files in os.walk(root):
+                    dirs[:] = [dir_ for dir_ in dirs if not dir_.endswith(".mohidden")]  # Hidden in MO2
+                    relative = os.path.relpath(dirpath, root)
+                    relative = "" if relative == "." else relative.replace(os.sep, "/").lower()
+                    entry = self._vfs.setdefault(relative, (set(), {}))
+                    entry[0].update(dirs)
+                    for file_ in files:
+                        if not file_.endswith(".mohidden"):
+                            entry[1][file_.lower()] = os.path.join(dirpath, file_)
+                    for dir_ in dirs:
+                        self._vfs.setdefault(f"{relative}/{dir_}".strip("/").lower(), (set(), {}))
+        return self._vfs
+
+    def listDirectories(self, directory):
+        self.calls += 1
+        cross(self.call_cost)
+        entry = self._virtual_tree().get(directory.replace("\\", "/").strip("/").lower())
+        return sorted(entry[0]) if entry else []
+
+    def findFiles(self, path, filter):
+        self.calls += 1
+        cross(self.call_cost)
+        entry = self._virtual_tree().get(path.replace("\\", "/").strip("/").lower())
+        if not entry:
+            return []
+        matches = []
+        for real in entry[1].values():
+            cross(self.call_cost)  # MO2 calls the Python filter from C++ for every file
+            if filter(real):
+                matches.append(real)
+        return matches
@@ -0,0 +1,75 @@
+# -*- encoding: utf-8 -*-
+
+# Minimal stand-in for PyQt6.QtCore.
+
+import os
+
+
+class QDir:
+    def __init__(self, path=""):
+        self._path = path
+
+    def path(self):
+        return self._path
+
+    def absoluteFilePath(self, name):
+        return os.path.join(self._path, name)
+
+
+class QFileInfo:
+    def __init__(self, *args):
+        self.args = args
+
+
+class QDirIterator:
+    pass
+
+
+class QFile:
+    pass
+
+
+class pyqtBoundSignal:
+    def __init__(self):
+        self._slots = []
+
+    def connect(self, slot):
+        self._slots.append(slot)
+
+    def emit(self, *args):
+        for slot in list(self._slots):
+            slot(*args)
+
+
+class QTimer:
+    # No event loop here, the owner calls fire() to run the timeout slots
+    def __init__(self, parent=None):
+        self.timeout = pyqtBoundSignal()
+        self._interval = 0
+        self._active = False
+
+    def setInterval(self, msec):
+        self._interval = msec
+
+    def start(self):
+        self._active = True
+
+    def stop(self):
+        self._active = False
+
+    def isActive(self):
+        return self._active
+
+    def fire(self):
+        if self._active:
+            self.timeout.emit()
+
+
+def qDebug(message):
+    pass
+
+
+class Qt:
+    class TransformationMode:
+        FastTransformation = 0
+        SmoothTransformation = 1
@@ -0,0 +1,58 @@
+# -*- encoding: utf-8 -*-
+
+# Minimal stand-in for PyQt6.QtGui. QImage "decodes" the fake screenshots written by
+# bench_saves.py: "RIFF", width and height (<II) and 4 bytes of pixel data per pixel.
+
+import struct
+
+from .QtCore import pyqtBoundSignal
+
+FAKE_IMAGE_HEADER = b"RIFF"
+
+
+class QImage:
+    decoded = 0  # Files decoded so far, for the benchmarks
+
+    def __init__(self, path=None, width=0, height=0, pixels=b""):
+        self._width = width
+        self._height = height
+        self._pixels = pixels
+        if path is not None:
+            with open(path, "rb") as f:
+                data = f.read()
+            if data[:4] == FAKE_IMAGE_HEADER and len(data) >= 12:
+                self._width, self._height = struct.unpack_from("<II", data, 4)
+                self._pixels = bytes(data[12:])
+            QImage.decoded += 1
+
+    def isNull(self):
+        return not self._width or not self._height
+
+    def width(self):
+        return self._width
+
+    def height(self):
+        return self._height
+
+    def sizeInBytes(self):
+        return len(self._pixels)
+
+    def scaledToWidth(self, width, mode=0):
+        height = max(1, self._height * width // self._width)
+        # Keep every nth row and column, enough to cost time proportional to the image
+        step = max(1, self._width // width)
+        rows = [self._pixels[row * self._width * 4:(row + 1) * self._width * 4] for row in range(0, self._height, step)]
+        pixels = b"".join(row[::step][:width * 4] for row in rows)[:width * height * 4]
+        return QImage(width=width, height=height, pixels=pixels)
+
+
+class QAction:
+    def __init__(self, text="", parent=None):
+        self._text = text
+        self.triggered = pyqtBoundSignal()
+
+    def text(self):
+        return self._text
+
+    def trigger(self):
+        self.triggered.emit(False)
@@ -0,0 +1,55 @@
+# -*- encoding: utf-8 -*-
+
+# Minimal stand-in for PyQt6.QtWidgets: menus hold QActions the benchmarks trigger, and
+# the open file dialog answers with whatever the benchmark put in QFileDialog.selected.
+
+from .QtGui import QAction
+
+
+class QMenu:
+    def __init__(self, title="", parent=None):
+        self._title = title
+        self._actions = []
+
+    def title(self):
+        return self._title
+
+    def addAction(self, text):
+        action = QAction(text, self)
+        self._actions.append(action)
+        return action
+
+    def actions(self):
+        return list(self._actions)
+
+
+class QMenuBar:
+    def __init__(self, parent=None):
+        self.menus = []
+
+    def addMenu(self, title):
+        menu = QMenu(title, self)
+        self.menus.append(menu)
+        return menu
+
+
+class QMainWindow:
+    # Holds MO2's "menuTools" menu, found by object name like on the real main window
+    def __init__(self):
+        self._menuBar = QMenuBar(self)
+        self._children = {"menuTools": QMenu("&Tools", self)}
+
+    def menuBar(self):
+        return self._menuBar
+
+    def findChild(self, kind, name=""):
+        child = self._children.get(name)
+        return child if isinstance(child, kind) else None
+
+
+class QFileDialog:
+    selected = ("", "")  # (path, filter) returned by the next getOpenFileName
+
+    @classmethod
+    def getOpenFileName(cls, parent=None, caption="", directory="", filter=""):
+        return cls.selected
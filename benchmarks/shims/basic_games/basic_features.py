@@ -0,0 +1,18 @@
+# -*- encoding: utf-8 -*-
+
+# Stand-ins for the basic_games feature classes the BG3 plugin registers.
+
+
+class BasicGameSaveGameInfo:
+    def __init__(self, get_preview=None, get_metadata=None, max_width=0):
+        self.get_preview = get_preview
+        self.get_metadata = get_metadata
+
+
+class BasicLocalSavegames:
+    def __init__(self, saves_directory):
+        self.saves_directory = saves_directory
+
+
+class BasicModDataChecker:
+    pass
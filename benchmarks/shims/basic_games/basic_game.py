@@ -0,0 +1,37 @@
+# -*- encoding: utf-8 -*-
+
+# Stand-in for basic_games.basic_game, enough to construct and init the BG3 plugin.
+
+from PyQt6.QtCore import QDir
+
+
+class BasicGame:
+    Name = ""
+
+    def __init__(self):
+        self._organizer = None
+        self._features = []
+        self._gamePath = ""
+
+    def init(self, organizer):
+        self._organizer = organizer
+        return True
+
+    def name(self):
+        return self.Name
+
+    def settings(self):
+        return []
+
+    def _register_feature(self, feature):
+        self._features.append(feature)
+        return True
+
+    def savesDirectory(self):
+        return ""
+
+    def setGamePath(self, path):
+        self._gamePath = path
+
+    def gameDirectory(self):
+        return QDir(self._gamePath)
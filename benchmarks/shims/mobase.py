@@ -0,0 +1,116 @@
+# -*- encoding: utf-8 -*-
+
+# Stand-in for MO2's mobase module with just enough behaviour for the benchmarks:
+# plugin base classes, Mapping/PluginSetting records and an in-memory IFileTree.
+
+
+class IModList:
+    pass
+
+
+class IProfile:
+    pass
+
+
+class IOrganizer:
+    pass
+
+
+class IPluginFileMapper:
+    def __init__(self):
+        pass
+
+
+class Mapping:
+    def __init__(self, source="", destination="", is_directory=False, create_target=False):
+        self.source = source
+        self.destination = destination
+        self.isDirectory = is_directory
+        self.createTarget = create_target
+
+
+class PluginSetting:
+    def __init__(self, key, description, default_value):
+        self.key = key
+        self.description = description
+        self.default_value = default_value
+
+
+class ExecutableInfo:
+    def __init__(self, title, binary):
+        self.title = title
+        self.binary = binary
+
+    def withArgument(self, argument):
+        return self
+
+
+class FileTreeEntry:
+    def __init__(self, name, parent=None):
+        self._name = name
+        self._parent = parent
+
+    def name(self):
+        return self._name
+
+    def parent(self):
+        return self._parent
+
+
+class IFileTree(FileTreeEntry):
+    MERGE = 1
+
+    def __init__(self, name="", parent=None):
+        super().__init__(name, parent)
+        self._entries = []
+
+    def __iter__(self):
+        return iter(list(self._entries))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def addFile(self, name):
+        entry = FileTreeEntry(name, self)
+        self._entries.append(entry)
+        return entry
+
+    def addDirectory(self, name):
+        for entry in self._entries:
+            if isinstance(entry, IFileTree) and entry.name().lower() == name.lower():
+                return entry
+        entry = IFileTree(name, self)
+        self._entries.append(entry)
+        return entry
+
+    def _detach(self, entry):
+        parent = entry.parent()
+        if parent is not None and entry in parent._entries:
+            parent._entries.remove(entry)
+        entry._parent = None
+
+    def remove(self, entry):
+        self._detach(entry)
+        return True
+
+    def move(self, entry, path, policy=MERGE):
+        target = self
+        for part in path.strip("/").split("/"):
+            if part:
+                target = target.addDirectory(part)
+        self._detach(entry)
+        entry._parent = target
+        target._entries.append(entry)
+        return True
+
+
+class ModDataChecker:
+    class CheckReturn(int):
+        pass
+
+    INVALID = CheckReturn(0)
+    FIXABLE = CheckReturn(1)
+    VALID = CheckReturn(2)
+
+    def __init__(self):
+        pass
@@ -0,0 +1,174 @@
+# -*- encoding: utf-8 -*-
+
+# Writer for small synthetic LSPK packages in the layout PakReader understands.
+# Compressed entries are emitted as literal only LZ4 blocks, which every LZ4 decoder accepts.
+
+import os
+import struct
+import zlib
+
+METHOD_NONE = 0
+METHOD_ZLIB = 1
+METHOD_LZ4 = 2
+
+_HEADER_15 = struct.Struct("<IQIBB16s")
+_HEADER_16 = struct.Struct("<IQIBB16sH")
+_ENTRY_15 = struct.Struct("<256sQQQIIII")
+_ENTRY_18 = struct.Struct("<256sIHBBII")
+
+META_LSX = """<?xml version="1.0" encoding="UTF-8"?>
+<save>
+    <version major="4" minor="0" revision="9" build="331"/>
+    <region id="Config">
+        <node id="root">
+            <children>
+                <node id="Dependencies">
+                    <children>{dependencies}
+                    </children>
+                </node>
+                <node id="ModuleInfo">
+                    <attribute id="Author" type="LSString" value="Synthetic"/>
+                    <attribute id="CharacterCreationLevelName" type="FixedString" value=""/>
+                    <attribute id="Description" type="LSString" value="{description}"/>
+                    <attribute id="Folder" type="LSString" value="{folder}"/>
+                    <attribute id="LobbyLevelName" type="FixedString" value=""/>
+                    <attribute id="MD5" type="LSString" value=""/>
+                    <attribute id="MainMenuBackgroundVideo" type="FixedString" value=""/>
+                    <attribute id="MenuLevelName" type="FixedString" value=""/>
+                    <attribute id="Name" type="LSString" value="{name}"/>
+                    <attribute id="NumPlayers" type="uint8" value="4"/>
+                    <attribute id="PhotoBooth" type="FixedString" value=""/>
+                    <attribute id="PublishHandle" type="uint64" value="0"/>
+                    <attribute id="StartupLevelName" type="FixedString" value=""/>
+                    <attribute id="Tags" type="LSString" value=""/>
+                    <attribute id="Type" type="FixedString" value="Add-on"/>
+                    <attribute id="UUID" type="FixedString" value="{uuid}"/>
+                    <attribute id="Version64" type="int64" value="{version64}"/>
+                    <children>
+                        <node id="PublishVersion">
+                            <attribute id="Version64" type="int64" value="{version64}"/>
+                        </node>
+                        <node id="Scripts"/>
+                        <node id="TargetModes">
+                            <children>
+                                <node id="Target">
+                                    <attribute id="Object" type="FixedString" value="Story"/>
+                                </node>
+                            </children>
+                        </node>
+                    </children>
+                </node>
+            </children>
+        </node>
+    </region>
+</save>
+"""
+
+DEPENDENCY = """
+                        <node id="ModuleShortDesc">
+                            <attribute id="Folder" type="LSString" value="{folder}"/>
+                            <attribute id="MD5" type="LSString" value=""/>
+                            <attribute id="Name" type="LSString" value="{folder}"/>
+                            <attribute id="PublishHandle" type="uint64" value="0"/>
+                            <attribute id="UUID" type="FixedString" value="{uuid}"/>
+                            <attribute id="Version64" type="int64" value="36028797018963968"/>
+                        </node>"""
+
+
+def mod_uuid(index: int) -> str:
+    return f"{index:08x}-5e1f-4c3a-9d2b-{index:012x}"
+
+
+def meta_lsx(folder, name=None, uuid="00000000-0000-0000-0000-000000000000", dependencies=(), description="", version64=36028797018963968) -> bytes:
+    deps = "".join(DEPENDENCY.format(folder=dep_folder, uuid=dep_uuid) for dep_folder, dep_uuid in dependencies)
+    return META_LSX.format(
+        folder=folder,
+        name=name or folder,
+        uuid=uuid,
+        dependencies=deps,
+        description=description,
+        version64=version64,
+    ).encode("utf-8")
+
+
+def lz4_literals(data: bytes) -> bytes:
+    # A single LZ4 sequence holding every byte as a literal
+    out = bytearray()
+    length = len(data)
+    if length >= 15:
+        out.append(0xF0)
+        remaining = length - 15
+        while remaining >= 255:
+            out.append(255)
+            remaining -= 255
+        out.append(remaining)
+    else:
+        out.append(length << 4)
+    out += data
+    return bytes(out)
+
+
+def _compress(data: bytes, method: int):
+    if method == METHOD_LZ4:
+        return lz4_literals(data), len(data)
+    if method == METHOD_ZLIB:
+        return zlib.compress(data), len(data)
+    return data, 0
+
+
+def write_pak(path, files: dict, version: int = 18, method: int = METHOD_LZ4):
+    header = _HEADER_16 if version >= 16 else _HEADER_15
+    entry_struct = _ENTRY_18 if version >= 18 else _ENTRY_15
+    offset = 4 + header.size
+
+    body = bytearray()
+    table = bytearray()
+    for name, data in files.items():
+        stored, uncompressed = _compress(data, method)
+        name_bytes = name.encode("utf-8").ljust(256, b"\0")
+        if version >= 18:
+            table += entry_struct.pack(name_bytes, offset & 0xFFFFFFFF, offset >> 32, 0, method, len(stored), uncompressed)
+        else:
+            table += entry_struct.pack(name_bytes, offset, len(stored), uncompressed, 0, method, 0, 0)
+        body += stored
+        offset += len(stored)
+
+    compressed_table = lz4_literals(bytes(table))
+    file_list = struct.pack("<II", len(files), len(compressed_table)) + compressed_table
+    if version >= 16:
+        header_bytes = header.pack(version, offset, len(file_list), 0, 0, b"\0" * 16, 1)
+    else:
+        header_bytes = header.pack(version, offset, len(file_list), 0, 0, b"\0" * 16)
+
+    with open(path, "wb") as f:
+        f.write(b"LSPK")
+        f.write(header_bytes)
+        f.write(body)
+        f.write(file_list)
+
+
+def write_mod_pak(path, folder, uuid, extra_files: int = 20, dependencies=(), override=False, version=18):
+    # Regular mods ship Public/<Folder>, override mods only replace game data
+    public = "Game" if override else folder
+    files = {f"Mods/{folder}/meta.lsx": meta_lsx(folder, uuid=uuid, dependencies=dependencies)}
+    for i in range(extra_files):
+        files[f"Public/{public}/Stats/Generated/Data/Data_{i}.txt"] = f"new entry \"{folder}_{i}\"\n".encode("utf-8") * 8
+    write_pak(path, files, version=version)
+
+
+def build_library(root, mods: int, paks_per_mod: int = 1, files_per_pak: int = 20, override_every: int = 0):
+    # <root>/mods/<Mod>/PAK_FILES/*.pak plus an empty <root>/profile, returns the mod names in priority order
+    names = []
+    mods_path = os.path.join(root, "mods")
+    for i in range(mods):
+        name = f"SyntheticMod{i:04d}"
+        pak_folder = os.path.join(mods_path, name, "PAK_FILES")
+        os.makedirs(pak_folder, exist_ok=True)
+        for p in range(paks_per_mod):
+            index = i * paks_per_mod + p
+            folder = f"{name}_{p}"
+            override = bool(override_every) and index % override_every == override_every - 1
+            write_mod_pak(os.path.join(pak_folder, f"{folder}.pak"), folder, mod_uuid(index), extra_files=files_per_pak, override=override)
+        names.append(name)
+    os.makedirs(os.path.join(root, "profile"), exist_ok=True)
+    return names
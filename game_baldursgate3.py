@@ -1,16 +1,44 @@
 # -*- encoding: utf-8 -*-
 
-import os, shutil, json
+import os, time, sys
+import importlib.util
 from typing import List, Optional
 from pathlib import Path
-from PyQt6.QtCore import QDir, QFileInfo, QDirIterator, QFile, QFileInfo, qDebug
+from PyQt6.QtCore import QDir, QFileInfo, QTimer, qDebug
 
 import mobase # type: ignore
 
-from ..basic_features import BasicGameSaveGameInfo, BasicLocalSavegames, BasicModDataChecker
+from ..basic_features import BasicGameSaveGameInfo, BasicLocalSavegames
 from ..basic_game import BasicGame
 
-from .baldursgate3 import ModSettingsHelper
+def lazyModule(name: str): # Import whose module only runs when one of its attributes is first used
+    fullName = importlib.util.resolve_name(name, __package__)
+    if fullName in sys.modules:
+        return sys.modules[fullName]
+    spec = importlib.util.find_spec(fullName)
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[fullName] = module
+    spec.loader.exec_module(module)
+    return module
+
+# MO2 imports every game plugin at startup, the helpers (sqlite3, ElementTree, hashlib, thread
+# pools...) are only loaded once a BG3 hook needs them
+CacheWarmup = lazyModule(".baldursgate3.CacheWarmup")
+ConflictIndex = lazyModule(".baldursgate3.ConflictIndex")
+MappingHelper = lazyModule(".baldursgate3.MappingHelper")
+ModSettingsHelper = lazyModule(".baldursgate3.ModSettingsHelper")
+PakCache = lazyModule(".baldursgate3.PakCache")
+SaveIndex = lazyModule(".baldursgate3.SaveIndex")
+ScriptExtenderHelper = lazyModule(".baldursgate3.ScriptExtenderHelper")
+SettingsImport = lazyModule(".baldursgate3.SettingsImport")
+Tracing = lazyModule(".baldursgate3.Tracing")
+
+def larianPath(*parts) -> Optional[str]: # %LOCALAPPDATA%/Larian Studios/Baldur's Gate 3, None without an absolute LOCALAPPDATA
+    local_app_data = os.getenv("LOCALAPPDATA")
+    if not local_app_data or not os.path.isabs(local_app_data):
+        return None
+    return os.path.join(local_app_data, "Larian Studios", "Baldur's Gate 3", *parts)
 
 class BaldursGate3Game(BasicGame, mobase.IPluginFileMapper):
     Name = "Baldur's Gate 3 Unofficial Support Plugin"
@@ -27,14 +55,6 @@ class BaldursGate3Game(BasicGame, mobase.IPluginFileMapper):
     GameBinary = "bin/bg3.exe"
     GameDataPath = "Data"
     GameSaveExtension = "lsv"
-    GameDocumentsDirectory = (
-        os.getenv("LOCALAPPDATA")
-        + "/Larian Studios/Baldur's Gate 3/PlayerProfiles/Public/"
-    )
-    GameSavesDirectory = (
-        os.getenv("LOCALAPPDATA")
-        + "/Larian Studios/Baldur's Gate 3/PlayerProfiles/Public/Savegames/Story"
-    )
     GameIniFiles = ["modsettings.lsx", "config.lsf", "profile8.lsf", "UILayout.lsx"]
 
     PAK_MOD_PREFIX = "PAK_FILES"
@@ -43,17 +63,27 @@ class BaldursGate3Game(BasicGame, mobase.IPluginFileMapper):
     def __init__(self):
         BasicGame.__init__(self)
         mobase.IPluginFileMapper.__init__(self)
+        self._seConfigMappings = None  # Created by the first mappings() call
+        self._pakFileMappings = None
+        self._warmup = None
+        self._warmupTimer = None
+        self._pakCacheReady = False
+        self._saveIndex = None  # Created the first time the saves tab asks for a save's details
 
     def init(self, organizer: mobase.IOrganizer):
         super().init(organizer)
 
-        self._register_feature(BasicGameSaveGameInfo(
-            lambda s: s.with_suffix(".webp")
-        ))
-
         self._register_feature(BaldursGate3ModDataChecker())
 
-        self._register_feature(BasicLocalSavegames(self.savesDirectory()))
+        # Saves live below the Larian folder, without it MO2 has no saves to show or swap per profile
+        if larianPath() is not None:
+            self._register_feature(BasicGameSaveGameInfo(
+                lambda s: self.saveIndex().thumbnail(s),
+                lambda s, save: self.saveIndex().metadata(s),
+            ))
+            self._register_feature(BasicLocalSavegames(self.savesDirectory()))
+        else:
+            qDebug("BG3: LOCALAPPDATA is not set to an absolute path, save games are not managed")
         
         self._organizer.modList().onModInstalled(self.onModInstalled)
         self._organizer.modList().onModRemoved(self.onModRemoved)
@@ -66,6 +96,75 @@ class BaldursGate3Game(BasicGame, mobase.IPluginFileMapper):
 
         return True
 
+    def settings(self) -> List[mobase.PluginSetting]:
+        return [
+            mobase.PluginSetting(
+                "scan_workers",
+                "Number of pak files scanned in parallel when updating the mod cache (0 = one per CPU core)",
+                0,
+            ),
+            mobase.PluginSetting(
+                "in_memory_extraction",
+                "Read meta.lsx directly from pak files in memory, Divine.exe and a temporary folder are only used as a fallback",
+                True,
+            ),
+            mobase.PluginSetting(
+                "background_warmup",
+                "Scan new or changed pak files in the background once MO2 has started, instead of when the game is launched",
+                True,
+            ),
+            mobase.PluginSetting(
+                "sort_by_dependencies",
+                "Move mods after the mods they depend on (meta.lsx Dependencies) in modsettings.lsx, otherwise MO2's priority order is kept as is",
+                False,
+            ),
+            mobase.PluginSetting(
+                "conflict_report",
+                "Write the files that more than one enabled mod's paks provide to bg3_conflicts.txt in the profile folder on launch",
+                False,
+            ),
+            mobase.PluginSetting(
+                "trace_hooks",
+                "Write timing traces of the plugin hooks (Chrome trace format) to the bg3_traces folder of the profile",
+                False,
+            ),
+        ]
+
+    def _scanWorkers(self) -> int:
+        try:
+            return max(0, int(self._organizer.pluginSetting(self.name(), "scan_workers")))
+        except (TypeError, ValueError):
+            return 0
+
+    def _inMemoryExtraction(self) -> bool:
+        return bool(self._organizer.pluginSetting(self.name(), "in_memory_extraction"))
+
+    def _traceHook(self, hook: str, **args):
+        Tracing.tracer.enabled = bool(self._organizer.pluginSetting(self.name(), "trace_hooks"))
+        return Tracing.tracer.hook(hook, self._organizer.profile().absolutePath(), **args)
+
+    def documentsDirectory(self) -> QDir:
+        # Without the Larian folder the game folder stands in, QDir("") would be MO2's working directory
+        path = larianPath("PlayerProfiles", "Public")
+        return QDir(path) if path else self.gameDirectory()
+
+    def savesDirectory(self) -> QDir:
+        path = larianPath("PlayerProfiles", "Public", "Savegames", "Story")
+        return QDir(path) if path else self.gameDirectory()
+
+    def _initPakCache(self):
+        # One pak cache for the whole instance, every profile uses the same mods folder
+        if not self._pakCacheReady:
+            PakCache.set_instance_path(self._organizer.basePath())
+            self._pakCacheReady = True
+
+    def saveIndex(self):
+        if self._saveIndex is None:
+            import atexit
+            self._saveIndex = SaveIndex.SaveIndex(os.path.join(self._organizer.basePath(), SaveIndex.INDEX_FILE_NAME))
+            atexit.register(self._saveIndex.save)
+        return self._saveIndex
+
     def executables(self):
         return [
             mobase.ExecutableInfo(
@@ -81,288 +180,341 @@ class BaldursGate3Game(BasicGame, mobase.IPluginFileMapper):
         ]
 
     def mappings(self) -> List[mobase.Mapping]:
+        with self._traceHook("mappings"):
+            return self._buildMappings()
+
+    def _buildMappings(self) -> List[mobase.Mapping]:
+        start = time.perf_counter()
         map = []
 
-        appdata_path = QDir(os.getenv("LOCALAPPDATA") + "/Larian Studios/Baldur's Gate 3/")
-         
-        modDirs = [self.PAK_MOD_PREFIX]
-        self._listDirsRecursive(modDirs, prefix=self.PAK_MOD_PREFIX)
-        for dir_ in modDirs:
-            for file_ in self._organizer.findFiles(path=dir_, filter=lambda x: True):
-                m = mobase.Mapping()
-                m.createTarget = True
-                m.isDirectory = False
-                m.source = file_
-                m.destination = os.path.join(
-                    appdata_path.absoluteFilePath("Mods"),
-                    file_.split(self.PAK_MOD_PREFIX)[1].strip("\\").strip("/"),
-                )
-                map.append(m)
+        if self._pakFileMappings is None:
+            self._pakFileMappings = MappingHelper.PakFileMappingCache()
+            self._seConfigMappings = ScriptExtenderHelper.SEConfigMappingCache()
+
+        larian_path = larianPath()
+        if larian_path is None:
+            # Every destination lives below it, don't map (or create folders) relative to MO2's working directory
+            qDebug("BG3 mappings: LOCALAPPDATA is not set to an absolute path, nothing is mapped")
+            return map
+        appdata_path = QDir(larian_path)
+        
+        modList = self._organizer.modList()
+        activeModPaths = [
+            modList.getMod(mod).absolutePath()
+            for mod in modList.allModsByProfilePriority()
+            if int(modList.state(mod) / 2) % 2 != 0
+        ]
+        
+        # PAK_FILES of every enabled mod plus overwrite, walked in one pass in priority order
+        pak_folders = [os.path.join(mod_path, self.PAK_MOD_PREFIX) for mod_path in activeModPaths]
+        pak_folders.append(os.path.join(self._organizer.overwritePath(), self.PAK_MOD_PREFIX))
+        with Tracing.span("PAK_FILES mappings", mods=len(activeModPaths)):
+            pak_mappings = self._pakFileMappings.mappings(pak_folders, appdata_path.absoluteFilePath("Mods"))
+        for source, destination, is_directory in pak_mappings:
+            m = mobase.Mapping()
+            m.createTarget = True
+            m.isDirectory = is_directory
+            m.source = source
+            m.destination = destination
+            map.append(m)
         
         # configDirs = [self.SCRIPT_EXTENDER_CONFIG_PREFIX]
         # self._listDirsRecursive(configDirs, prefix=self.SCRIPT_EXTENDER_CONFIG_PREFIX)
         
-        Path(QDir(os.getenv("LOCALAPPDATA") + "/Larian Studios/Baldur's Gate 3/").absoluteFilePath("Script Extender")).mkdir(parents=True, exist_ok=True)
-        Path(QDir(os.getenv("LOCALAPPDATA") + "/Larian Studios/Baldur's Gate 3/").absoluteFilePath("Mods")).mkdir(parents=True, exist_ok=True)
+        Path(appdata_path.absoluteFilePath("Script Extender")).mkdir(parents=True, exist_ok=True)
+        Path(appdata_path.absoluteFilePath("Mods")).mkdir(parents=True, exist_ok=True)
         
-        modList = self._organizer.modList()
-        for mod in modList.allMods():
-            if not (int(modList.state(mod) / 2) % 2 != 0):
-                continue  # Skip disabled mods
-
-            mod_source_path = modList.getMod(mod).absolutePath()
-            se_config_path = os.path.join(mod_source_path, "SE_CONFIG")
-
-            # Map the folders/files from SE_CONFIG in this mod
-            for root, dirs, files in os.walk(mod_source_path):
-                if "SE_CONFIG" in root:
-                    # Calculate the relative path from SE_CONFIG
-                    relative_path = os.path.relpath(root, se_config_path)
-
-                    # Map directories
-                    for dir_ in dirs:
-                        m = mobase.Mapping()
-                        m.createTarget = True
-                        m.isDirectory = True
-                        m.source = os.path.join(root, dir_)
-                        m.destination = os.path.join(
-                            QDir(os.getenv("LOCALAPPDATA") + "/Larian Studios/Baldur's Gate 3/").absoluteFilePath("Script Extender"),
-                            relative_path,
-                            dir_.strip("\\").strip("'/")
-                        )
-                        map.append(m)
-
-                    # Map files
-                    for file_ in files:
-                        m = mobase.Mapping()
-                        m.createTarget = True
-                        m.isDirectory = False
-                        m.source = os.path.join(root, file_)
-                        m.destination = os.path.join(
-                            QDir(os.getenv("LOCALAPPDATA") + "/Larian Studios/Baldur's Gate 3/").absoluteFilePath("Script Extender"),
-                            relative_path,
-                            file_.strip("\\").strip("'/")
-                        )
-                        map.append(m)
+        # Map the folders/files from SE_CONFIG of every enabled mod, a later mod wins a file
+        se_config_destination = appdata_path.absoluteFilePath("Script Extender")
+        with Tracing.span("SE_CONFIG mappings", mods=len(activeModPaths)):
+            se_mappings = self._seConfigMappings.mappings(activeModPaths, se_config_destination)
+        for source, destination, is_directory in se_mappings:
+            m = mobase.Mapping()
+            m.createTarget = True
+            m.isDirectory = is_directory
+            m.source = source
+            m.destination = destination
+            map.append(m)
                         
         map.append(
             mobase.Mapping(
                 source = self._organizer.profile().absolutePath() + "/modsettings.lsx",
-                destination = self.GameDocumentsDirectory + "/modsettings.lsx",
+                destination = self.documentsDirectory().absoluteFilePath("modsettings.lsx"),
                 is_directory = False,
             )
         )
         
+        qDebug(
+            f"BG3 mappings: {len(map)} mappings in {(time.perf_counter() - start) * 1000:.1f} ms, "
+            f"PAK_FILES {self._pakFileMappings.file_count} files -> {len(pak_mappings)}, "
+            f"SE_CONFIG {self._seConfigMappings.file_count} files -> {len(se_mappings)}"
+        )
         return map
 
-    def _listDirsRecursive(self, dirs_list, prefix=""):
-        dirs = self._organizer.listDirectories(prefix)
-        for dir_ in dirs:
-            dir_ = os.path.join(prefix, dir_)
-            dirs_list.append(dir_)
-            self._listDirsRecursive(dirs_list, dir_)
-            
     def onUserInterfaceLoad(self, window) -> None:
+        self._initPakCache()
         profile = self._organizer.profile()
-        profilePath = profile.absolutePath()
-        mods_cache_path = os.path.join(profilePath, "modsCache.json")
-        
-        if not os.path.exists(mods_cache_path):
-            with open(mods_cache_path, 'w') as file:
-                    json.dump({}, file)
+        # Creates the cache database on first use
+        PakCache.create_store(profile.absolutePath())
+
+        if self._organizer.pluginSetting(self.name(), "background_warmup"):
+            self._warmup = CacheWarmup.CacheWarmup.start(
+                self._organizer.modList(), profile.absolutePath(), self._scanWorkers(), self._inMemoryExtraction()
+            )
+            self._showWarmupProgress(window)
+        self._addImportAction(window)
         return True
+
+    def _showWarmupProgress(self, window):
+        # Worker threads can't touch widgets, poll the job from the UI thread instead
+        statusBar = window.statusBar() if hasattr(window, "statusBar") else None
+        if statusBar is None:
+            return
+
+        warmup = self._warmup
+        timer = QTimer(window)
+        timer.setInterval(250)
+
+        def update():
+            if warmup.finished:
+                timer.stop()
+                statusBar.showMessage(warmup.status(), 5000)
+            else:
+                statusBar.showMessage(warmup.status())
+
+        timer.timeout.connect(update)
+        timer.start()
+        self._warmupTimer = timer
+
+    def _waitForWarmup(self):
+        warmup, self._warmup = self._warmup, None
+        if warmup is None or warmup.finished:
+            return
+        # A warm-up of another profile is stopped after its current batch, generateSettings scans this one
+        if warmup.profilePath != self._organizer.profile().absolutePath():
+            warmup.cancel()
+        with Tracing.span("wait for warm-up", done=warmup.done, total=warmup.total):
+            warmup.wait()
     
     def onProfileCreated(self, profile) -> None:
-        profilePath = profile.absolutePath()
-        mods_cache_path = os.path.join(profilePath, "modsCache.json")
-        
-        if not os.path.exists(mods_cache_path):
-            with open(mods_cache_path, 'w') as file:
-                    json.dump({}, file)
+        # Nothing to scan, the new profile reads the instance's pak cache
+        self._initPakCache()
+        PakCache.create_store(profile.absolutePath())
         return True
 
     def onModInstalled(self, mod) -> bool:
-        ModSettingsHelper.modInstalled(self._organizer.modList(), self._organizer.profile(), mod.name())    
+        with self._traceHook("onModInstalled", mod=mod.name()):
+            self._initPakCache()
+            if self._warmup is not None:
+                self._warmup.modChanged(mod.name())
+            ModSettingsHelper.modInstalled(self._organizer.modList(), self._organizer.profile(), mod.name(), self._scanWorkers(), self._inMemoryExtraction())
         return True
     
     def onModRemoved(self, mod) -> bool:
+        self._initPakCache()
+        if self._warmup is not None:
+            self._warmup.modChanged(mod)
         ModSettingsHelper.modRemoved(self._organizer.modList(), self._organizer.profile(), mod)
         return True
 
     def onAboutToRun(self, mod):
-        ModSettingsHelper.generateSettings(self._organizer.modList(), self._organizer.profile())
+        with self._traceHook("onAboutToRun"):
+            self._initPakCache()
+            if self._saveIndex is not None:
+                self._saveIndex.save()
+            self._waitForWarmup()
+            ModSettingsHelper.generateSettings(
+                self._organizer.modList(),
+                self._organizer.profile(),
+                self._scanWorkers(),
+                self._inMemoryExtraction(),
+                bool(self._organizer.pluginSetting(self.name(), "sort_by_dependencies")),
+            )
+            if self._organizer.pluginSetting(self.name(), "conflict_report"):
+                self._writeConflictReport()
         return True
 
+    def _writeConflictReport(self):
+        modList = self._organizer.modList()
+        activeMods = [mod for mod in modList.allModsByProfilePriority() if int(modList.state(mod) / 2) % 2 != 0]
+        with Tracing.span("conflict report", mods=len(activeMods)):
+            groups = ConflictIndex.write_conflict_report(self._organizer.profile().absolutePath(), activeMods)
+        qDebug(f"BG3 conflict report: {groups} groups of mods share pak files")
+
+    def _addImportAction(self, window):
+        # Tools menu entry to reorder the current profile's mods after a modsettings.lsx (from BG3 Mod Manager...)
+        if not hasattr(window, "menuBar"):
+            return
+        from PyQt6.QtWidgets import QMenu
+        menu = window.findChild(QMenu, "menuTools") or window.menuBar().addMenu("Baldur's Gate 3")
+        action = menu.addAction("Import BG3 modsettings.lsx...")
+        action.triggered.connect(lambda checked=False: self._chooseModSettings(window))
+
+    def _chooseModSettings(self, window):
+        from PyQt6.QtWidgets import QFileDialog
+        path, _ = QFileDialog.getOpenFileName(
+            window, "Import modsettings.lsx", larianPath("PlayerProfiles", "Public") or "", "modsettings (*.lsx)"
+        )
+        if path:
+            self._importModSettings(path)
+
+    def _importModSettings(self, path: str):
+        if not os.path.isfile(path):
+            qDebug(f"BG3 modsettings import: {path} not found")
+            return
+        start = time.perf_counter()
+        with self._traceHook("import modsettings.lsx"):
+            self._initPakCache()
+            stats = SettingsImport.import_modsettings(self._organizer.modList(), self._organizer.profile(), path)
+        if stats is None:
+            return
+
+        for uuid, folder in stats["unresolved"]:
+            qDebug(f"BG3 modsettings import: no installed mod provides {folder or '?'} ({uuid})")
+        for mod in stats["disabled"]:
+            qDebug(f"BG3 modsettings import: {mod} is listed but disabled")
+        qDebug(
+            f"BG3 modsettings import: {stats['modules']} modules, {stats['mods']} mods ordered, "
+            f"{stats['moved']} moved, {len(stats['unresolved'])} unresolved, in {(time.perf_counter() - start) * 1000:.1f} ms"
+        )
+
     def onFinishedRun(self, path: str, integer: int) -> bool:
-        seDir = os.path.join(os.getenv("LOCALAPPDATA"), "Larian Studios", "Baldur's Gate 3", "Script Extender")
+        seDir = larianPath("Script Extender")
         mo2_se_config_dir = os.path.join(self._organizer.overwritePath(), "SE_CONFIG")
 
-        if not os.path.isdir(seDir): return True
+        if seDir is None or not os.path.isdir(seDir): return True
         
-        configDirs = [seDir]
-        
-        self._listDirsRecursive(configDirs, prefix=seDir)
-
-        for dir_ in configDirs:
-            if os.path.exists(dir_):
-                for file_ in os.listdir(dir_):
-                    full_src_path = os.path.join(dir_, file_)
-                    
-                    if os.path.isdir(full_src_path):
-                        # Construct destination path keeping only the last part of the directory
-                        dest_path = os.path.join(mo2_se_config_dir, os.path.basename(full_src_path))
-
-                        if not os.path.exists(dest_path):
-                            os.makedirs(dest_path)
-
-                        # Move all contents of the directory
-                        for root, subdirs, files in os.walk(full_src_path):
-                            for file_ in files:
-                                file_src = os.path.join(root, file_)
-                                file_dest = os.path.join(dest_path, os.path.relpath(file_src, full_src_path))  # Maintain structure
-                                file_dest_dir = os.path.dirname(file_dest)
-                                
-                                if not os.path.exists(file_dest_dir):
-                                    os.makedirs(file_dest_dir)
-
-                                shutil.move(file_src, file_dest)
-
-                        # Remove the source directory after moving its contents
-                        shutil.rmtree(full_src_path)
-
-                    elif os.path.isfile(full_src_path):
-                        # For files, move directly under the target folder
-                        dest_path = os.path.join(mo2_se_config_dir, os.path.basename(dir_))  # Keep only the last part of dir_
-
-                        if not os.path.exists(dest_path):
-                            os.makedirs(dest_path)
-
-                        shutil.move(full_src_path, os.path.join(dest_path, file_))
-
-                # Remove the current directory after processing all files and subdirectories
-                if os.path.isdir(dir_):
-                    os.rmdir(dir_)
+        start = time.perf_counter()
+        with self._traceHook("onFinishedRun"):
+            stats = ScriptExtenderHelper.sync_se_config(seDir, mo2_se_config_dir)
+
+            # Remove the Script Extender folder once everything has been moved out
+            os.rmdir(seDir)
+            Tracing.count("se_files_moved", stats['files'])
+            Tracing.count("se_files_unchanged", stats['unchanged'])
         
+        qDebug(
+            f"BG3 Script Extender sync: moved {stats['files']} files ({stats['bytes']} bytes), "
+            f"{stats['unchanged']} unchanged, in {(time.perf_counter() - start) * 1000:.1f} ms"
+        )
         return True
 
 class BaldursGate3ModDataChecker(mobase.ModDataChecker):
+    VALID_FOLDERS = frozenset(folder.lower() for folder in [
+        "Cursors",
+        "DLC",
+        "Engine",
+        "Fonts",
+        "Generated",
+        "Localization",
+        "Mods",
+        "PakInfo",
+        "PlayerProfiles",
+        "Public",
+        "Root",
+        "Shaders",
+        "Video",
+        BaldursGate3Game.PAK_MOD_PREFIX,
+        BaldursGate3Game.SCRIPT_EXTENDER_CONFIG_PREFIX,
+    ])
+
+    VALID_FILE_EXTENSIONS = (
+        ".pak",
+        ".dll",
+        ".json"
+    )
+
+    REMOVE_FILES = frozenset([
+        "readme",
+        "info.json"
+    ])
+    REMOVE_FILE_EXTENSIONS = (
+        ".url",
+        ".html",
+        ".ink"
+    )
+
     def __init__(self):
         super().__init__()
 
-    def dataLooksValid(self, tree: mobase.IFileTree) -> mobase.ModDataChecker.CheckReturn:
-        folders: List[mobase.IFileTree] = []
-        files: List[mobase.FileTreeEntry] = []
+    @classmethod
+    def _isModFile(cls, name: str) -> bool: # name is lower case
+        return name.endswith(cls.VALID_FILE_EXTENSIONS) and name != "info.json"
+
+    @classmethod
+    def _isJunkFile(cls, name: str) -> bool: # name is lower case
+        return name.endswith(cls.REMOVE_FILE_EXTENSIONS) or name in cls.REMOVE_FILES
+
+    def _classify(self, tree: mobase.IFileTree) -> mobase.ModDataChecker.CheckReturn:
+        folders = []
+        files = []
         for entry in tree:
             if isinstance(entry, mobase.IFileTree):
-                folders.append(entry)
+                name = entry.name().lower()
+                if name in self.VALID_FOLDERS:
+                    return mobase.ModDataChecker.VALID
+                folders.append((name, entry))
             else:
                 files.append(entry)
 
-        VALID_FOLDERS = [
-            "Cursors",
-            "DLC",
-            "Engine",
-            "Fonts",
-            "Generated",
-            "Localization",
-            "Mods",
-            "PakInfo",
-            "PlayerProfiles",
-            "Public",
-            "Root",
-            "Shaders",
-            "Video",
-            BaldursGate3Game.PAK_MOD_PREFIX,
-            BaldursGate3Game.SCRIPT_EXTENDER_CONFIG_PREFIX,
-        ]
-
-        VALID_FILE_EXTENSIONS = [
-            ".pak",
-            ".dll",
-            ".json"
-        ]
-
-        for mainFolder in folders:
-            for validFolder in VALID_FOLDERS:
-                if mainFolder.name().lower() == validFolder.lower():
-                    return mobase.ModDataChecker.VALID
-
-        for mainFile in files:
-            for extension in VALID_FILE_EXTENSIONS:
-                if mainFile.name().lower().endswith(extension.lower()) and mainFile.name() != "info.json":
-                    return mobase.ModDataChecker.FIXABLE
-                
-        for mainFolder in folders:
-            if mainFolder.name().lower() == "bin":
+        # Only looked at once no valid folder was found, cheapest checks first
+        if any(self._isModFile(entry.name().lower()) for entry in files):
+            return mobase.ModDataChecker.FIXABLE
+        for name, folder in folders:
+            if name == "bin" or any(self._isModFile(child.name().lower()) for child in folder):
                 return mobase.ModDataChecker.FIXABLE
-            else:
-                for mainFile in mainFolder:
-                    for extension in VALID_FILE_EXTENSIONS:
-                            if mainFile.name().lower().endswith(extension.lower()) and mainFile.name() != "info.json":
-                                return mobase.ModDataChecker.FIXABLE
-                
-        for src_folder in folders:
-            for dst_folder in VALID_FOLDERS:
-                if src_folder.name().lower() == dst_folder.lower():
-                    return mobase.ModDataChecker.VALID
 
         return mobase.ModDataChecker.INVALID
 
-    def fix(self, tree: mobase.IFileTree) -> Optional[mobase.IFileTree]:
-        folders: List[mobase.IFileTree] = []
-        files: List[mobase.FileTreeEntry] = []
+    def dataLooksValid(self, tree: mobase.IFileTree) -> mobase.ModDataChecker.CheckReturn:
+        # Not memoized: the single early-exit pass costs less than building a key for the tree
+        return self._classify(tree)
+
+    @classmethod
+    def _fileDestination(cls, name: str) -> Optional[str]: # name is lower case
+        if name.endswith(".pak"):
+            return "/PAK_FILES/"
+        if name.endswith(".json") and name != "info.json":
+            return "/SE_CONFIG/"
+        return None
+
+    def _fixPlan(self, tree: mobase.IFileTree):
+        moves = []
+        removals = []
         for entry in tree:
+            name = entry.name().lower()
             if isinstance(entry, mobase.IFileTree):
-                folders.append(entry)
+                if name == "bin":
+                    moves.append((entry, "/Root/"))
+                    continue
+
+                has_junk = False
+                for child in entry:
+                    child_name = child.name().lower()
+                    destination = self._fileDestination(child_name)
+                    if destination:
+                        moves.append((child, destination))
+                    elif not has_junk:
+                        has_junk = self._isJunkFile(child_name)
+
+                # Folders shipping readmes/links are dropped, after their paks and configs are moved out
+                if has_junk:
+                    removals.append(entry)
+            elif self._isJunkFile(name):
+                removals.append(entry)
             else:
-                files.append(entry)
+                destination = self._fileDestination(name)
+                if destination:
+                    moves.append((entry, destination))
+        return moves, removals
 
-        REMOVE_FILES = [
-            "readme",
-            "info.json"
-        ]
-        REMOVE_FILE_EXTENSIONS = [
-            ".url",
-            ".html",
-            ".ink"
-        ]
+    def fix(self, tree: mobase.IFileTree) -> Optional[mobase.IFileTree]:
+        # Plan everything first, moving or removing entries while iterating the tree skips entries
+        moves, removals = self._fixPlan(tree)
 
-        # Remove unnecessary files
-        for mainFile in files:
-            for extension in REMOVE_FILE_EXTENSIONS:
-                if mainFile.name().lower().endswith(extension.lower()):
-                     tree.remove(mainFile)
-            for filename in REMOVE_FILES:
-                if mainFile.name().lower() == filename:
-                     tree.remove(mainFile)
-
-            
-        for mainFolder in folders:
-            for mainFile in mainFolder:
-                for extension in REMOVE_FILE_EXTENSIONS:
-                    if mainFile.name().lower().endswith(extension.lower()):
-                        tree.remove(mainFolder)
-                for filename in REMOVE_FILES:
-                    if mainFile.name().lower() == filename:
-                       tree.remove(mainFolder)
-
-
-        for mainFile in files:
-            if mainFile.name().lower().endswith(".pak".lower()):
-                if mainFile is None: continue
-                tree.move(mainFile, "/PAK_FILES/", policy=mobase.IFileTree.MERGE)
-            if mainFile.name().lower().endswith(".json".lower()) and mainFile.name() != "info.json":
-                tree.move(mainFile, "/SE_CONFIG/", policy=mobase.IFileTree.MERGE)
-                    
-        for mainFolder in folders:
-            if mainFolder.name().lower() == "bin":
-                tree.move(mainFolder, "/Root/", policy=mobase.IFileTree.MERGE)
-            else:
-                for mainFile in mainFolder:
-                    if mainFile is None: continue
-                    if mainFile.name().lower().endswith(".pak".lower()):
-                        tree.move(mainFile, "/PAK_FILES/", policy=mobase.IFileTree.MERGE)
-                    if mainFile.name().lower().endswith(".json".lower()) and mainFile.name() != "info.json":
-                        tree.move(mainFile, "/SE_CONFIG/", policy=mobase.IFileTree.MERGE)
+        for entry, destination in moves:
+            tree.move(entry, destination, policy=mobase.IFileTree.MERGE)
+        for entry in removals:
+            tree.remove(entry)
 
         return tree